@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Asyncio API for the PDF outline extractor
+Runs extraction on worker processes or a background thread and awaits it without blocking the event loop
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+import weakref
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+
+from extract_outline import PDFOutlineExtractor, PDFSource, iter_pdf_filenames
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = ("process", "thread")
+
+
+class AsyncExtractor:
+    """
+    Awaitable extraction backed by a managed pool
+
+    executor="process" (default) uses an ExtractionWorkerPool of warm worker
+    processes, with its per-document timeout and budgets; "thread" runs a
+    PDFOutlineExtractor on one background thread in this process, which avoids
+    process start-up but extracts one document at a time: PyMuPDF does not
+    support use from several threads at once. At most max_concurrency
+    documents (default: twice the workers) are submitted at once; further
+    calls wait their turn.
+
+    Cancelling an awaiting call withdraws its document if it is still queued;
+    a document already being extracted finishes and its result is dropped.
+    """
+
+    def __init__(self, workers: Optional[int] = None, executor: str = "process",
+                 max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 extractor_kwargs: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024):
+        if executor not in EXECUTORS:
+            raise ValueError(f"unknown executor {executor!r}; expected one of {', '.join(EXECUTORS)}")
+        if executor == "thread" and timeout is not None:
+            raise ValueError("timeout needs the process executor: a running thread can't be stopped")
+        if executor == "thread" and workers is not None and workers > 1:
+            raise ValueError("the thread executor extracts on one thread (PyMuPDF is not thread-safe); "
+                             "use the process executor for parallel extraction")
+        self.workers = 1 if executor == "thread" else workers or os.cpu_count() or 1
+        self.executor = executor
+        self.max_concurrency = max_concurrency or self.workers * 2
+        self.extractor_kwargs = extractor_kwargs or {}
+        # One limit per event loop: an asyncio.Semaphore binds to the loop that first waits on it
+        self._semaphores = weakref.WeakKeyDictionary()
+        if executor == "process":
+            from batch_processing import ExtractionWorkerPool
+            self._pool = ExtractionWorkerPool(workers=self.workers, timeout=timeout,
+                                              extractor_kwargs=self.extractor_kwargs,
+                                              cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outline-extract")
+            self._extractor = None  # Created and used only on the pool's single thread
+            self._cache_options = {"cache_dir": cache_dir, "max_bytes": cache_max_bytes} if cache_dir else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def _thread_extract(self, source: PDFSource) -> Dict[str, Any]:
+        if self._extractor is None:
+            extractor = PDFOutlineExtractor(**self.extractor_kwargs)
+            if self._cache_options:
+                from result_cache import CachedExtractor, ResultCache
+                extractor = CachedExtractor(extractor, ResultCache(**self._cache_options))
+            self._extractor = extractor
+        return self._extractor.extract_title_and_outline(source)
+
+    def _submit(self, source: PDFSource) -> Future:
+        if self.executor == "process":
+            return self._pool.submit(source)
+        return self._pool.submit(self._thread_extract, source)
+
+    async def extract(self, source: PDFSource) -> Dict[str, Any]:
+        """Extract one PDF (path or bytes) and return its {"title", "outline"} result"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            future = self._submit(source)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+
+    async def iter_extract(self, sources: Union[Iterable[PDFSource], AsyncIterable[PDFSource]],
+                           ordered: bool = True,
+                           return_exceptions: bool = False) -> AsyncIterator[Tuple[PDFSource, Any]]:
+        """
+        Extract a stream of sources and yield (source, result) pairs
+
+        sources may be a regular or an async iterable and is consumed lazily:
+        no more than max_concurrency documents are in flight. With ordered,
+        results come in input order; otherwise as soon as each finishes. A
+        failed document raises its exception, or yields it as the result
+        with return_exceptions. Leaving the loop early cancels the rest.
+        """
+        in_flight = deque()  # (source, task) in submission order
+
+        def outcome(task: asyncio.Task):
+            if task.exception() is None:
+                return task.result()
+            if return_exceptions:
+                return task.exception()
+            raise task.exception()
+
+        async def next_done() -> Tuple[PDFSource, Any]:
+            if ordered:
+                source, task = in_flight[0]
+                await asyncio.wait([task])
+                in_flight.popleft()
+                return source, outcome(task)
+            done, _ = await asyncio.wait([task for _, task in in_flight], return_when=asyncio.FIRST_COMPLETED)
+            for index, (source, task) in enumerate(in_flight):
+                if task in done:
+                    del in_flight[index]
+                    return source, outcome(task)
+
+        try:
+            async for source in _as_async_iterator(sources):
+                in_flight.append((source, asyncio.ensure_future(self.extract(source))))
+                while len(in_flight) >= self.max_concurrency:
+                    yield await next_done()
+            while in_flight:
+                yield await next_done()
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+
+    async def iter_directory(self, input_dir: str, ordered: bool = True,
+                             return_exceptions: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+        """Extract every PDF in input_dir and yield (filename, result) pairs"""
+        paths = (os.path.join(input_dir, filename) for filename in iter_pdf_filenames(input_dir))
+        async for path, result in self.iter_extract(paths, ordered, return_exceptions):
+            yield os.path.basename(path), result
+
+    def close(self):
+        """Stop the pool; queued documents are cancelled"""
+        if self.executor == "process":
+            self._pool.shutdown()
+        else:
+            self._pool.shutdown(cancel_futures=True)
+            if self._extractor is not None:
+                self._extractor.close()
+
+    async def aclose(self):
+        """close() without blocking the event loop while workers wind down"""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+async def _as_async_iterator(sources: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if hasattr(sources, "__aiter__"):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+
+_default_extractor = None
+_default_lock = threading.Lock()
+
+
+def default_extractor() -> AsyncExtractor:
+    """Process-wide AsyncExtractor with default settings, started on first use and stopped at exit"""
+    global _default_extractor
+    with _default_lock:
+        if _default_extractor is None:
+            _default_extractor = AsyncExtractor()
+            atexit.register(_default_extractor.close)
+        return _default_extractor
+
+
+async def extract_async(source: PDFSource, extractor: Optional[AsyncExtractor] = None) -> Dict[str, Any]:
+    """Extract one PDF without blocking the event loop (uses default_extractor() unless given one)"""
+    if extractor is None:
+        extractor = _default_extractor
+        if extractor is None:
+            # Starting the worker pool blocks, so the first call does it on a thread
+            extractor = await asyncio.get_running_loop().run_in_executor(None, default_extractor)
+    return await extractor.extract(source)
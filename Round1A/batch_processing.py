@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Parallel batch processing for the PDF outline extractor
+Runs PDFOutlineExtractor in a pool of warm worker processes with per-file timeouts
+"""
+
+import os
+import mmap
+import time
+import threading
+import multiprocessing
+import logging
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, wait, FIRST_COMPLETED, ALL_COMPLETED
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from extract_outline import ERROR_RESULT, iter_pdf_filenames
+from output_writer import create_writer
+from instrumentation import NULL_METRICS, DocumentMetrics
+from resource_governor import is_load_dependent, process_rss_mb
+
+logger = logging.getLogger(__name__)
+
+# How often the dispatcher samples worker memory when a memory budget is set
+RSS_POLL_INTERVAL = 0.1
+
+# Sent once by a worker when its extractor is set up; per-document limits start counting from there
+_READY = "ready"
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a document takes longer than the per-file timeout"""
+
+
+class BudgetExceeded(ExtractionTimeout):
+    """Raised when a worker is killed for passing the hard limit of its time or memory budget"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+    def result(self) -> Dict[str, Any]:
+        """The result to record for the document: nothing was salvaged from the killed worker"""
+        return dict(ERROR_RESULT, truncated={"reason": self.reason, "pages_read": 0, "page_count": None})
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process dies while handling a document"""
+
+
+def get_mp_context():
+    """Multiprocessing context that is safe to use from threaded callers"""
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        # The extractor imports PyMuPDF and NumPy lazily; load them in the server so workers start warm
+        ctx.set_forkserver_preload(["extract_outline", "fitz", "numpy"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _worker_main(conn, extractor_kwargs: Dict[str, Any], cache_options: Optional[Dict[str, Any]],
+                 collect_metrics: bool = False):
+    """Worker loop: keep one extractor (and its PyMuPDF state) alive for many documents"""
+    from extract_outline import PDFOutlineExtractor, describe_source
+    from instrumentation import Instrumentation
+
+    # Sinks live in the parent; workers only collect and send each record back with the result
+    instrumentation = Instrumentation() if collect_metrics else None
+    extractor = PDFOutlineExtractor(instrumentation=instrumentation, **extractor_kwargs)
+    if cache_options:
+        from result_cache import CachedExtractor, ResultCache
+        extractor = CachedExtractor(extractor, ResultCache(**cache_options))
+    conn.send(_READY)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        task_id, source = message
+        try:
+            if instrumentation is None:
+                conn.send((task_id, True, extractor.extract_title_and_outline(source), None))
+                continue
+            with instrumentation.document(describe_source(source)) as metrics:
+                result = extractor.extract_title_and_outline(source)
+            conn.send((task_id, True, result, metrics.as_dict()))
+        except Exception as e:
+            conn.send((task_id, False, f"{type(e).__name__}: {e}", None))
+
+
+class _Worker:
+    """Parent-side handle for one worker process"""
+
+    def __init__(self, ctx, extractor_kwargs: Dict[str, Any], cache_options: Optional[Dict[str, Any]],
+                 collect_metrics: bool = False):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main,
+                                   args=(child_conn, extractor_kwargs, cache_options, collect_metrics),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None  # (task_id, future, deadline); deadline is None until the worker is ready
+        self.ready = False  # Whether the worker has finished starting up
+        self.rss_start = None  # Worker RSS in MB when it started on its current document
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ExtractionWorkerPool:
+    """
+    Pool of warm extractor processes
+
+    Each worker owns its own PDFOutlineExtractor and PyMuPDF state and handles one
+    document at a time. A document that exceeds the timeout gets its worker killed
+    and replaced, so one pathological PDF cannot stall the pool.
+    Idle workers are watched too: one that dies after starting is replaced at
+    once, one that fails to start is retried when a document needs it, and a
+    document that can't be handed to its worker fails with WorkerCrashed.
+
+    With collect_metrics, each completed future also carries the document's
+    stage timings and counters as a `metrics` dict attribute.
+
+    A ResourceBudget passed as extractor_kwargs["budget"] is checked by the
+    extractor between pages; the pool backs it with hard limits, killing a
+    worker that passes kill_after times the time budget or whose memory grows
+    by more than kill_after times the memory budget (BudgetExceeded).
+    """
+
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None,
+                 extractor_kwargs: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                 collect_metrics: bool = False):
+        self.num_workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.extractor_kwargs = extractor_kwargs or {}
+        self.budget = self.extractor_kwargs.get("budget")
+        self.cache_options = {"cache_dir": cache_dir, "max_bytes": cache_max_bytes} if cache_dir else None
+        self.collect_metrics = collect_metrics
+        self._ctx = get_mp_context()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._next_task_id = 0
+        self._closed = False
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self._workers = [_Worker(self._ctx, self.extractor_kwargs, self.cache_options, self.collect_metrics)
+                         for _ in range(self.num_workers)]
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="extraction-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    @property
+    def pending_count(self) -> int:
+        """Documents submitted but not yet handed to a worker"""
+        return len(self._pending)
+
+    @property
+    def busy_count(self) -> int:
+        """Workers currently handling a document"""
+        return sum(1 for worker in self._workers if worker.task is not None)
+
+    def submit(self, source) -> Future:
+        """
+        Queue a document for extraction and return a future for its result
+
+        source is a path or the PDF bytes. Buffer views (memoryview, mmap)
+        can't be pickled to a worker, so they are copied to bytes here.
+        """
+        if isinstance(source, (memoryview, mmap.mmap)):
+            source = bytes(source)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a closed ExtractionWorkerPool")
+            self._next_task_id += 1
+            self._pending.append((self._next_task_id, source, future))
+        self._wake()
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work, cancel queued documents and stop the workers"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while self._pending:
+                _, _, future = self._pending.popleft()
+                future.cancel()
+        self._wake()
+        if wait:
+            self._dispatcher.join()
+
+    @property
+    def _task_seconds(self) -> Optional[float]:
+        """Seconds a worker gets per document: the timeout or the budget's hard time limit"""
+        hard_seconds = self.budget.hard_seconds if self.budget is not None else None
+        return min((s for s in (self.timeout, hard_seconds) if s is not None), default=None)
+
+    def _wake(self):
+        try:
+            self._wake_w.send_bytes(b"")
+        except OSError:
+            pass
+
+    def _assign_pending(self):
+        with self._lock:
+            for index, worker in enumerate(self._workers):
+                if not self._pending:
+                    break
+                if worker.task is not None:
+                    continue
+                task_id, source, future = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if not worker.process.is_alive():
+                    # Died before it was ready (failed start-up); restarted only now that there is work for it
+                    worker = self._restart_worker(index)
+                worker.task = (task_id, future, None)
+                if worker.ready:
+                    self._start_limits(worker)
+                try:
+                    worker.conn.send((task_id, source))
+                except OSError as e:
+                    self._replace_worker(index, WorkerCrashed(f"could not send the document to its worker: {e}"))
+
+    def _start_limits(self, worker: _Worker):
+        """Start the time and memory limits of a ready worker's document, so start-up isn't charged to it"""
+        task_id, future, _ = worker.task
+        task_seconds = self._task_seconds
+        deadline = time.monotonic() + task_seconds if task_seconds is not None else None
+        worker.task = (task_id, future, deadline)
+        if self.budget is not None and self.budget.max_rss_mb is not None:
+            worker.rss_start = process_rss_mb(worker.process.pid)
+
+    def _restart_worker(self, index: int) -> _Worker:
+        self._workers[index].stop(kill=True)
+        worker = _Worker(self._ctx, self.extractor_kwargs, self.cache_options, self.collect_metrics)
+        self._workers[index] = worker
+        return worker
+
+    def _replace_worker(self, index: int, error: Exception):
+        _, future, _ = self._workers[index].task
+        self._workers[index].task = None
+        self._restart_worker(index)
+        future.set_exception(error)
+
+    def _check_idle_worker(self, index: int, ready):
+        """Note an idle worker's start-up, and replace it if it died after starting (OOM or external kill)"""
+        worker = self._workers[index]
+        if worker.conn in ready or worker.conn.poll():
+            try:
+                if worker.conn.recv() == _READY:
+                    worker.ready = True
+                return
+            except (EOFError, OSError):
+                pass
+        if worker.process.sentinel not in ready:
+            return
+        worker.process.join()
+        if worker.ready:
+            logger.warning(f"Idle worker exited with code {worker.process.exitcode}; starting a new one")
+            self._restart_worker(index)
+        else:
+            logger.warning(f"Worker failed to start (exit code {worker.process.exitcode}); "
+                           f"retrying when there is a document for it")
+
+    def _dispatch_loop(self):
+        try:
+            while not (self._closed and self.busy_count == 0):
+                self._assign_pending()
+
+                now = time.monotonic()
+                deadlines = [w.task[2] for w in self._workers if w.task is not None and w.task[2] is not None]
+                wait_timeout = max(0.0, min(deadlines) - now) if deadlines else None
+                watch_memory = self.budget is not None and self.budget.max_rss_mb is not None
+                if watch_memory and self.busy_count:
+                    wait_timeout = min(wait_timeout, RSS_POLL_INTERVAL) if wait_timeout is not None \
+                        else RSS_POLL_INTERVAL
+
+                # Idle workers are watched too, except dead ones left to be restarted on demand
+                live = [w for w in self._workers if w.task is not None or w.process.exitcode is None]
+                waitables = [self._wake_r] + [w.conn for w in live] + [w.process.sentinel for w in live]
+                ready = wait_connections(waitables, timeout=wait_timeout)
+
+                if self._wake_r in ready:
+                    while self._wake_r.poll():
+                        self._wake_r.recv_bytes()
+
+                for index, worker in enumerate(self._workers):
+                    if worker.task is None:
+                        if worker.process.exitcode is None or worker.process.sentinel in ready:
+                            self._check_idle_worker(index, ready)
+                        continue
+                    if worker.conn in ready or worker.conn.poll():
+                        try:
+                            message = worker.conn.recv()
+                        except (EOFError, OSError):
+                            self._replace_worker(index, WorkerCrashed("worker process exited unexpectedly"))
+                            continue
+                        if message == _READY:
+                            worker.ready = True
+                            self._start_limits(worker)
+                            continue
+                        task_id, ok, payload, metrics = message
+                        _, future, _ = worker.task
+                        worker.task = None
+                        if metrics is not None:
+                            future.metrics = metrics
+                        if ok:
+                            future.set_result(payload)
+                        else:
+                            future.set_exception(RuntimeError(payload))
+                    elif worker.process.sentinel in ready:
+                        self._replace_worker(index, WorkerCrashed(
+                            f"worker process exited with code {worker.process.exitcode}"))
+                    elif worker.task[2] is not None and time.monotonic() >= worker.task[2]:
+                        if self._task_seconds != self.timeout:
+                            self._replace_worker(index, BudgetExceeded("time", (
+                                f"extraction passed the hard time limit of {self._task_seconds:g} seconds")))
+                        else:
+                            self._replace_worker(index, ExtractionTimeout(
+                                f"extraction exceeded {self.timeout} seconds"))
+                    elif watch_memory and worker.rss_start is not None:
+                        rss = process_rss_mb(worker.process.pid)
+                        if rss is not None and rss - worker.rss_start > self.budget.hard_rss_mb:
+                            self._replace_worker(index, BudgetExceeded("memory", (
+                                f"worker memory grew by {rss - worker.rss_start:.0f} MB, past the hard limit "
+                                f"of {self.budget.hard_rss_mb:g} MB")))
+        finally:
+            for worker in self._workers:
+                worker.stop()
+            self._wake_r.close()
+            self._wake_w.close()
+
+
+def process_pdfs_parallel(input_dir: str, output_dir: str, workers: Optional[int] = None,
+                          timeout: Optional[float] = None, max_in_flight: Optional[int] = None,
+                          extractor_kwargs: Optional[Dict[str, Any]] = None,
+                          cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                          filenames: Optional[Iterable[str]] = None,
+                          on_result: Optional[Callable[[str, bool], None]] = None,
+                          instrumentation=None, writer=None,
+                          pool: Optional["ExtractionWorkerPool"] = None):
+    """
+    Process all PDFs in the input directory with a pool of worker processes
+
+    Output files are written by this process with the same writer as the
+    serial path, so results are byte-identical to process_pdfs() with workers=1.
+    The caller owns writer (default: pretty JSON per PDF in output_dir), and
+    pool if it passes one to reuse across calls; the pool settings are then ignored.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if writer is None:
+        writer = create_writer(output_dir)
+
+    if pool is None:
+        pool = ExtractionWorkerPool(workers=workers, timeout=timeout, extractor_kwargs=extractor_kwargs,
+                                    cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                                    collect_metrics=instrumentation is not None)
+    else:
+        pool = nullcontext(pool)
+    with pool as pool:
+        limit = max_in_flight or pool.num_workers * 2
+        in_flight = {}
+
+        def drain(return_when):
+            done, _ = wait(list(in_flight), return_when=return_when)
+            for future in done:
+                filename = in_flight.pop(future)
+                metrics = NULL_METRICS
+                if instrumentation is not None:
+                    record = getattr(future, "metrics", None)
+                    metrics = DocumentMetrics.from_dict(record) if record else DocumentMetrics(filename)
+                    metrics.document = filename
+                try:
+                    result = future.result()
+                    with metrics.stage("write"):
+                        output_path = writer.write(filename, result)
+                    logger.info(f"Successfully processed {filename} -> {os.path.basename(output_path)}")
+                    ok = result != ERROR_RESULT and not is_load_dependent(result)
+                except BudgetExceeded as e:
+                    logger.error(f"Failed to process {filename}: {str(e)}")
+                    writer.write(filename, e.result())
+                    metrics.count("truncated." + e.reason)
+                    ok = False
+                except Exception as e:
+                    logger.error(f"Failed to process {filename}: {str(e)}")
+                    writer.write(filename, ERROR_RESULT)
+                    metrics.count("errors")
+                    ok = False
+                if metrics.enabled:
+                    metrics.stages["total"] = metrics.stages.get("total", 0.0) + metrics.stages.get("write", 0.0)
+                    instrumentation.emit(metrics)
+                if on_result is not None:
+                    on_result(filename, ok)
+
+        if filenames is None:
+            filenames = iter_pdf_filenames(input_dir)
+        for filename in filenames:
+            while len(in_flight) >= limit:
+                drain(FIRST_COMPLETED)
+            logger.info(f"Processing {filename}...")
+            in_flight[pool.submit(os.path.join(input_dir, filename))] = filename
+
+        if in_flight:
+            drain(ALL_COMPLETED)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the PDF outline extractor
+Generates a synthetic PDF corpus with PyMuPDF and reports throughput, latency and peak memory as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import logging
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+from extract_outline import ERROR_RESULT, PDFOutlineExtractor, iter_pdf_filenames
+
+logger = logging.getLogger(__name__)
+
+# Base-14 fonts PyMuPDF can insert without font files: (regular, bold)
+FONT_MIXES = {
+    "helvetica": [("helv", "hebo")],
+    "mixed": [("helv", "hebo"), ("tiro", "tibo"), ("cour", "cobo")],
+}
+HEADING_SIZES = {"H1": 18, "H2": 14, "H3": 12}
+# Avoid "section", "part" etc.: a body line starting with them is a legitimate heading candidate
+BODY_WORDS = ("analysis data system model results method design process value sample "
+              "document report study approach performance structure review outline").split()
+
+
+class CorpusProfile:
+    """Knobs for one family of synthetic documents"""
+
+    def __init__(self, pages: int = 20, heading_density: float = 0.15, font_mix: str = "helvetica",
+                 columns: int = 1, scanned_ratio: float = 0.0):
+        self.pages = pages  # Pages per document
+        self.heading_density = heading_density  # Chance that a paragraph is preceded by a heading
+        self.font_mix = font_mix  # Key of FONT_MIXES
+        self.columns = columns  # Text columns per page
+        self.scanned_ratio = scanned_ratio  # Share of pages that are a full-page image with no text layer
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+DEFAULT_PROFILES = [
+    CorpusProfile(),
+    CorpusProfile(heading_density=0.4, font_mix="mixed"),
+    CorpusProfile(columns=2, font_mix="mixed"),
+    CorpusProfile(scanned_ratio=0.3),
+]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(BODY_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _scanned_page(page: fitz.Page, rng: random.Random):
+    """Fill the page with a noisy grayscale image, like a scan without OCR"""
+    width, height = 425, 550
+    noise = bytes(rng.randrange(180, 256) for _ in range(width)) * height
+    pixmap = fitz.Pixmap(fitz.csGRAY, width, height, noise, False)
+    page.insert_image(page.rect, pixmap=pixmap)
+
+
+def generate_pdf(pdf_path: str, profile: CorpusProfile, seed: int = 0):
+    """Write one synthetic PDF with numbered H1-H3 headings and body paragraphs"""
+    rng = random.Random(seed)
+    fonts = FONT_MIXES[profile.font_mix]
+    doc = fitz.open()
+    numbering = [0, 0, 0]
+    depth = -1
+
+    for page_num in range(profile.pages):
+        page = doc.new_page()
+        if rng.random() < profile.scanned_ratio:
+            _scanned_page(page, rng)
+            continue
+
+        margin, gutter = 54, 18
+        column_width = (page.rect.width - 2 * margin - gutter * (profile.columns - 1)) / profile.columns
+        for column in range(profile.columns):
+            x = margin + column * (column_width + gutter)
+            y = margin + 24
+            if page_num == 0 and column == 0:
+                page.insert_text((x, y), f"Synthetic Benchmark Document {seed}", fontsize=24, fontname=fonts[0][1])
+                y += 40
+            while True:
+                regular, bold = rng.choice(fonts)
+                if rng.random() < profile.heading_density:
+                    # Never skip a level: a subsection follows its section
+                    depth = rng.randint(0, min(2, depth + 1))
+                    numbering[depth] += 1
+                    numbering[depth + 1:] = [0] * (2 - depth)
+                    number = ".".join(str(n) for n in numbering[:depth + 1])
+                    level = f"H{depth + 1}"
+                    if y + HEADING_SIZES[level] + 60 > page.rect.height - margin:
+                        break
+                    page.insert_text((x, y), f"{number} {_sentence(rng, 3)[:-1]}",
+                                     fontsize=HEADING_SIZES[level], fontname=bold)
+                    y += HEADING_SIZES[level] + 8
+                # Body paragraph, wrapped by hand so each line is its own span
+                line_count = rng.randint(3, 8)
+                if y + line_count * 13 > page.rect.height - margin:
+                    break
+                chars_per_line = int(column_width / 5.2)
+                for _ in range(line_count):
+                    page.insert_text((x, y), _sentence(rng, 14)[:chars_per_line], fontsize=10, fontname=regular)
+                    y += 13
+                y += 8
+
+    doc.set_metadata({})
+    doc.save(pdf_path, garbage=3, deflate=True)
+    doc.close()
+
+
+def generate_corpus(corpus_dir: str, docs: int, profiles: Optional[List[CorpusProfile]] = None,
+                    seed: int = 0) -> List[str]:
+    """Generate docs PDFs cycling through the profiles; returns the file names"""
+    profiles = profiles or DEFAULT_PROFILES
+    os.makedirs(corpus_dir, exist_ok=True)
+    filenames = []
+    for i in range(docs):
+        filename = f"synthetic_{i:04d}.pdf"
+        generate_pdf(os.path.join(corpus_dir, filename), profiles[i % len(profiles)], seed=seed + i)
+        filenames.append(filename)
+    return filenames
+
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p * len(sorted_values))) - 1))
+    return round(sorted_values[index], 4)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(corpus_dir: str, extractor_kwargs: Optional[Dict[str, Any]] = None,
+                  repeat: int = 1) -> Dict[str, Any]:
+    """
+    Extract every PDF in corpus_dir repeat times and summarise the run
+
+    Latency is per document per pass. Peak RSS is the high-water mark of this
+    process, so run the benchmark in a fresh process (as the CLI does) to
+    keep corpus generation out of it.
+    """
+    extractor = PDFOutlineExtractor(**(extractor_kwargs or {}))
+    filenames = sorted(iter_pdf_filenames(corpus_dir))
+    page_counts = {}
+    for filename in filenames:
+        with fitz.open(os.path.join(corpus_dir, filename)) as doc:
+            page_counts[filename] = len(doc)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            for filename in filenames:
+                t0 = time.perf_counter()
+                result = extractor.extract_title_and_outline(os.path.join(corpus_dir, filename))
+                latencies.append(time.perf_counter() - t0)
+                errors += result == ERROR_RESULT
+    finally:
+        extractor.close()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    docs = len(latencies)
+    pages = sum(page_counts.values()) * repeat
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "extractor_fingerprint": extractor.fingerprint(),
+        "extractor_kwargs": extractor_kwargs or {},
+        "docs": docs,
+        "pages": pages,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "docs_per_sec": round(docs / elapsed, 3) if elapsed else None,
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed else None,
+        "latency_s": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1], 4) if latencies else None,
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the PDF outline extractor on a synthetic corpus")
+    parser.add_argument("--corpus-dir", default=None,
+                        help="Reuse or create the corpus here (default: a temporary directory)")
+    parser.add_argument("--docs", type=int, default=20, help="Documents to generate")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per document")
+    parser.add_argument("--heading-density", type=float, default=None,
+                        help="Override every profile's heading density (0-1)")
+    parser.add_argument("--columns", type=int, default=None, help="Override every profile's column count")
+    parser.add_argument("--scanned-ratio", type=float, default=None,
+                        help="Override every profile's share of image-only pages (0-1)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--streaming", action="store_true", help="Benchmark the streaming extractor")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    profiles = []
+    for profile in DEFAULT_PROFILES:
+        overrides = {key: value for key, value in [("heading_density", args.heading_density),
+                                                   ("columns", args.columns),
+                                                   ("scanned_ratio", args.scanned_ratio)] if value is not None}
+        profiles.append(CorpusProfile(**dict(profile.as_dict(), pages=args.pages, **overrides)))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or os.path.join(temp_dir, "corpus")
+        if not os.path.isdir(corpus_dir) or not any(iter_pdf_filenames(corpus_dir)):
+            logger.info(f"Generating {args.docs} synthetic PDFs in {corpus_dir}")
+            generate_corpus(corpus_dir, args.docs, profiles, seed=args.seed)
+
+        # Measure in a fresh interpreter so corpus generation doesn't inflate peak RSS
+        code = ("import json, sys, benchmark; "
+                "print(json.dumps(benchmark.run_benchmark(sys.argv[1], json.loads(sys.argv[2]), int(sys.argv[3]))))")
+        completed = subprocess.run(
+            [sys.executable, "-c", code, corpus_dir, json.dumps({"streaming": args.streaming}), str(args.repeat)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        report["corpus"] = {"docs": args.docs, "seed": args.seed, "profiles": [p.as_dict() for p in profiles]}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -4,64 +4,276 @@ PDF Outline Extractor for Adobe Connecting the Dots Challenge
 Extracts structured outlines (Title, H1, H2, H3) from PDF documents
 """
 
+from __future__ import annotations
+
+from time import perf_counter
+_IMPORT_STARTED = perf_counter()
+
 import os
 import json
-import re
-import fitz  # PyMuPDF
-from typing import List, Dict, Any, Optional
+import argparse
+import hashlib
+import mmap
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple, Union
 from collections import Counter, defaultdict
+from itertools import islice
 import logging
 
+from line_store import TextLineStore
+from instrumentation import NULL_METRICS
+from output_writer import output_path_for, create_writer
+from resource_governor import is_load_dependent
+from font_stats import FontStatistics, compute_font_statistics, heading_candidates
+from running_text import RunningTextIndex
+from heading_rules import (
+    CONTENT_LEVEL_RULES, CONTENT_LEVELS, LIST_ITEM_RULES, SKIP_RULES, TITLE_SKIP_RULES,
+    TABLE_WORDS, GENERIC_WORDS, NON_LETTERS, SENTENCE_END, NUMBERED_PREFIX, NUMBERED_HEADING,
+    CAPITALIZED_WORD, CHAPTER_HEADING, ALL_CAPS_HEADING, SUBSUBSECTION_PREFIX, LEADING_DIGIT,
+    TOC_NORMALIZE, rules_source
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump when a change to the extraction logic can change results for the same settings
+EXTRACTOR_VERSION = "1.1"
+
+# PyMuPDF is imported by load_pymupdf() when the first PDF is opened, so runs that never open one
+# (cache hits, unchanged incremental runs, --help) don't pay for it
+fitz = None
+PYMUPDF_IMPORT_SECONDS = None  # Time the deferred PyMuPDF import took, once it has happened
+
+def load_pymupdf():
+    """Import PyMuPDF on first use and return the module"""
+    global fitz, PYMUPDF_IMPORT_SECONDS, TEXT_EXTRACTION_FLAGS
+    if fitz is None:
+        started = perf_counter()
+        import fitz as module  # PyMuPDF
+        # get_text("dict") flags: the defaults minus image blocks, whose pixel data we never look at.
+        # Ligatures and whitespace stay preserved so span text (and therefore headings) is unchanged.
+        TEXT_EXTRACTION_FLAGS = module.TEXTFLAGS_DICT & ~module.TEXT_PRESERVE_IMAGES
+        fitz = module
+        PYMUPDF_IMPORT_SECONDS = perf_counter() - started
+    return fitz
+
+_pymupdf_version = None
+
+def pymupdf_version() -> str:
+    """Installed PyMuPDF version, read from the package metadata so fingerprints don't import PyMuPDF"""
+    global _pymupdf_version
+    if _pymupdf_version is None:
+        from importlib.metadata import PackageNotFoundError, version
+        try:
+            _pymupdf_version = version("PyMuPDF")
+        except PackageNotFoundError:
+            _pymupdf_version = load_pymupdf().VersionBind
+    return _pymupdf_version
+
+def __getattr__(name: str):
+    # Module constants derived from PyMuPDF exist once it is loaded
+    if name == "TEXT_EXTRACTION_FLAGS":
+        load_pymupdf()
+        return TEXT_EXTRACTION_FLAGS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# A PDF given by path, or already in memory (bytes, bytearray, memoryview or mmap)
+PDFSource = Union[str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap]
+
 class PDFOutlineExtractor:
-    def __init__(self):
+    def __init__(self, page_workers: int = 1, min_pages_per_worker: int = 50,
+                 streaming: bool = False, font_size_tolerance: float = 0.0,
+                 mmap_min_bytes: Optional[int] = None, title_only: bool = False,
+                 page_range: Optional[Tuple[int, int]] = None, max_headings: Optional[int] = None,
+                 use_toc: bool = False, instrumentation=None, budget=None,
+                 page_cache_dir: Optional[str] = None, page_cache_max_bytes: int = 512 * 1024 * 1024,
+                 drop_running_text: bool = False):
+        if page_range is not None and not 1 <= page_range[0] <= page_range[1]:
+            raise ValueError(f"page_range must be (first, last) with 1 <= first <= last, got {page_range}")
+        if max_headings is not None and max_headings < 0:
+            raise ValueError(f"max_headings must be non-negative, got {max_headings}")
         self.font_size_threshold = 1.5  # Minimum difference to consider different levels
         self.min_heading_length = 3  # Minimum characters for a heading
         self.max_heading_length = 150  # Maximum characters for a heading
+        self.page_workers = page_workers  # Processes used to read pages of one large document
+        self.min_pages_per_worker = min_pages_per_worker  # Below this, page-level parallelism isn't worth it
+        self.streaming = streaming  # Two-pass page-by-page extraction with flat peak memory
+        self.font_size_tolerance = font_size_tolerance  # Sizes within this of a tier's smallest size share its level (0 = exact)
+        self.mmap_min_bytes = mmap_min_bytes  # Memory-map path inputs at least this large (None = never)
+        # Early-exit modes: only the pages needed for the answer are read
+        self.title_only = title_only  # Metadata or first two pages only; outline is empty
+        self.page_range = page_range  # 1-based inclusive (first, last); levels use this window's fonts
+        self.max_headings = max_headings  # Stop classifying after this many headings
+        self.drop_running_text = drop_running_text  # Never take running headers, footers or page numbers as headings
+        self.use_toc = use_toc  # Prefer the embedded bookmarks when they pass the quality check
+        self.toc_sample_size = 8  # Bookmarks checked against their page text
+        self.toc_min_verified = 0.75  # Share of sampled bookmarks that must appear on their page
+        self.instrumentation = instrumentation  # Per-stage timers and counters (None = off, no overhead)
+        self.budget = budget  # resource_governor.ResourceBudget: per-document page, time and memory limits
+        self.page_cache_dir = page_cache_dir  # Reuse the lines of pages seen before, e.g. in an earlier revision
+        self._metrics = NULL_METRICS
+        self._budget = None  # BudgetTracker of the document being extracted
+        self._page_cache = None
+        if page_cache_dir:
+            from page_cache import PageLineCache
+            self._page_cache = PageLineCache(page_cache_dir, page_lines_fingerprint(), page_cache_max_bytes)
+        self._page_pool = None
+    
+    def fingerprint(self) -> str:
+        """Hash of everything that determines results: versions, thresholds and rules"""
+        settings = [
+            EXTRACTOR_VERSION,
+            pymupdf_version(),
+            repr(self.font_size_threshold),
+            repr(self.min_heading_length),
+            repr(self.max_heading_length),
+            repr(self.font_size_tolerance),
+            repr((self.title_only, self.page_range, self.max_headings)),
+            repr(self.drop_running_text),
+            repr((self.use_toc, self.toc_sample_size, self.toc_min_verified)),
+            repr(self.budget.max_pages if self.budget is not None else None),
+            rules_source(),
+        ]
+        return hashlib.blake2b("\n".join(settings).encode(), digest_size=16).hexdigest()
+    
+    def close(self):
+        """Shut down the page worker pool, if one was started"""
+        if self._page_pool is not None:
+            self._page_pool.shutdown()
+            self._page_pool = None
+        if self._page_cache is not None:
+            self._page_cache.close()
         
-    def extract_title_and_outline(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_title_and_outline(self, pdf_path: PDFSource) -> Dict[str, Any]:
         """
         Extract title and hierarchical outline from PDF
         
         Args:
-            pdf_path: Path to the PDF file
+            pdf_path: Path to the PDF file, or the PDF itself as bytes, memoryview or mmap
             
         Returns:
-            Dictionary with title and outline structure
+            Dictionary with title and outline structure; with a budget, a
+            result built from fewer pages than requested carries a "truncated"
+            entry with the reason and the number of pages read
         """
+        if self.budget is not None:
+            self._budget = self.budget.start()
         try:
-            doc = fitz.open(pdf_path)
-            
-            # First, try to get title from document metadata
-            title = self._extract_title_from_metadata(doc)
-            
-            # Extract all text blocks with formatting information
-            text_blocks = self._extract_text_blocks(doc)
-            
-            # If no title from metadata, try to extract from first page
-            if not title:
-                title = self._extract_title_from_content(text_blocks)
-            
-            # Extract headings based on font analysis and content patterns
-            outline = self._extract_headings(text_blocks)
-            
-            doc.close()
-            
-            return {
-                "title": title or "Untitled Document",
-                "outline": outline
-            }
+            if self.instrumentation is None:
+                return self._extract_title_and_outline(pdf_path)
+            with self.instrumentation.document(describe_source(pdf_path)) as metrics:
+                self._metrics = metrics
+                try:
+                    return self._extract_title_and_outline(pdf_path)
+                finally:
+                    self._metrics = NULL_METRICS
+        finally:
+            self._budget = None
+    
+    def _extract_title_and_outline(self, pdf_path: PDFSource) -> Dict[str, Any]:
+        metrics = self._metrics
+        try:
+            with ExitStack() as stack:
+                with metrics.stage("open"):
+                    doc = stack.enter_context(open_pdf(pdf_path, self.mmap_min_bytes))
+                
+                # First, try to get title from document metadata
+                title = self._extract_title_from_metadata(doc)
+                
+                if self.title_only:
+                    if not title:
+                        with metrics.stage("title"):
+                            title = self._extract_title_from_content(self._read_title_pages(doc))
+                    return {
+                        "title": title or "Untitled Document",
+                        "outline": []
+                    }
+                
+                start, stop = self._page_bounds(doc)
+                budget = self._budget
+                if budget is not None:
+                    stop = budget.limit_pages(start, stop)
+                
+                # Embedded bookmarks skip font analysis entirely when they pass the quality check
+                if self.use_toc:
+                    with metrics.stage("bookmarks"):
+                        outline = self._outline_from_toc(doc, start, stop)
+                    if outline is not None:
+                        metrics.count("headings", len(outline))
+                        if not title:
+                            with metrics.stage("title"):
+                                title = self._extract_title_from_content(self._read_title_pages(doc))
+                        result = {
+                            "title": title or "Untitled Document",
+                            "outline": outline,
+                            "outline_source": "bookmarks"
+                        }
+                        # Bookmarks are cut at the page budget without reading the pages themselves
+                        return self._mark_truncated(result, budget, doc, pdf_path, pages_read=stop - start)
+                
+                if self.streaming:
+                    with metrics.stage("scan"):
+                        font_size_counts, first_pages_lines, running_text = self._scan_font_sizes(
+                            doc, start, stop, budget)
+                    if budget is not None:
+                        # The second pass re-reads only the pages the budgeted first pass got through
+                        stop = start + budget.pages_read
+                    if not title:
+                        with metrics.stage("title"):
+                            if start > 0 or stop < min(2, len(doc)):
+                                first_pages_lines = self._read_title_pages(doc)
+                            title = self._extract_title_from_content(first_pages_lines)
+                    with metrics.stage("outline"):
+                        outline = list(islice(self._iter_outline_streaming(doc, font_size_counts, start, stop,
+                                                                           running_text),
+                                              self.max_headings))
+                else:
+                    # Extract all text lines with formatting information
+                    lines = self._extract_text_blocks(doc, pdf_path, start, stop, budget)
+                    
+                    # If no title from metadata, try to extract from first page
+                    if not title:
+                        with metrics.stage("title"):
+                            if start > 0 or stop < min(2, len(doc)):
+                                title = self._extract_title_from_content(self._read_title_pages(doc))
+                            else:
+                                title = self._extract_title_from_content(lines)
+                    
+                    # Extract headings based on font analysis and content patterns
+                    outline = self._extract_headings(lines, self.max_headings)
+                metrics.count("headings", len(outline))
+                
+                result = {
+                    "title": title or "Untitled Document",
+                    "outline": outline
+                }
+                if self.use_toc:
+                    result["outline_source"] = "font_analysis"
+                return self._mark_truncated(result, budget, doc, pdf_path)
             
         except Exception as e:
-            logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
+            logger.error(f"Error processing PDF {describe_source(pdf_path)}: {str(e)}")
+            metrics.count("errors")
             return {
                 "title": "Error Processing Document",
                 "outline": []
             }
     
+    def _mark_truncated(self, result: Dict[str, Any], budget, doc: fitz.Document, pdf_path: PDFSource,
+                        pages_read: Optional[int] = None) -> Dict[str, Any]:
+        """Add the "truncated" entry to a result if the budget cut the page range short"""
+        if budget is None or budget.reason is None:
+            return result
+        marker = budget.marker(len(doc))
+        if pages_read is not None:
+            marker["pages_read"] = pages_read
+        logger.warning(f"{describe_source(pdf_path)}: {budget.reason} budget reached after "
+                       f"{marker['pages_read']} pages; outline is partial")
+        self._metrics.count("truncated." + budget.reason)
+        result["truncated"] = marker
+        return result
+    
     def _extract_title_from_metadata(self, doc: fitz.Document) -> Optional[str]:
         """Extract title from PDF metadata"""
         try:
@@ -73,76 +285,271 @@ class PDFOutlineExtractor:
             pass
         return None
     
-    def _extract_text_blocks(self, doc: fitz.Document) -> List[Dict]:
-        """Extract text blocks with formatting information, merging adjacent spans"""
-        text_blocks = []
+    def _outline_from_toc(self, doc: fitz.Document, start: int, stop: int) -> Optional[List[Dict]]:
+        """
+        Outline from the document's embedded bookmarks, or None if they are unusable
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")
-            
-            for block in blocks["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        # Merge spans in the same line to handle split text
-                        line_text = ""
-                        line_font_size = 0
-                        line_font_name = ""
-                        line_flags = 0
-                        line_bbox = None
-                        
-                        for span in line["spans"]:
-                            text = span["text"].strip()
-                            if text:
-                                if line_text:
-                                    line_text += " " + text
-                                else:
-                                    line_text = text
-                                    line_font_size = span["size"]
-                                    line_font_name = span["font"]
-                                    line_flags = span["flags"]
-                                    line_bbox = span["bbox"]
-                        
-                        if line_text:
-                            text_blocks.append({
-                                "text": line_text,
-                                "page": page_num + 1,
-                                "font_size": line_font_size,
-                                "font_name": line_font_name,
-                                "flags": line_flags,
-                                "bbox": line_bbox
-                            })
-        
-        return text_blocks
-    
-    def _extract_title_from_content(self, text_blocks: List[Dict]) -> Optional[str]:
+        Levels 1-3 map to H1-H3 and deeper entries are dropped. A sample of
+        entries is checked against the text of the page they point to; the
+        bookmarks are rejected when they are missing, point outside the
+        document, or too few sampled titles appear on their pages.
+        """
+        toc = doc.get_toc(simple=True)
+        if not toc:
+            logger.info("No embedded bookmarks; using font analysis")
+            return None
+        
+        page_count = len(doc)
+        entries = []
+        for level, text, page in toc:
+            text = " ".join(text.split())
+            if level > 3 or not text:
+                continue
+            if not 1 <= page <= page_count:
+                logger.info(f"Bookmark {text!r} points to page {page} outside the document; using font analysis")
+                return None
+            entries.append({"level": f"H{level}", "text": text, "page": page})
+        if not entries:
+            logger.info("No usable bookmarks at levels 1-3; using font analysis")
+            return None
+        
+        # Spread the sample over the whole outline; each page's text is read at most once
+        step = max(1, len(entries) // self.toc_sample_size)
+        sample = entries[::step][:self.toc_sample_size]
+        page_texts = {}
+        verified = 0
+        for entry in sample:
+            page = entry["page"]
+            if page not in page_texts:
+                page_texts[page] = TOC_NORMALIZE.sub(" ", doc[page - 1].get_text("text")).casefold()
+            if TOC_NORMALIZE.sub(" ", entry["text"]).casefold().strip() in page_texts[page]:
+                verified += 1
+        if verified < self.toc_min_verified * len(sample):
+            logger.info(f"Only {verified}/{len(sample)} sampled bookmarks found on their pages; "
+                        f"using font analysis")
+            return None
+        
+        outline = [entry for entry in entries if start < entry["page"] <= stop]
+        return outline[:self.max_headings] if self.max_headings is not None else outline
+    
+    def _page_bounds(self, doc: fitz.Document) -> Tuple[int, int]:
+        """0-based [start, stop) of the pages to read, from page_range clamped to the document"""
+        if self.page_range is None:
+            return 0, len(doc)
+        first, last = self.page_range
+        return min(first - 1, len(doc)), min(last, len(doc))
+    
+    def _read_title_pages(self, doc: fitz.Document) -> TextLineStore:
+        """Lines of the first two pages, all that title detection looks at"""
+        lines = TextLineStore()
+        for page_num in range(min(2, len(doc))):
+            self._extract_page_lines(doc[page_num], page_num, lines)
+        return lines
+    
+    def _extract_text_blocks(self, doc: fitz.Document, pdf_path: Optional[PDFSource] = None,
+                             start: int = 0, stop: Optional[int] = None, budget=None) -> TextLineStore:
+        """
+        Extract text lines with formatting information, merging adjacent spans
+        
+        With a budget tracker, reading stops after the page that exhausts the
+        time or memory budget. Page-parallel reads are not checked; the worker
+        pool's hard limits bound them instead.
+        """
+        stop = len(doc) if stop is None else stop
+        if (self.page_workers > 1 and isinstance(pdf_path, str) and
+                stop - start >= 2 * self.min_pages_per_worker):
+            with self._metrics.stage("get_text"):
+                lines = self._extract_text_blocks_parallel(pdf_path, start, stop)
+            self._metrics.count("pages", stop - start)
+            self._metrics.count("lines", len(lines))
+            if budget is not None:
+                budget.pages_read += stop - start
+            return lines
+        
+        lines = TextLineStore()
+        for page_num in range(start, stop):
+            self._extract_page_lines(doc[page_num], page_num, lines)
+            if budget is not None and budget.page_done(stop - page_num - 1):
+                break
+        
+        return lines
+    
+    def _extract_text_blocks_parallel(self, pdf_path: str, first_page: int, stop: int) -> TextLineStore:
+        """Split the page range across worker processes and merge the blocks in page order"""
+        if self._page_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from batch_processing import get_mp_context
+            self._page_pool = ProcessPoolExecutor(max_workers=self.page_workers,
+                                                  mp_context=get_mp_context())
+        
+        # Several chunks per worker so one dense stretch of pages doesn't leave the others idle
+        page_count = stop - first_page
+        chunk_count = min(self.page_workers * 4, max(1, page_count // self.min_pages_per_worker))
+        chunk_size = -(-page_count // chunk_count)
+        ranges = [(start, min(start + chunk_size, stop))
+                  for start in range(first_page, stop, chunk_size)]
+        
+        lines = TextLineStore()
+        try:
+            for chunk in self._page_pool.map(_extract_page_range, [pdf_path] * len(ranges),
+                                             [r[0] for r in ranges], [r[1] for r in ranges],
+                                             [self.page_cache_dir] * len(ranges)):
+                lines.extend(chunk)
+        except Exception:
+            # A broken pool can't be reused; start a fresh one for the next document
+            self.close()
+            raise
+        return lines
+    
+    def _extract_page_lines(self, page: fitz.Page, page_num: int, lines: TextLineStore) -> TextLineStore:
+        """Append the merged text lines of a single page to the line store"""
+        metrics = self._metrics
+        lines_before = len(lines)
+        page_cache = self._page_cache
+        cache_key = None
+        if page_cache is not None:
+            with metrics.stage("page_cache"):
+                cache_key = page_cache.key(page)
+                hit = cache_key is not None and page_cache.get(cache_key, page_num + 1, lines)
+            if hit:
+                metrics.count("page_cache_hits")
+                metrics.count("pages")
+                metrics.count("lines", len(lines) - lines_before)
+                return lines
+        
+        load_pymupdf()  # Callers may pass pages of a document they opened themselves
+        with metrics.stage("get_text"):
+            blocks = page.get_text("dict", flags=TEXT_EXTRACTION_FLAGS)
+        page_records = []  # This page's lines for the page cache, taken before the store's text buffer
+        
+        for block in blocks["blocks"]:
+            if "lines" in block:
+                for line in block["lines"]:
+                    # Merge spans in the same line to handle split text
+                    line_text = ""
+                    line_font_size = 0
+                    line_font_name = ""
+                    line_flags = 0
+                    line_bbox = None
+                    
+                    for span in line["spans"]:
+                        text = span["text"].strip()
+                        if text:
+                            if line_text:
+                                line_text += " " + text
+                            else:
+                                line_text = text
+                                line_font_size = span["size"]
+                                line_font_name = span["font"]
+                                line_flags = span["flags"]
+                                line_bbox = span["bbox"]
+                    
+                    if line_text:
+                        lines.append(line_text, page_num + 1, line_font_size,
+                                     line_font_name, line_flags, line_bbox)
+                        if cache_key is not None:
+                            page_records.append([line_text, line_font_size, line_font_name, line_flags,
+                                                 list(line_bbox)])
+        
+        if cache_key is not None:
+            with metrics.stage("page_cache"):
+                page_cache.put(cache_key, page_records)
+        metrics.count("pages")
+        metrics.count("lines", len(lines) - lines_before)
+        return lines
+    
+    def _iter_page_lines(self, doc: fitz.Document, start: int = 0,
+                         stop: Optional[int] = None, budget=None) -> Iterator[TextLineStore]:
+        """Yield one line store per page without holding the whole document"""
+        stop = len(doc) if stop is None else stop
+        for page_num in range(start, stop):
+            yield self._extract_page_lines(doc[page_num], page_num, TextLineStore())
+            if budget is not None and budget.page_done(stop - page_num - 1):
+                return
+    
+    def _scan_font_sizes(self, doc: fitz.Document, start: int = 0, stop: Optional[int] = None, budget=None):
+        """
+        First streaming pass: build the font-size histogram
+        
+        Returns:
+            Tuple of (font size Counter, lines of the first two pages for title detection,
+            RunningTextIndex or None if running text is kept)
+        """
+        font_size_counts = Counter()
+        first_pages_lines = TextLineStore()
+        running_text = RunningTextIndex() if self.drop_running_text else None
+        for page_lines in self._iter_page_lines(doc, start, stop, budget):
+            font_size_counts.update(page_lines.font_sizes)
+            if running_text is not None:
+                running_text.add(page_lines)
+            if page_lines.pages and page_lines.pages[0] <= 2:
+                first_pages_lines.extend(page_lines)
+        return font_size_counts, first_pages_lines, running_text
+    
+    def _iter_outline_streaming(self, doc: fitz.Document, font_size_counts: Counter,
+                                start: int = 0, stop: Optional[int] = None,
+                                running_text: Optional[RunningTextIndex] = None) -> Iterator[Dict]:
+        """Second streaming pass: classify lines page by page and emit headings as they are found"""
+        stats = FontStatistics.from_counts(font_size_counts, self.font_size_threshold,
+                                           self.font_size_tolerance)
+        if stats is None:
+            return
+        processed_texts = set()
+        rejected_lines = set()
+        headings = (heading
+                    for page_lines in self._iter_page_lines(doc, start, stop)
+                    for heading in self._iter_headings(page_lines, stats, processed_texts,
+                                                       rejected_lines, running_text))
+        yield from self._iter_improved_hierarchy(headings)
+    
+    def iter_outline(self, pdf_path: PDFSource) -> Iterator[Dict]:
+        """
+        Stream the outline of a PDF with bounded memory
+        
+        Headings are yielded in document order as the second pass reaches them,
+        so callers can start consuming before the last page has been read.
+        """
+        with open_pdf(pdf_path, self.mmap_min_bytes) as doc:
+            start, stop = self._page_bounds(doc)
+            budget = self.budget.start() if self.budget is not None else None
+            if budget is not None:
+                stop = budget.limit_pages(start, stop)
+            font_size_counts, _, running_text = self._scan_font_sizes(doc, start, stop, budget)
+            if budget is not None:
+                if budget.reason is not None:
+                    logger.warning(f"{describe_source(pdf_path)}: {budget.reason} budget reached after "
+                                   f"{budget.pages_read} pages; outline is partial")
+                stop = start + budget.pages_read
+            yield from islice(self._iter_outline_streaming(doc, font_size_counts, start, stop, running_text),
+                              self.max_headings)
+    
+    def _extract_title_from_content(self, lines: TextLineStore) -> Optional[str]:
         """Extract title from the first page content"""
-        if not text_blocks:
+        if not len(lines):
             return None
         
-        # Look for the largest font size on the first few pages
-        first_pages_blocks = [block for block in text_blocks if block["page"] <= 2]
-        if not first_pages_blocks:
+        # Look for the largest font size on the first few pages (lines are in page order)
+        first_pages_count = lines.count_pages_upto(2)
+        if not first_pages_count:
             return None
         
         # Find the largest font size
-        max_font_size = max(block["font_size"] for block in first_pages_blocks)
+        max_font_size = max(lines.font_sizes[:first_pages_count])
         
         # Get text with the largest font size (likely title)
         title_candidates = []
-        for block in first_pages_blocks:
-            if block["font_size"] >= max_font_size - 0.5:  # Tighter variance
-                text = block["text"].strip()
+        for i in range(first_pages_count):
+            if lines.font_sizes[i] >= max_font_size - 0.5:  # Tighter variance
+                text = lines.text(i).strip()
+                text_lower = text.lower()
                 # Filter out obvious non-titles
                 if (len(text) >= 5 and len(text) <= 200 and 
-                    not re.match(r'^\d+$', text) and  # Not just numbers
-                    not re.match(r'^page \d+', text.lower()) and  # Not page numbers
-                    not text.lower().startswith('http') and  # Not URLs
+                    not TITLE_SKIP_RULES.match(text_lower) and  # Numbers, page numbers, chapter headers
+                    not text_lower.startswith('http') and  # Not URLs
                     not '@' in text and  # Not emails
-                    not text.lower().startswith('welcome to') and  # Skip welcome messages
-                    not re.match(r'^(chapter|section|part)\s+\d+', text.lower()) and  # Skip chapter headers
-                    not text.lower().endswith('challenge')):  # Skip challenge titles that are too generic
-                    title_candidates.append((text, block["page"]))
+                    not text_lower.startswith('welcome to') and  # Skip welcome messages
+                    not text_lower.endswith('challenge')):  # Skip challenge titles that are too generic
+                    title_candidates.append((text, lines.pages[i]))
         
         if title_candidates:
             # Prefer titles from the first page, then by length (longer is often better for titles)
@@ -150,98 +557,102 @@ class PDFOutlineExtractor:
             return title_candidates[0][0]
         
         # Fallback: try to find any reasonable title-like text
-        for block in first_pages_blocks:
-            text = block["text"].strip()
+        for i in range(first_pages_count):
+            text = lines.text(i).strip()
             if (len(text) >= 10 and len(text) <= 200 and
-                not re.match(r'^\d+', text) and
+                not LEADING_DIGIT.match(text) and
                 (text[0].isupper() or text.istitle())):
                 return text
         
         return None
     
-    def _extract_headings(self, text_blocks: List[Dict]) -> List[Dict]:
+    def _extract_headings(self, lines: TextLineStore, max_headings: Optional[int] = None) -> List[Dict]:
         """Extract headings based on improved font analysis and content patterns"""
-        if not text_blocks:
+        if not len(lines):
             return []
         
-        # Analyze font sizes more intelligently
-        font_sizes = [block["font_size"] for block in text_blocks]
-        font_size_counts = Counter(font_sizes)
-        
-        # Get the most common font sizes (likely body text and headings)
-        common_sizes = font_size_counts.most_common(10)
-        body_font_size = common_sizes[0][0]  # Most common is likely body text
-        
-        # Find distinct font sizes that could be headings
-        unique_sizes = sorted(set(font_sizes), reverse=True)
-        heading_sizes = []
-        
-        for size in unique_sizes:
-            if size > body_font_size + self.font_size_threshold:
-                # Check if this size has enough occurrences to be a heading level
-                count = font_size_counts[size]
-                if count >= 1:  # At least one occurrence
-                    heading_sizes.append(size)
-        
-        # Limit to top 3 heading sizes and map to levels
-        heading_sizes = heading_sizes[:3]
-        font_to_level = {}
-        for i, font_size in enumerate(heading_sizes):
-            font_to_level[font_size] = f"H{i+1}"
-        
-        headings = []
-        processed_texts = set()  # Track processed text to avoid duplicates
-        
-        for block in text_blocks:
-            text = block["text"].strip()
-            font_size = block["font_size"]
+        metrics = self._metrics
+        # Font-size histogram, heading tiers and candidate lines in one bulk pass
+        with metrics.stage("font_statistics"):
+            stats = compute_font_statistics(lines, self.font_size_threshold, self.font_size_tolerance)
+        running_text = None
+        if self.drop_running_text:
+            with metrics.stage("running_text"):
+                running_text = RunningTextIndex().add(lines)
+        
+        if metrics.enabled:
+            # Materialize each stage so it can be timed on its own (gives up the max_headings early exit)
+            with metrics.stage("classify"):
+                headings = list(self._iter_headings(lines, stats, running_text=running_text))
+            with metrics.stage("hierarchy"):
+                return list(islice(self._iter_improved_hierarchy(headings), max_headings))
+        
+        headings = self._iter_headings(lines, stats, running_text=running_text)
+        
+        # Post-process to improve hierarchy; both stages are lazy, so max_headings stops classification early
+        return list(islice(self._iter_improved_hierarchy(headings), max_headings))
+    
+    def _iter_headings(self, lines: TextLineStore, stats: FontStatistics,
+                       processed_texts: Optional[set] = None, rejected_lines: Optional[set] = None,
+                       running_text: Optional[RunningTextIndex] = None) -> Iterator[Dict]:
+        """Classify candidate lines in order and yield the ones that are headings"""
+        if processed_texts is None:
+            processed_texts = set()  # Track processed text to avoid duplicates
+        if rejected_lines is None:
+            rejected_lines = set()  # (text, size, flags) already classified as not a heading
+        
+        metrics = self._metrics
+        candidates = heading_candidates(lines, stats, self.min_heading_length, self.max_heading_length)
+        metrics.count("candidates", len(candidates))
+        if running_text is not None:
+            kept = running_text.drop_running(lines, candidates, stats)
+            metrics.count("running_text", len(candidates) - len(kept))
+            candidates = kept
+        for i in candidates:
+            text = lines.text(i).strip()
             
             # Skip if we've already processed this exact text
             if text in processed_texts:
                 continue
             
-            level = None
+            # The verdict only depends on text, size and flags, so a repeated line is rejected again
+            line_key = (text, lines.font_sizes[i], lines.flags[i])
+            if line_key in rejected_lines:
+                metrics.count("repeated_rejections")
+                continue
             
             # Check font-based heading detection first
-            if font_size in font_to_level:
-                level = font_to_level[font_size]
-            else:
+            level = stats.level_for_size(lines.font_sizes[i])
+            if level is None:
                 # Check for content-based patterns (numbered sections, etc.)
-                level = self._detect_heading_by_content(text, block)
+                level = self._detect_heading_by_content(text, lines.flags[i])
             
-            if level and self._is_valid_heading(text):
-                headings.append({
-                    "level": level,
-                    "text": text,
-                    "page": block["page"]
-                })
-                processed_texts.add(text)
-        
-        # Post-process to improve hierarchy
-        headings = self._improve_heading_hierarchy(headings)
-        
-        return headings
+            if not level:
+                rejected_lines.add(line_key)
+                continue
+            
+            rejection = self._heading_rejection(text)
+            if rejection is not None:
+                metrics.count("rejected." + rejection)
+                rejected_lines.add(line_key)
+                continue
+            
+            yield {
+                "level": level,
+                "text": text,
+                "page": lines.pages[i]
+            }
+            processed_texts.add(text)
     
-    def _detect_heading_by_content(self, text: str, block: Dict) -> Optional[str]:
+    def _detect_heading_by_content(self, text: str, flags: int) -> Optional[str]:
         """Detect headings based on content patterns"""
-        # Check for numbered sections (highest priority)
-        if re.match(r'^\d+\.?\s+[A-Z]', text):
-            return "H1"
-        
-        # Check for subsection patterns
-        if re.match(r'^\d+\.\d+\.?\s+[A-Z]', text):
-            return "H2"
-        
-        # Check for sub-subsection patterns
-        if re.match(r'^\d+\.\d+\.\d+\.?\s+[A-Z]', text):
-            return "H3"
-        
-        # Check for chapter/section keywords
-        if re.match(r'^(Chapter|Section|Part|Appendix)\s+\d*', text, re.IGNORECASE):
-            return "H1"
+        # Numbered sections, subsections and chapter/section keywords, in priority order
+        rule = CONTENT_LEVEL_RULES.match(text)
+        if rule:
+            return CONTENT_LEVELS[rule]
         
         # Check for bold text with heading characteristics
-        if block["flags"] & 2**4:  # Bold flag
+        if flags & 2**4:  # Bold flag
             if self._matches_heading_pattern(text):
                 return "H2"  # Default to H2 for pattern-based detection
         
@@ -254,26 +665,26 @@ class PDFOutlineExtractor:
             return False
         
         # Skip if ends with sentence punctuation (except numbered sections)
-        if re.search(r'[.!?]$', text) and not re.match(r'^\d+\.', text):
+        if SENTENCE_END.search(text) and not NUMBERED_PREFIX.match(text):
             return False
         
         # Skip table-like content (multiple columns of short words)
-        if len(text.split()) > 1 and all(len(word) <= 3 for word in text.split()):
+        words = text.split()
+        if len(words) > 1 and all(len(word) <= 3 for word in words):
             return False
         
         # Check for numbered section patterns (already handled in content detection)
-        if re.match(r'^\d+\.?\s+[A-Z]', text):
+        if NUMBERED_HEADING.match(text):
             return True
         
         # Check for heading-like characteristics
-        if re.match(r'^[A-Z][a-z]', text):  # Starts with capital letter
+        if CAPITALIZED_WORD.match(text):  # Starts with capital letter
             return True
         
         if text.isupper() and len(text) > 3:  # All caps (but not too short)
             return True
         
         # Check for title case
-        words = text.split()
         if len(words) >= 2 and all(word[0].isupper() for word in words if len(word) > 3):
             return True
         
@@ -281,146 +692,513 @@ class PDFOutlineExtractor:
     
     def _is_valid_heading(self, text: str) -> bool:
         """Validate if text is a reasonable heading"""
+        return self._heading_rejection(text) is None
+    
+    def _heading_rejection(self, text: str) -> Optional[str]:
+        """Name of the first validation rule that rejects text as a heading, or None if it is valid"""
         # Length constraints
         if len(text) < self.min_heading_length or len(text) > self.max_heading_length:
-            return False
+            return "length"
         
         # Must contain at least some letters
-        if len(re.sub(r'[^a-zA-Z]', '', text)) < 2:
-            return False
+        if len(NON_LETTERS.sub('', text)) < 2:
+            return "too_few_letters"
         
         # Filter out numbered list items that are not proper headings
-        if re.match(r'^\d+\.\s+[A-Z].*\(e\.g\.,.*\)$', text):  # "1. Something (e.g., example)"
-            return False
-        
-        if re.match(r'^\d+\.\s+A\s+(sample|working|README).*', text):  # List items starting with "A sample/working/README"
-            return False
-        
-        # Filter out common non-heading patterns
-        skip_patterns = [
-            r'^\d+$',  # Just numbers
-            r'^page \d+',  # Page numbers
-            r'^figure \d+',  # Figure captions
-            r'^table \d+',  # Table captions
-            r'^\w+@\w+\.',  # Email addresses
-            r'^https?://',  # URLs
-            r'^www\.',  # Web addresses
-            r'^\d+\.\d+$',  # Version numbers
-            r'^[A-Z]{1,3}$',  # Short abbreviations
-            r'^\d+[a-z]?$',  # Numbers with optional letter
-            r'^[^\w\s]+$',  # Only symbols
-            r'^\d+\s*-\s*\d+$',  # Page ranges
-            r'^(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4}$',  # Dates
-            r'^\d+\.\s+(A|An|The)\s+(sample|working|README|Git).*',  # Specific list patterns
-            r'^\d+\.\s+All\s+dependencies.*',  # "All dependencies" pattern
-            r'^\d+\.\s+(Document|Extracted|Sub-section|Metadata).*:$',  # Technical list items ending with colon
-        ]
+        rule = LIST_ITEM_RULES.match(text)
+        if rule:
+            return rule
         
+        # Filter out common non-heading patterns (one combined regex)
         text_lower = text.lower().strip()
-        for pattern in skip_patterns:
-            if re.match(pattern, text_lower):
-                return False
+        rule = SKIP_RULES.match(text_lower)
+        if rule:
+            return rule
         
         # Skip common table headers and labels
-        table_words = ['criteria', 'max', 'points', 'total', 'description', 'constraint', 'requirement', 
-                      'deliverables', 'japanese)', 'bonus:', 'theme:']
-        if text_lower in table_words:
-            return False
+        if text_lower in TABLE_WORDS:
+            return "table_word"
         
         # Skip very generic single words
-        if len(text.split()) == 1 and len(text) < 8:
-            generic_words = ['title', 'name', 'date', 'time', 'location', 'contact', 'email', 'phone']
-            if text_lower in generic_words:
-                return False
+        words = text.split()
+        if len(words) == 1 and len(text) < 8 and text_lower in GENERIC_WORDS:
+            return "generic_word"
         
         # Skip incomplete sentences or fragments
         if text.endswith(' and') or text.endswith(' or') or text.endswith(','):
-            return False
+            return "fragment"
         
         # Skip very short headings that are likely noise
-        if len(text.split()) == 1 and len(text) < 5:
-            return False
+        if len(words) == 1 and len(text) < 5:
+            return "short_single_word"
         
-        return True
+        return None
     
     def _improve_heading_hierarchy(self, headings: List[Dict]) -> List[Dict]:
         """Improve heading hierarchy based on content analysis"""
         if not headings:
             return headings
         
-        improved_headings = []
+        return list(self._iter_improved_hierarchy(headings))
+    
+    def _iter_improved_hierarchy(self, headings: Iterable[Dict]) -> Iterator[Dict]:
+        """Adjust heading levels in order; only the previous heading is needed as context"""
+        prev_heading = None
         
-        for i, heading in enumerate(headings):
+        for heading in headings:
             text = heading["text"]
             current_level = heading["level"]
             
             # Check for clear H1 patterns
-            if (re.match(r'^(Chapter|Section|Part|Round)\s+\d+', text, re.IGNORECASE) or
-                re.match(r'^\d+\.?\s+[A-Z]', text) or
-                re.match(r'^[A-Z][^a-z]*$', text) and len(text) > 5):  # All caps titles
+            if (CHAPTER_HEADING.match(text) or
+                NUMBERED_HEADING.match(text) or
+                ALL_CAPS_HEADING.match(text) and len(text) > 5):  # All caps titles
                 current_level = "H1"
             
             # Check for clear H3 patterns (sub-subsections)
-            elif (re.match(r'^\d+\.\d+\.\d+', text) or
+            elif (SUBSUBSECTION_PREFIX.match(text) or
                   (current_level == "H2" and len(text) < 30 and 
                    any(word in text.lower() for word in ['tip', 'note', 'example', 'summary']))):
                 current_level = "H3"
             
             # Adjust based on context (previous headings)
-            if i > 0:
-                prev_heading = improved_headings[-1]
-                
+            if prev_heading is not None:
                 # If previous was H1 and current is also H1, but current looks like subsection
                 if (prev_heading["level"] == "H1" and current_level == "H1" and
                     len(text) < len(prev_heading["text"]) and
-                    not re.match(r'^(Chapter|Section|Part|Round)\s+\d+', text, re.IGNORECASE)):
+                    not CHAPTER_HEADING.match(text)):
                     current_level = "H2"
             
-            improved_headings.append({
+            prev_heading = {
                 "level": current_level,
                 "text": text,
                 "page": heading["page"]
-            })
-        
-        return improved_headings
+            }
+            yield prev_heading
 
-def process_pdfs():
-    """Process all PDFs in the input directory"""
-    input_dir = "/app/input"
-    output_dir = "/app/output"
+def describe_source(source: PDFSource) -> str:
+    """Short description of a PDF source for log messages"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    with memoryview(source) as view:
+        return f"<in-memory PDF, {view.nbytes} bytes>"
+
+@contextmanager
+def open_pdf(source: PDFSource, mmap_min_bytes: Optional[int] = None) -> Iterator[fitz.Document]:
+    """
+    Open a PDF from a path or from memory and close it afterwards
+    
+    In-memory sources are handed to PyMuPDF's stream interface as a buffer
+    view, which PyMuPDF 1.24 and later reads without copying. Older versions
+    only take bytes, so there the view is copied once into bytes. Path
+    inputs of at least mmap_min_bytes are memory-mapped and opened the same way.
+    """
+    mapped = None
+    view = None  # buffer view we created, released before the mapping is closed
+    if isinstance(source, (str, os.PathLike)):
+        if mmap_min_bytes is None or os.path.getsize(source) < mmap_min_bytes:
+            doc = load_pymupdf().open(source)
+            try:
+                yield doc
+            finally:
+                doc.close()
+            return
+        with open(source, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+    elif not isinstance(source, (bytes, memoryview)):
+        # PyMuPDF copies bytearrays and rejects mmap objects, but reads a memoryview of either in place
+        view = memoryview(source)
+    
+    try:
+        doc = _open_stream(source if view is None else view)
+        try:
+            yield doc
+        finally:
+            doc.close()
+            del doc
+    finally:
+        if view is not None:
+            view.release()
+        if mapped is not None:
+            mapped.close()
+
+# Whether the installed PyMuPDF opens memoryview streams; None until the first in-memory open finds out
+_STREAM_TAKES_BUFFERS = None
+
+def _open_stream(stream: Union[bytes, memoryview]) -> fitz.Document:
+    """Open an in-memory PDF, copying a view into bytes for PyMuPDF versions that only take bytes"""
+    global _STREAM_TAKES_BUFFERS
+    pymupdf = load_pymupdf()
+    if isinstance(stream, memoryview) and _STREAM_TAKES_BUFFERS is not False:
+        try:
+            doc = pymupdf.open(stream=stream, filetype="pdf")
+        except TypeError:
+            if _STREAM_TAKES_BUFFERS:
+                raise
+            # PyMuPDF before 1.24 raises TypeError("bad type: 'stream'") for anything but bytes
+            _STREAM_TAKES_BUFFERS = False
+        else:
+            _STREAM_TAKES_BUFFERS = True
+            return doc
+    if isinstance(stream, memoryview):
+        stream = stream.tobytes()
+    return pymupdf.open(stream=stream, filetype="pdf")
+
+def page_lines_fingerprint() -> str:
+    """Hash of what turns a page into line records: extractor version, get_text flags and PyMuPDF version"""
+    fitz = load_pymupdf()
+    settings = f"{EXTRACTOR_VERSION}\n{TEXT_EXTRACTION_FLAGS}\n{fitz.VersionBind}"
+    return hashlib.blake2b(settings.encode(), digest_size=16).hexdigest()
+
+# Page worker state, kept across chunks: one extractor (and page cache) per cache directory, and the
+# document of the last chunk, so the chunks of one PDF share its PageFingerprinter's object digests
+_range_extractors: Dict[Optional[str], "PDFOutlineExtractor"] = {}
+_range_document = None  # ((path, inode, mtime, size), open document)
+
+def _extract_page_range(pdf_path: str, start: int, stop: int,
+                        page_cache_dir: Optional[str] = None) -> TextLineStore:
+    """Worker entry point: extract pages [start, stop) of the PDF at pdf_path, reusing the last chunk's document"""
+    global _range_document
+    extractor = _range_extractors.get(page_cache_dir)
+    if extractor is None:
+        extractor = _range_extractors[page_cache_dir] = PDFOutlineExtractor(page_cache_dir=page_cache_dir)
+    stat = os.stat(pdf_path)
+    identity = (pdf_path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _range_document is None or _range_document[0] != identity:
+        if _range_document is not None:
+            _range_document[1].close()
+            _range_document = None
+        _range_document = (identity, load_pymupdf().open(pdf_path))
+    doc = _range_document[1]
+    lines = TextLineStore()
+    for page_num in range(start, stop):
+        extractor._extract_page_lines(doc[page_num], page_num, lines)
+    return lines
+
+ERROR_RESULT = {
+    "title": "Error Processing Document",
+    "outline": []
+}
+
+def iter_pdf_filenames(input_dir: str):
+    """Yield PDF file names from the input directory without listing it all up front"""
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith('.pdf'):
+                yield entry.name
+
+def process_pdfs(input_dir: str = "/app/input", output_dir: str = "/app/output",
+                 workers: int = 1, timeout: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, page_workers: int = 1,
+                 streaming: bool = False, font_size_tolerance: float = 0.0,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                 incremental: bool = False, mmap_min_bytes: Optional[int] = None,
+                 title_only: bool = False, page_range: Optional[Tuple[int, int]] = None,
+                 max_headings: Optional[int] = None, use_toc: bool = False, instrumentation=None,
+                 output_format: str = "pretty", json_backend: str = "auto", budget=None,
+                 on_result: Optional[Callable[[str, bool], None]] = None,
+                 page_cache_dir: Optional[str] = None, drop_running_text: bool = False):
+    """
+    Process all PDFs in the input directory
+    
+    Args:
+        input_dir: Directory containing the PDF files
+        output_dir: Directory the JSON results are written to
+        workers: Number of worker processes; 1 processes files serially in-process
+        timeout: Per-file timeout in seconds (parallel mode only)
+        max_in_flight: Maximum number of files submitted but not yet written
+        page_workers: Processes used to split the pages of one large PDF (serial mode only)
+        streaming: Use the two-pass streaming extractor with bounded memory
+        font_size_tolerance: Font sizes within this of a tier's smallest size share its heading level
+        cache_dir: Directory of the content-addressed result cache (disabled if None)
+        cache_max_bytes: Size bound of the result cache
+        incremental: Skip inputs unchanged since the last run and delete outputs of removed inputs
+        mmap_min_bytes: Memory-map inputs at least this large instead of reading them through file I/O
+        title_only: Only extract the title (reads the metadata or the first two pages)
+        page_range: 1-based inclusive (first, last) pages to build the outline from
+        max_headings: Stop after this many outline entries
+        use_toc: Take the outline from the embedded bookmarks when they pass the quality check
+        instrumentation: instrumentation.Instrumentation that receives per-document stage timings and counters
+        output_format: "pretty" or "compact" JSON per PDF, or "jsonl" for one results.jsonl per batch
+        json_backend: "json", "orjson" or "auto" (orjson when installed; the output bytes are the same)
+        budget: resource_governor.ResourceBudget; time and memory budgets run extraction in supervised workers
+        on_result: Called with (filename, ok) after each output is written
+        page_cache_dir: Directory of the per-page line cache; unchanged pages of new revisions skip get_text
+        drop_running_text: Drop running headers, footers and page numbers before heading classification
+    """
+    if output_format == "jsonl" and incremental:
+        raise ValueError("incremental runs need one output file per PDF; use the pretty or compact output format")
     
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
+    writer = create_writer(output_dir, output_format, json_backend)
     
-    extractor = PDFOutlineExtractor()
+    extractor_kwargs = {"streaming": streaming, "font_size_tolerance": font_size_tolerance,
+                        "mmap_min_bytes": mmap_min_bytes, "title_only": title_only,
+                        "page_range": page_range, "max_headings": max_headings, "use_toc": use_toc,
+                        "budget": budget, "page_cache_dir": page_cache_dir,
+                        "drop_running_text": drop_running_text}
+    
+    filenames = None
+    manifest = None
+    if incremental:
+        from manifest import IncrementalManifest
+        manifest = IncrementalManifest(output_dir, PDFOutlineExtractor(**extractor_kwargs).fingerprint())
+        plan = manifest.plan(input_dir)
+        manifest.remove_outputs(plan.removed)
+        logger.info(f"Incremental run: {len(plan.to_process)} new or changed, "
+                    f"{len(plan.unchanged)} unchanged, {len(plan.removed)} removed")
+        filenames = plan.to_process
+        caller_on_result = on_result
+        
+        def on_result(filename: str, ok: bool):
+            if ok:
+                manifest.record(filename)
+            if caller_on_result is not None:
+                caller_on_result(filename, ok)
+    
+    try:
+        if workers > 1 or timeout is not None or (budget is not None and budget.supervised):
+            from batch_processing import process_pdfs_parallel
+            process_pdfs_parallel(input_dir, output_dir, workers=workers,
+                                  timeout=timeout, max_in_flight=max_in_flight,
+                                  extractor_kwargs=extractor_kwargs,
+                                  cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                                  filenames=filenames, on_result=on_result,
+                                  instrumentation=instrumentation, writer=writer)
+        else:
+            extractor = PDFOutlineExtractor(page_workers=page_workers, instrumentation=instrumentation,
+                                            **extractor_kwargs)
+            if cache_dir:
+                from result_cache import CachedExtractor, ResultCache
+                extractor = CachedExtractor(extractor, ResultCache(cache_dir, cache_max_bytes))
+            try:
+                _process_serial(extractor, input_dir, output_dir, filenames, on_result, instrumentation, writer)
+            finally:
+                extractor.close()
+    except BaseException:
+        # Keep the previous batch file rather than publishing a partial one
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+def _process_serial(extractor, input_dir: str, output_dir: str,
+                    filenames: Optional[Iterable[str]] = None,
+                    on_result: Optional[Callable[[str, bool], None]] = None,
+                    instrumentation=None, writer=None):
+    """Process PDFs one after another in this process"""
+    if writer is None:
+        writer = create_writer(output_dir)
+    if filenames is None:
+        filenames = iter_pdf_filenames(input_dir)
     
     # Process all PDF files in input directory
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith('.pdf'):
-            pdf_path = os.path.join(input_dir, filename)
-            output_filename = filename.replace('.pdf', '.json')
-            output_path = os.path.join(output_dir, output_filename)
-            
-            logger.info(f"Processing {filename}...")
-            
+    for filename in filenames:
+        pdf_path = os.path.join(input_dir, filename)
+        
+        logger.info(f"Processing {filename}...")
+        
+        # One metrics record per file, covering extraction and writing
+        scope = instrumentation.document(filename) if instrumentation is not None else nullcontext(NULL_METRICS)
+        with scope as metrics:
             try:
                 result = extractor.extract_title_and_outline(pdf_path)
                 
                 # Write result to JSON file
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=2, ensure_ascii=False)
+                with metrics.stage("write"):
+                    output_path = writer.write(filename, result)
                 
-                logger.info(f"Successfully processed {filename} -> {output_filename}")
+                logger.info(f"Successfully processed {filename} -> {os.path.basename(output_path)}")
+                ok = result != ERROR_RESULT and not is_load_dependent(result)
                 
             except Exception as e:
                 logger.error(f"Failed to process {filename}: {str(e)}")
                 # Write error result
-                error_result = {
-                    "title": "Error Processing Document",
-                    "outline": []
-                }
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(error_result, f, indent=2, ensure_ascii=False)
+                writer.write(filename, ERROR_RESULT)
+                ok = False
+        
+        if on_result is not None:
+            on_result(filename, ok)
+
+def parse_page_range(value: str) -> Tuple[int, int]:
+    """Parse "5" or "3-7" into a 1-based inclusive (first, last) page range"""
+    first, _, last = value.partition('-')
+    try:
+        page_range = (int(first), int(last or first))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid page range {value!r}, expected FIRST or FIRST-LAST")
+    if not 1 <= page_range[0] <= page_range[1]:
+        raise argparse.ArgumentTypeError(f"invalid page range {value!r}, pages are 1-based and FIRST <= LAST")
+    return page_range
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point"""
+    from instrumentation import StartupTimer
+    startup = StartupTimer()
+    
+    parser = argparse.ArgumentParser(description="Extract title and H1-H3 outline from PDFs")
+    parser.add_argument("--input-dir", default="/app/input", help="Directory containing PDF files")
+    parser.add_argument("--output-dir", default="/app/output", help="Directory for JSON results")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("OUTLINE_WORKERS", "1")),
+                        help="Worker processes for batch mode (0 = one per CPU)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Per-file timeout in seconds (enables the worker pool)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Maximum files queued to the worker pool at once")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="Processes used to split the pages of one large PDF (0 = one per CPU)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Two-pass page-by-page extraction with flat peak memory")
+    parser.add_argument("--cache-dir", default=os.environ.get("OUTLINE_CACHE_DIR"),
+                        help="Reuse results for PDFs seen before (content-addressed cache directory)")
+    parser.add_argument("--cache-max-mb", type=int, default=512,
+                        help="Size bound of the result cache in MB")
+    parser.add_argument("--page-cache-dir", default=os.environ.get("OUTLINE_PAGE_CACHE_DIR"),
+                        help="Reuse extracted lines of pages seen before, e.g. in earlier revisions of a document")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process new or changed PDFs; remove outputs of deleted PDFs")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process PDFs as they appear in the input directory")
+    parser.add_argument("--settle-seconds", type=float, default=1.0,
+                        help="Watch mode: wait until a file is unchanged this long before processing it")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Watch mode: rescan interval when inotify is unavailable")
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="Watch mode: maximum settled files waiting for a worker")
+    parser.add_argument("--title-only", action="store_true",
+                        help="Only extract titles (reads at most the first two pages)")
+    parser.add_argument("--pages", type=parse_page_range, default=None, metavar="FIRST[-LAST]",
+                        help="Only build the outline from these pages (1-based, inclusive)")
+    parser.add_argument("--font-size-tolerance", type=float, default=0.0, metavar="PT",
+                        help="Treat font sizes up to this many points apart as one size tier (absorbs float noise)")
+    parser.add_argument("--max-headings", type=int, default=None,
+                        help="Stop after this many outline entries")
+    parser.add_argument("--drop-running-text", action="store_true",
+                        help="Drop text repeated at the same height on most pages (running headers, footers, "
+                             "page numbers) before heading classification")
+    parser.add_argument("--use-bookmarks", action="store_true",
+                        help="Use the PDF's embedded outline when it checks out against the page text")
+    parser.add_argument("--metrics", action="append", default=[], metavar="SINK",
+                        help="Report per-document stage timings and counters: log, json:PATH or "
+                             "prometheus:PATH (repeatable)")
+    parser.add_argument("--enqueue", default=None, metavar="QUEUE_DB",
+                        help="Coordinator: shard the input directory into this SQLite work queue and exit")
+    parser.add_argument("--shard-size", type=int, default=100, help="Coordinator: files per leased shard")
+    parser.add_argument("--queue-worker", default=None, metavar="QUEUE_DB",
+                        help="Lease shards from this work queue until it is drained (--workers processes)")
+    parser.add_argument("--lease-seconds", type=float, default=300.0,
+                        help="Queue worker: a shard not renewed for this long is re-issued to another worker")
+    parser.add_argument("--max-pages", type=int, default=None,
+                        help="Budget: read at most this many pages per PDF; the outline is marked truncated")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Budget: stop reading a PDF after this many seconds and return a partial outline")
+    parser.add_argument("--max-rss-mb", type=float, default=None,
+                        help="Budget: stop reading a PDF once it has grown memory use by this many MB")
+    parser.add_argument("--output-format", choices=("pretty", "compact", "jsonl"), default="pretty",
+                        help="Indented JSON per PDF, compact JSON per PDF, or one results.jsonl for the batch")
+    parser.add_argument("--json-backend", choices=("auto", "json", "orjson"), default="auto",
+                        help="JSON serializer; auto uses orjson when installed")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="Log import and start-up times and the time to the first finished document")
+    parser.add_argument("--startup-budget", type=float, default=None, metavar="SECONDS",
+                        help="With --startup-report: warn when the time to the first document exceeds this")
+    parser.add_argument("--mmap-min-mb", type=float, default=None,
+                        help="Memory-map input PDFs at least this many MB instead of reading them")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run a local HTTP extraction service instead of processing a directory")
+    parser.add_argument("--host", default="127.0.0.1", help="Service mode: address to bind")
+    parser.add_argument("--port", type=int, default=8080, help="Service mode: port to bind")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Service mode: concurrent requests accepted before answering 429")
+    args = parser.parse_args(argv)
+    
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    page_workers = args.page_workers if args.page_workers > 0 else (os.cpu_count() or 1)
+    mmap_min_bytes = int(args.mmap_min_mb * 1024 * 1024) if args.mmap_min_mb is not None else None
+    budget = None
+    if args.max_pages is not None or args.max_seconds is not None or args.max_rss_mb is not None:
+        from resource_governor import ResourceBudget
+        try:
+            budget = ResourceBudget(args.max_pages, args.max_seconds, args.max_rss_mb)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.font_size_tolerance < 0:
+        parser.error("--font-size-tolerance must not be negative")
+    extractor_kwargs = {"streaming": args.streaming, "mmap_min_bytes": mmap_min_bytes,
+                        "font_size_tolerance": args.font_size_tolerance,
+                        "title_only": args.title_only, "page_range": args.pages,
+                        "max_headings": args.max_headings, "use_toc": args.use_bookmarks,
+                        "budget": budget, "page_cache_dir": args.page_cache_dir,
+                        "drop_running_text": args.drop_running_text}
+    
+    if args.enqueue:
+        from work_queue import LeaseQueue
+        queue = LeaseQueue(args.enqueue)
+        queue.configure(os.path.abspath(args.input_dir), os.path.abspath(args.output_dir))
+        added = queue.enqueue(iter_pdf_filenames(args.input_dir), args.shard_size)
+        logger.info(f"Queued {added} new PDFs in {args.enqueue}: {queue.status()}")
+        queue.close()
+        return
+    if args.queue_worker:
+        from work_queue import run_queue_workers
+        run_queue_workers(args.queue_worker, workers=workers, lease_seconds=args.lease_seconds,
+                          extractor_kwargs=extractor_kwargs, cache_dir=args.cache_dir,
+                          cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                          output_format=args.output_format, timeout=args.timeout)
+        return
+    if args.watch:
+        from watch_daemon import WatchDaemon
+        WatchDaemon(args.input_dir, args.output_dir, workers=workers, timeout=args.timeout,
+                    settle_seconds=args.settle_seconds, poll_interval=args.poll_interval,
+                    queue_size=args.queue_size,
+                    extractor_kwargs=extractor_kwargs,
+                    cache_dir=args.cache_dir,
+                    cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                    output_format=args.output_format, json_backend=args.json_backend).run()
+        return
+    if args.serve:
+        from http_service import DEFAULT_TIMEOUT, ExtractionService
+        service_timeout = args.timeout if args.timeout is not None else DEFAULT_TIMEOUT
+        ExtractionService(args.host, args.port, workers=workers, timeout=service_timeout,
+                          max_pending=args.max_pending, path_root=args.input_dir,
+                          extractor_kwargs=extractor_kwargs,
+                          cache_dir=args.cache_dir,
+                          cache_max_bytes=args.cache_max_mb * 1024 * 1024).serve_forever()
+        return
+    instrumentation = None
+    if args.metrics:
+        from instrumentation import Instrumentation, create_sink
+        try:
+            instrumentation = Instrumentation([create_sink(spec) for spec in args.metrics])
+        except ValueError as e:
+            parser.error(str(e))
+    process_pdfs(args.input_dir, args.output_dir, workers=workers,
+                 timeout=args.timeout, max_in_flight=args.max_in_flight,
+                 page_workers=page_workers, streaming=args.streaming,
+                 font_size_tolerance=args.font_size_tolerance,
+                 cache_dir=args.cache_dir, cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                 incremental=args.incremental, mmap_min_bytes=mmap_min_bytes,
+                 title_only=args.title_only, page_range=args.pages, max_headings=args.max_headings,
+                 use_toc=args.use_bookmarks, instrumentation=instrumentation,
+                 output_format=args.output_format, json_backend=args.json_backend, budget=budget,
+                 on_result=startup.document_done if args.startup_report else None,
+                 page_cache_dir=args.page_cache_dir, drop_running_text=args.drop_running_text)
+    if instrumentation is not None:
+        instrumentation.close()
+    if args.startup_report:
+        report = startup.report(imports=IMPORT_SECONDS, pymupdf_import=PYMUPDF_IMPORT_SECONDS)
+        logger.info(f"startup {json.dumps(report)}")
+        first = report["time_to_first_document"]
+        if args.startup_budget is not None and first is not None and first > args.startup_budget:
+            logger.warning(f"Time to first document {first}s exceeds the {args.startup_budget}s start-up budget")
+
+# How long importing this module took, for --startup-report
+IMPORT_SECONDS = perf_counter() - _IMPORT_STARTED
 
 if __name__ == "__main__":
-    process_pdfs()
\ No newline at end of file
+    main()
\ No newline at end of file
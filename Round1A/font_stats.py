@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Document-wide font statistics for heading detection
+Computes the font-size histogram, heading size tiers and heading candidates in bulk
+"""
+
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from line_store import TextLineStore
+
+# NumPy is optional (the pure-Python path gives the same results) and imported on first use:
+# _UNLOADED until then, None if it isn't installed
+_UNLOADED = object()
+np = _UNLOADED
+
+BOLD_FLAG = 2**4
+
+# First characters that can start a content-based heading ("1. Intro", "Chapter 2", ...).
+# Non-ASCII first characters are always kept because \d and IGNORECASE match beyond ASCII.
+_CONTENT_HEADING_FIRST_CHARS = "0123456789CSPAcspa"
+
+
+def _numpy():
+    global np
+    if np is _UNLOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+class FontStatistics:
+    """Body font size and the font sizes mapped to H1-H3"""
+
+    def __init__(self, body_font_size: float, heading_sizes: List[float], tolerance: float = 0.0,
+                 tiers: Optional[Mapping[float, float]] = None):
+        self.body_font_size = body_font_size
+        self.heading_sizes = heading_sizes
+        self.tolerance = tolerance
+        self.font_to_level: Dict[float, str] = {}
+        for i, font_size in enumerate(heading_sizes):
+            self.font_to_level[font_size] = f"H{i+1}"
+        # Every raw size of the document that falls in a heading tier, so lookups are one dict probe
+        self.size_to_level: Dict[float, str] = dict(self.font_to_level)
+        if tiers is not None:
+            for font_size, tier in tiers.items():
+                if tier in self.font_to_level:
+                    self.size_to_level[font_size] = self.font_to_level[tier]
+
+    def level_for_size(self, font_size: float) -> Optional[str]:
+        return self.size_to_level.get(font_size)
+
+    @classmethod
+    def from_counts(cls, font_size_counts: Mapping[float, int], threshold: float,
+                    tolerance: float = 0.0) -> Optional["FontStatistics"]:
+        """
+        Build statistics from a histogram of raw sizes in first-seen order
+
+        Used directly by the streaming extractor, which only keeps the histogram.
+        """
+        if not font_size_counts:
+            return None
+        tiers, tier_counts = cluster_font_sizes(font_size_counts, tolerance)
+
+        # Most common tier is likely body text; ties go to the tier seen first
+        body_font_size = tier_counts.most_common(1)[0][0]
+        heading_sizes = [size for size in sorted(tier_counts, reverse=True)
+                         if size > body_font_size + threshold]
+        return cls(body_font_size, heading_sizes[:3], tolerance, tiers)
+
+
+def cluster_font_sizes(font_size_counts: Mapping[float, int],
+                       tolerance: float = 0.0) -> Tuple[Dict[float, float], Counter]:
+    """
+    Group the sizes of a histogram into tiers no wider than tolerance
+
+    Returns the tier of every size and the tier histogram in first-seen
+    order. Sizes are walked in ascending order and a new tier starts when a
+    size is more than tolerance above the smallest size of the current one,
+    so float noise (11.9999 next to 12.0) lands in one tier whatever the
+    values are, unlike rounding to a grid. A tier is named after its most
+    common size (ties: the size seen first). Only the distinct sizes are
+    sorted, usually a handful; the lines themselves are counted once.
+    """
+    if not tolerance:
+        return {size: size for size in font_size_counts}, Counter(font_size_counts)
+
+    first_seen = {size: i for i, size in enumerate(font_size_counts)}
+    clusters: List[List[float]] = []
+    for size in sorted(font_size_counts):
+        if clusters and size - clusters[-1][0] <= tolerance:
+            clusters[-1].append(size)
+        else:
+            clusters.append([size])
+
+    tiers: Dict[float, float] = {}
+    for members in clusters:
+        name = min(members, key=lambda size: (-font_size_counts[size], first_seen[size]))
+        for size in members:
+            tiers[size] = name
+
+    tier_counts = Counter()
+    for size, count in font_size_counts.items():
+        tier_counts[tiers[size]] += count
+    return tiers, tier_counts
+
+
+def compute_font_statistics(lines: TextLineStore, threshold: float,
+                            tolerance: float = 0.0) -> Optional[FontStatistics]:
+    """Compute body size and heading tiers from a font-size histogram built in one pass over the lines"""
+    if not len(lines):
+        return None
+    if _numpy() is None:
+        return FontStatistics.from_counts(Counter(lines.font_sizes), threshold, tolerance)
+
+    sizes = np.frombuffer(lines.font_sizes, dtype=np.float64)
+    unique_sizes, first_index, counts = np.unique(sizes, return_index=True, return_counts=True)
+
+    # Put the histogram in first-seen order so ties break the same way as with Counter
+    order = np.argsort(first_index)
+    font_size_counts = dict(zip(unique_sizes[order].tolist(), counts[order].tolist()))
+    return FontStatistics.from_counts(font_size_counts, threshold, tolerance)
+
+
+def heading_candidates(lines: TextLineStore, stats: FontStatistics,
+                       min_length: int, max_length: int) -> Sequence[int]:
+    """
+    Indices of lines that could become headings
+
+    A line survives if its length is within limits and it either has a heading
+    font size, has the bold flag, or starts like a numbered or keyword heading.
+    Everything else can never pass the per-line checks, so it is dropped here.
+    """
+    if _numpy() is None or not len(lines):
+        return range(len(lines))
+
+    offsets = np.frombuffer(lines.text_offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    mask = (lengths >= min_length) & (lengths <= max_length)
+
+    sizes = np.frombuffer(lines.font_sizes, dtype=np.float64)
+    is_tier = np.isin(sizes, np.array(list(stats.size_to_level), dtype=np.float64))
+
+    is_bold = (np.frombuffer(lines.flags, dtype=np.int32) & BOLD_FLAG) != 0
+
+    codepoints = np.frombuffer(lines.buffer.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    first_chars = codepoints[offsets[:-1][lengths > 0]]
+    starts_like_heading = np.zeros(len(lines), dtype=bool)
+    starts_like_heading[lengths > 0] = (
+        np.isin(first_chars, np.array([ord(c) for c in _CONTENT_HEADING_FIRST_CHARS], dtype=np.uint32)) |
+        (first_chars >= 128)
+    )
+
+    mask &= is_tier | is_bold | starts_like_heading
+    return np.flatnonzero(mask).tolist()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Precompiled regex rules for heading and title classification
+Each rule set is compiled once at import into a single alternation that reports which rule matched
+"""
+
+import re
+from typing import Optional, Sequence, Tuple
+
+
+class RuleSet:
+    """
+    Ordered, named regex rules compiled into one alternation
+
+    match() anchors at the start of the text like re.match and returns the name
+    of the first rule that matches, so a chain of `if re.match(...)` checks
+    becomes a single regex call.
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, str]], flags: int = 0):
+        self.rules = list(rules)
+        self.flags = flags
+        self.pattern = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in self.rules), flags)
+
+    def match(self, text: str) -> Optional[str]:
+        match = self.pattern.match(text)
+        return match.lastgroup if match else None
+
+
+# Numbered-section and keyword patterns mapped to a heading level (checked in order)
+CONTENT_LEVEL_RULES = RuleSet([
+    ("numbered_section", r"\d+\.?\s+[A-Z]"),
+    ("numbered_subsection", r"\d+\.\d+\.?\s+[A-Z]"),
+    ("numbered_subsubsection", r"\d+\.\d+\.\d+\.?\s+[A-Z]"),
+    ("chapter_keyword", r"(?i:(?:Chapter|Section|Part|Appendix)\s+\d*)"),
+])
+CONTENT_LEVELS = {
+    "numbered_section": "H1",
+    "numbered_subsection": "H2",
+    "numbered_subsubsection": "H3",
+    "chapter_keyword": "H1",
+}
+
+# Numbered list items that look like headings but are not (matched on the original text)
+LIST_ITEM_RULES = RuleSet([
+    ("example_list_item", r"\d+\.\s+[A-Z].*\(e\.g\.,.*\)$"),  # "1. Something (e.g., example)"
+    ("article_list_item", r"\d+\.\s+A\s+(?:sample|working|README).*"),  # "1. A sample/working/README ..."
+])
+
+# Common non-heading patterns (matched on the lowercased text)
+SKIP_RULES = RuleSet([
+    ("just_numbers", r"\d+$"),
+    ("page_number", r"page \d+"),
+    ("figure_caption", r"figure \d+"),
+    ("table_caption", r"table \d+"),
+    ("email", r"\w+@\w+\."),
+    ("url", r"https?://"),
+    ("web_address", r"www\."),
+    ("version_number", r"\d+\.\d+$"),
+    ("short_abbreviation", r"[A-Z]{1,3}$"),
+    ("number_with_letter", r"\d+[a-z]?$"),
+    ("only_symbols", r"[^\w\s]+$"),
+    ("page_range", r"\d+\s*-\s*\d+$"),
+    ("month_year", r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\s+\d{4}$"),
+    ("sample_list_item", r"\d+\.\s+(?:A|An|The)\s+(?:sample|working|README|Git).*"),
+    ("dependencies_list_item", r"\d+\.\s+All\s+dependencies.*"),
+    ("labelled_list_item", r"\d+\.\s+(?:Document|Extracted|Sub-section|Metadata).*:$"),
+])
+
+TABLE_WORDS = frozenset(['criteria', 'max', 'points', 'total', 'description', 'constraint', 'requirement',
+                         'deliverables', 'japanese)', 'bonus:', 'theme:'])
+GENERIC_WORDS = frozenset(['title', 'name', 'date', 'time', 'location', 'contact', 'email', 'phone'])
+
+NON_LETTERS = re.compile(r'[^a-zA-Z]')
+SENTENCE_END = re.compile(r'[.!?]$')
+NUMBERED_PREFIX = re.compile(r'^\d+\.')
+NUMBERED_HEADING = re.compile(r'^\d+\.?\s+[A-Z]')
+CAPITALIZED_WORD = re.compile(r'^[A-Z][a-z]')
+
+# Hierarchy fix-up rules
+CHAPTER_HEADING = re.compile(r'^(?:Chapter|Section|Part|Round)\s+\d+', re.IGNORECASE)
+ALL_CAPS_HEADING = re.compile(r'^[A-Z][^a-z]*$')
+SUBSUBSECTION_PREFIX = re.compile(r'^\d+\.\d+\.\d+')
+
+# Title candidate rejection rules (matched on the lowercased text)
+TITLE_SKIP_RULES = RuleSet([
+    ("just_numbers", r"\d+$"),
+    ("page_number", r"page \d+"),
+    ("chapter_header", r"(?:chapter|section|part)\s+\d+"),
+])
+LEADING_DIGIT = re.compile(r'^\d+')
+
+# Bookmark verification: runs of punctuation, symbols and whitespace compare as one space
+TOC_NORMALIZE = re.compile(r'[\W_]+')
+
+
+def rules_source() -> str:
+    """Stable text of every rule and word list, used to fingerprint the extractor"""
+    parts = []
+    for name, value in sorted(globals().items()):
+        if not name.isupper():
+            continue
+        if isinstance(value, RuleSet):
+            parts.append(f"{name}={value.pattern.pattern}/{value.flags}")
+        elif isinstance(value, re.Pattern):
+            parts.append(f"{name}={value.pattern}/{value.flags}")
+        elif isinstance(value, (frozenset, dict)):
+            parts.append(f"{name}={sorted(value.items()) if isinstance(value, dict) else sorted(value)}")
+    return "\n".join(parts)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Local HTTP extraction service
+Serves PDFOutlineExtractor results from a pool of pre-forked warm workers
+"""
+
+import os
+import json
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from batch_processing import BudgetExceeded, ExtractionWorkerPool, ExtractionTimeout
+
+logger = logging.getLogger(__name__)
+
+# Seconds one extraction request may take unless the service is given a timeout
+DEFAULT_TIMEOUT = 120.0
+
+
+class _ExtractionHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        GET  /health   worker and queue status
+        POST /extract  body is the PDF (application/pdf), or JSON {"path": "..."}
+    """
+
+    server_version = "PDFOutlineExtractor/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.service.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/extract":
+            self._send_json(404, {"error": "not found"})
+            return
+        service = self.server.service
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._send_json(400, {"error": "invalid Content-Length"})
+            return
+        if length <= 0:
+            self._send_json(400, {"error": "empty request body"})
+            return
+        if length > service.max_body_bytes:
+            self._send_json(413, {"error": f"request body exceeds {service.max_body_bytes} bytes"})
+            return
+
+        # Backpressure: refuse instead of queueing without bound
+        if not service.slots.acquire(blocking=False):
+            self._send_json(429, {"error": "extraction service is saturated"}, {"Retry-After": "1"})
+            return
+        try:
+            body = self.rfile.read(length)
+            status, payload = service.handle(self.headers.get("Content-Type", ""), body)
+        finally:
+            service.slots.release()
+        self._send_json(status, payload)
+
+
+class ExtractionService:
+    """
+    HTTP front end for a pool of warm extractor processes
+
+    At most max_pending requests are accepted at once (running plus waiting
+    for a worker); further requests get 429 with Retry-After so callers can
+    back off. Path requests are only served for files under path_root.
+    Requests over the timeout or the budget's hard time limit get 504; a
+    document killed for passing the memory budget gets 422.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, workers: Optional[int] = None,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT, max_pending: Optional[int] = None,
+                 max_body_bytes: int = 100 * 1024 * 1024, path_root: Optional[str] = None,
+                 extractor_kwargs: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024):
+        self.pool = ExtractionWorkerPool(workers=workers, timeout=timeout, extractor_kwargs=extractor_kwargs,
+                                         cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+        self.max_pending = max_pending or self.pool.num_workers * 2
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.max_body_bytes = max_body_bytes
+        self.path_root = os.path.realpath(path_root) if path_root else None
+        self.httpd = ThreadingHTTPServer((host, port), _ExtractionHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+
+    @property
+    def server_address(self):
+        return self.httpd.server_address
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "workers": self.pool.num_workers,
+            "busy_workers": self.pool.busy_count,
+            "queued": self.pool.pending_count,
+            "max_pending": self.max_pending,
+        }
+
+    def _resolve_path(self, path: str) -> Optional[str]:
+        if self.path_root is None or not isinstance(path, str):
+            return None
+        resolved = os.path.realpath(os.path.join(self.path_root, path))
+        if os.path.commonpath([resolved, self.path_root]) != self.path_root:
+            return None
+        return resolved
+
+    def handle(self, content_type: str, body: bytes):
+        """Run one extraction request and return (HTTP status, JSON payload)"""
+        if content_type.split(";")[0].strip() == "application/json":
+            try:
+                request = json.loads(body)
+            except ValueError:
+                return 400, {"error": "invalid JSON body"}
+            source = self._resolve_path(request.get("path")) if isinstance(request, dict) else None
+            if source is None:
+                return 400, {"error": "'path' must name a file under the service's path root"}
+            if not os.path.isfile(source):
+                return 404, {"error": "file not found"}
+        else:
+            source = body
+
+        try:
+            return 200, self.pool.submit(source).result()
+        except BudgetExceeded as e:
+            # Too slow is a timeout; too large for the memory budget is a property of the document
+            status = 504 if e.reason == "time" else 422
+            return status, {"error": str(e), "truncated": e.result()["truncated"]}
+        except ExtractionTimeout as e:
+            return 504, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Extraction request failed: {str(e)}")
+            return 500, {"error": "extraction failed"}
+
+    def serve_forever(self):
+        host, port = self.server_address[:2]
+        logger.info(f"Serving outline extraction on http://{host}:{port} with {self.pool.num_workers} workers")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop serve_forever() from another thread"""
+        self.httpd.shutdown()
+
+    def close(self):
+        self.httpd.server_close()
+        self.pool.shutdown()
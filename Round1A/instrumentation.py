@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Per-document stage timers and counters for the PDF outline extractor
+Records where extraction time goes and reports it to pluggable sinks (log, JSON lines, Prometheus text format)
+"""
+
+import os
+import re
+import json
+import threading
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _StageTimer:
+    __slots__ = ("stages", "name", "start")
+
+    def __init__(self, stages: Dict[str, float], name: str):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stages[self.name] = self.stages.get(self.name, 0.0) + perf_counter() - self.start
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class DocumentMetrics:
+    """
+    Stage timings (seconds, summed over repeats) and counters for one document
+
+    Stages can nest: get_text is the total over every page read and also falls
+    inside scan/outline in streaming mode; total covers the whole document.
+    """
+
+    enabled = True
+
+    def __init__(self, document: str):
+        self.document = document
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def stage(self, name: str) -> _StageTimer:
+        """Context manager adding the time spent inside it to stage name"""
+        return _StageTimer(self.stages, name)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "document": self.document,
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "DocumentMetrics":
+        metrics = cls(record["document"])
+        metrics.stages.update(record["stages"])
+        metrics.counters.update(record["counters"])
+        return metrics
+
+
+class _NullMetrics:
+    """Stand-in used when instrumentation is off: every call is a no-op"""
+
+    enabled = False
+
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+
+
+class Instrumentation:
+    """
+    Collects a DocumentMetrics per document and hands it to the sinks
+
+    document() opens a scope for one document; a scope opened while another
+    is active reuses it, so process_pdfs can wrap extraction and writing in one
+    record while direct library calls still get a record of their own.
+    """
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        self.sinks = list(sinks or [])
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        """Metrics of the document being processed on this thread, or NULL_METRICS"""
+        return getattr(self._local, "metrics", None) or NULL_METRICS
+
+    @contextmanager
+    def document(self, name: str) -> Iterator[DocumentMetrics]:
+        active = getattr(self._local, "metrics", None)
+        if active is not None:
+            yield active
+            return
+        metrics = DocumentMetrics(name)
+        self._local.metrics = metrics
+        start = perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.stages["total"] = metrics.stages.get("total", 0.0) + perf_counter() - start
+            self._local.metrics = None
+            self.emit(metrics)
+
+    def emit(self, metrics: DocumentMetrics):
+        for sink in self.sinks:
+            try:
+                sink.emit(metrics)
+            except Exception as e:
+                logger.warning(f"Metrics sink {type(sink).__name__} failed: {str(e)}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class LogSink:
+    """One structured log line per document"""
+
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def emit(self, metrics: DocumentMetrics):
+        logger.log(self.level, "document metrics %s", json.dumps(metrics.as_dict(), ensure_ascii=False))
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Appends one JSON object per document to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, metrics: DocumentMetrics):
+        line = json.dumps(metrics.as_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Dotted counter families exported as one Prometheus metric with a label: prefix -> (metric, label, help)
+LABELLED_COUNTERS = {
+    "rejected.": ("rejected_total", "rule", "Heading candidates rejected, by validation rule."),
+    "truncated.": ("truncated_total", "reason", "Documents cut short by a resource budget, by budget."),
+}
+# Prometheus metric names are [a-zA-Z_:][a-zA-Z0-9_:]*; other characters in counter names become "_"
+_METRIC_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class PrometheusSink:
+    """
+    Cumulative totals in the Prometheus text exposition format
+
+    The file is rewritten atomically after every document, so it can be
+    served by node_exporter's textfile collector or any static file server.
+    """
+
+    def __init__(self, path: str, prefix: str = "pdf_outline"):
+        self.path = path
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def emit(self, metrics: DocumentMetrics):
+        with self._lock:
+            self.documents += 1
+            for name, seconds in metrics.stages.items():
+                self.stage_seconds[name] += seconds
+            for name, value in metrics.counters.items():
+                self.counters[name] += value
+            self._write(self.render())
+
+    def render(self) -> str:
+        p = self.prefix
+        out = [f"# HELP {p}_documents_total Documents processed.",
+               f"# TYPE {p}_documents_total counter",
+               f"{p}_documents_total {self.documents}",
+               f"# HELP {p}_stage_seconds_total Time spent per extraction stage.",
+               f"# TYPE {p}_stage_seconds_total counter"]
+        out += [f'{p}_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                for name, seconds in sorted(self.stage_seconds.items())]
+
+        labelled = set()
+        for prefix, (metric, label, help_text) in LABELLED_COUNTERS.items():
+            values = {name[len(prefix):]: value for name, value in self.counters.items() if name.startswith(prefix)}
+            labelled.update(prefix + key for key in values)
+            if values:
+                out += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} counter"]
+                out += [f'{p}_{metric}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+        for name, value in sorted(self.counters.items()):
+            if name not in labelled:
+                metric = f"{p}_{_METRIC_NAME_INVALID.sub('_', name)}_total"
+                out += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(out) + "\n"
+
+    def _write(self, text: str):
+        import tempfile  # only needed here; keeps the import off the CLI's startup path
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def close(self):
+        pass
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process was started (Linux /proc; None elsewhere), at clock-tick resolution"""
+    try:
+        with open("/proc/self/stat", 'rb') as f:
+            # Fields after the parenthesised command name; starttime is field 22 of the full line
+            start_ticks = int(f.read().rpartition(b")")[2].split()[19])
+        with open("/proc/uptime", 'rb') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """
+    Cold-start phases of a CLI run, from process start to the first finished document
+
+    Create it as early in main() as possible; document_done() matches the
+    process_pdfs on_result callback.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.process_age = process_age()  # Interpreter start-up and imports before main()
+        self.first_document: Optional[float] = None
+        self.documents = 0
+
+    def document_done(self, filename: str, ok: bool):
+        self.documents += 1
+        if self.first_document is None:
+            self.first_document = perf_counter() - self.started
+
+    def report(self, **phases: Optional[float]) -> Dict[str, Any]:
+        """Seconds per phase; phases adds caller-measured ones such as the module import time"""
+        before_main = self.process_age
+        report = {"process_start_to_main": before_main}
+        report.update(phases)
+        report["main_to_first_document"] = self.first_document
+        report["time_to_first_document"] = (before_main + self.first_document
+                                            if before_main is not None and self.first_document is not None
+                                            else None)
+        report["total"] = (before_main or 0.0) + perf_counter() - self.started
+        report = {name: round(seconds, 4) if seconds is not None else None for name, seconds in report.items()}
+        report["documents"] = self.documents
+        return report
+
+
+def create_sink(spec: str):
+    """Build a sink from a CLI spec: "log", "json:PATH" or "prometheus:PATH" """
+    kind, _, path = spec.partition(":")
+    if kind == "log" and not path:
+        return LogSink()
+    if kind == "json" and path:
+        return JsonLinesSink(path)
+    if kind == "prometheus" and path:
+        return PrometheusSink(path)
+    raise ValueError(f"unknown metrics sink {spec!r}; expected log, json:PATH or prometheus:PATH")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compact columnar storage for the text lines of a PDF
+Replaces one dict per line with typed arrays, an interned font table and a shared text buffer
+"""
+
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class TextLineStore:
+    """
+    Column-oriented store of merged text lines
+
+    Line i has its font size, flags and page in typed arrays, its bbox at
+    bboxes[4*i:4*i+4], its font as an index into font_names, and its text at
+    text_offsets[i]:text_offsets[i+1] of one shared string buffer. Lines are
+    appended in page order, so the pages column is sorted.
+    """
+
+    def __init__(self):
+        self.font_sizes = array('d')
+        self.flags = array('i')
+        self.pages = array('i')
+        self.bboxes = array('d')
+        self.font_ids = array('I')
+        self.font_names: List[str] = []
+        self._font_index: Dict[str, int] = {}
+        self.text_offsets = array('q', [0])
+        self._buffer = ""
+        self._pending: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.font_sizes)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TextLineStore):
+            return NotImplemented
+        return (self.font_sizes == other.font_sizes and self.flags == other.flags and
+                self.pages == other.pages and self.bboxes == other.bboxes and
+                self.text_offsets == other.text_offsets and self.buffer == other.buffer and
+                [self.font_names[i] for i in self.font_ids] == [other.font_names[i] for i in other.font_ids])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buffer"] = self.buffer
+        state["_pending"] = []
+        return state
+
+    def _intern_font(self, font_name: str) -> int:
+        font_id = self._font_index.get(font_name)
+        if font_id is None:
+            font_id = len(self.font_names)
+            self.font_names.append(font_name)
+            self._font_index[font_name] = font_id
+        return font_id
+
+    def append(self, text: str, page: int, font_size: float, font_name: str, flags: int,
+               bbox: Tuple[float, float, float, float]):
+        """Add one merged line"""
+        self.font_sizes.append(font_size)
+        self.flags.append(flags)
+        self.pages.append(page)
+        self.bboxes.extend(bbox)
+        self.font_ids.append(self._intern_font(font_name))
+        self._pending.append(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+
+    def extend(self, other: "TextLineStore"):
+        """Append all lines of another store (e.g. a chunk of pages from a worker)"""
+        base = self.text_offsets[-1]
+        self.font_sizes.extend(other.font_sizes)
+        self.flags.extend(other.flags)
+        self.pages.extend(other.pages)
+        self.bboxes.extend(other.bboxes)
+        remap = [self._intern_font(name) for name in other.font_names]
+        self.font_ids.extend(remap[font_id] for font_id in other.font_ids)
+        self._pending.append(other.buffer)
+        self.text_offsets.extend(base + offset for offset in other.text_offsets[1:])
+
+    @property
+    def buffer(self) -> str:
+        """Shared text buffer holding every line back to back"""
+        if self._pending:
+            self._buffer += "".join(self._pending)
+            self._pending = []
+        return self._buffer
+
+    def text(self, i: int) -> str:
+        return self.buffer[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def texts(self) -> Iterator[str]:
+        """Iterate over line texts without materializing a list"""
+        buffer = self.buffer
+        offsets = self.text_offsets
+        for i in range(len(self)):
+            yield buffer[offsets[i]:offsets[i + 1]]
+
+    def font_name(self, i: int) -> str:
+        return self.font_names[self.font_ids[i]]
+
+    def bbox(self, i: int) -> Tuple[float, float, float, float]:
+        return tuple(self.bboxes[4 * i:4 * i + 4])
+
+    def count_pages_upto(self, page: int) -> int:
+        """Number of leading lines on pages <= page"""
+        return bisect_right(self.pages, page)
+
+    def block(self, i: int) -> Dict[str, Any]:
+        """Line i as the dict shape used by earlier versions of the extractor"""
+        return {
+            "text": self.text(i),
+            "page": self.pages[i],
+            "font_size": self.font_sizes[i],
+            "font_name": self.font_name(i),
+            "flags": self.flags[i],
+            "bbox": self.bbox(i)
+        }
+
+    def blocks(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.block(i)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Incremental directory processing
+Records each input's size, mtime and content hash so re-runs only touch what changed
+"""
+
+import os
+import json
+import tempfile
+import logging
+from typing import Dict, List, NamedTuple
+
+from extract_outline import output_path_for
+from result_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".outline_manifest"  # no .json suffix so output validators skip it
+MANIFEST_VERSION = 1
+
+
+class IncrementalPlan(NamedTuple):
+    """What an incremental run has to do"""
+    to_process: List[str]  # new or changed inputs
+    unchanged: List[str]  # inputs whose recorded output is still valid
+    removed: List[str]  # recorded inputs that no longer exist
+
+
+class IncrementalManifest:
+    """
+    Manifest of processed inputs, stored next to the outputs
+
+    An unchanged input is recognised from its directory entry alone (size and
+    mtime), so a re-run over an unchanged directory costs one scandir and one
+    manifest read. Only inputs whose size or mtime moved are hashed; a touched
+    file with identical content is not reprocessed.
+    """
+
+    def __init__(self, output_dir: str, fingerprint: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.fingerprint = fingerprint
+        self.entries: Dict[str, Dict] = {}
+        self._pending_stats: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("fingerprint") != self.fingerprint:
+            logger.info("Extractor settings changed since the last run; reprocessing all inputs")
+            return
+        self.entries = data.get("files", {})
+
+    def plan(self, input_dir: str) -> IncrementalPlan:
+        """Compare the input directory against the manifest"""
+        to_process, unchanged = [], []
+        seen = set()
+        with os.scandir(input_dir) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith('.pdf'):
+                    continue
+                filename = entry.name
+                seen.add(filename)
+                stat = entry.stat()
+                current = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+                recorded = self.entries.get(filename)
+                output_exists = recorded is not None and os.path.exists(
+                    os.path.join(self.output_dir, recorded["output"]))
+
+                if (output_exists and recorded["size"] == current["size"] and
+                        recorded["mtime_ns"] == current["mtime_ns"]):
+                    unchanged.append(filename)
+                    continue
+
+                try:
+                    current["hash"] = content_hash(entry.path)
+                except OSError as e:
+                    logger.warning(f"Could not hash {filename}: {str(e)}")
+                    to_process.append(filename)
+                    continue
+
+                if output_exists and recorded["size"] == current["size"] and recorded["hash"] == current["hash"]:
+                    # Touched but not modified: keep the output, refresh the recorded mtime
+                    recorded["mtime_ns"] = current["mtime_ns"]
+                    unchanged.append(filename)
+                else:
+                    self._pending_stats[filename] = current
+                    to_process.append(filename)
+
+        removed = [filename for filename in self.entries if filename not in seen]
+        return IncrementalPlan(to_process, unchanged, removed)
+
+    def record(self, filename: str):
+        """Mark a planned input as successfully processed"""
+        current = self._pending_stats.pop(filename, None)
+        if current is None or "hash" not in current:
+            return
+        current["output"] = os.path.basename(output_path_for(filename, self.output_dir))
+        self.entries[filename] = current
+
+    def remove_outputs(self, filenames: List[str]):
+        """Delete the outputs of inputs that are gone and forget them"""
+        for filename in filenames:
+            entry = self.entries.pop(filename, None)
+            if entry is None:
+                continue
+            output_path = os.path.join(self.output_dir, entry["output"])
+            try:
+                os.unlink(output_path)
+                logger.info(f"Removed {entry['output']} (input {filename} is gone)")
+            except FileNotFoundError:
+                pass
+
+    def save(self):
+        """Atomically write the manifest"""
+        data = {"version": MANIFEST_VERSION, "fingerprint": self.fingerprint, "files": self.entries}
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Output writers for extraction results
+Per-file JSON (pretty or compact) written atomically, or one buffered JSON Lines file per batch
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, Optional
+
+# Optional fast backend, imported on first use: _UNLOADED until then, None if it isn't installed
+_UNLOADED = object()
+orjson = _UNLOADED
+
+OUTPUT_FORMATS = ("pretty", "compact", "jsonl")
+JSON_BACKENDS = ("auto", "json", "orjson")
+JSONL_NAME = "results.jsonl"
+
+
+def _orjson():
+    global orjson
+    if orjson is _UNLOADED:
+        try:
+            import orjson as module
+            orjson = module
+        except ImportError:
+            orjson = None
+    return orjson
+
+
+def resolve_backend(backend: str = "auto") -> str:
+    """Concrete JSON backend for a requested one ("auto" = orjson when installed)"""
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"unknown JSON backend {backend!r}; expected one of {', '.join(JSON_BACKENDS)}")
+    if backend == "orjson" and _orjson() is None:
+        raise ValueError("JSON backend 'orjson' requested but orjson is not installed")
+    if backend == "auto":
+        return "orjson" if _orjson() is not None else "json"
+    return backend
+
+
+def dumps(result: Dict[str, Any], pretty: bool = True, backend: str = "json") -> bytes:
+    """
+    Serialize a result to UTF-8 JSON bytes
+
+    Both backends produce the same bytes: pretty is json.dump(indent=2,
+    ensure_ascii=False), compact has no whitespace. orjson is tried first when
+    selected and stdlib json handles anything it refuses.
+    """
+    if backend == "orjson" and _orjson() is not None:
+        try:
+            return orjson.dumps(result, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except (TypeError, orjson.JSONEncodeError):
+            pass
+    if pretty:
+        return json.dumps(result, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Write data to path via a temp file in the same directory and a rename
+
+    Readers see the old file or the complete new one, never a partial write.
+    The temp file is created with the default mode so outputs keep the usual
+    umask-derived permissions.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def output_path_for(filename: str, output_dir: str) -> str:
+    """Map an input PDF file name to its JSON output path"""
+    output_filename = filename.replace('.pdf', '.json')
+    return os.path.join(output_dir, output_filename)
+
+
+def write_result(result: Dict[str, Any], output_path: str, pretty: bool = True, backend: str = "json"):
+    """Atomically write an extraction result to a JSON file"""
+    atomic_write(output_path, dumps(result, pretty, backend))
+
+
+class JsonFileWriter:
+    """One JSON file per input in the output directory"""
+
+    def __init__(self, output_dir: str, pretty: bool = True, backend: str = "auto"):
+        self.output_dir = output_dir
+        self.pretty = pretty
+        self.backend = resolve_backend(backend)
+
+    def write(self, filename: str, result: Dict[str, Any]) -> str:
+        """Write the result for input filename and return the output path"""
+        output_path = output_path_for(filename, self.output_dir)
+        write_result(result, output_path, self.pretty, self.backend)
+        return output_path
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class JsonLinesWriter:
+    """
+    Every result of a batch as one JSON object per line in a single file
+
+    Lines go through one large buffered file handle instead of an open/write/
+    close per document. The batch is written to a temp file and renamed into
+    place on close(), so consumers never read a half-written batch; if the
+    batch fails the temp file is removed and any previous file is kept.
+    """
+
+    def __init__(self, path: str, backend: str = "auto", buffer_size: int = 1024 * 1024):
+        self.path = path
+        self.backend = resolve_backend(backend)
+        self._temp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._temp_path, 'wb', buffering=buffer_size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write(self, filename: str, result: Dict[str, Any]) -> str:
+        line = dumps({"file": filename, **result}, pretty=False, backend=self.backend) + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self.count += 1
+        return self.path
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """Discard the batch written so far"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def create_writer(output_dir: str, output_format: str = "pretty", backend: str = "auto",
+                  jsonl_path: Optional[str] = None):
+    """Writer for output_format: "pretty" or "compact" JSON files, or "jsonl" (one file for the batch)"""
+    if output_format == "jsonl":
+        return JsonLinesWriter(jsonl_path or os.path.join(output_dir, JSONL_NAME), backend)
+    if output_format in ("pretty", "compact"):
+        return JsonFileWriter(output_dir, pretty=output_format == "pretty", backend=backend)
+    raise ValueError(f"unknown output format {output_format!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
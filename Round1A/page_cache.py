@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Per-page cache of extracted text lines
+Pages are keyed by a content hash of their streams and resources, so revisions of a document share unchanged pages
+"""
+
+import re
+import hashlib
+import logging
+from typing import List, Optional
+
+from line_store import TextLineStore
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Indirect object reference inside an object's source, e.g. "12 0 R"
+_REFERENCE = re.compile(r"\b(\d+) (\d+) R\b")
+# Stream dictionary entries that describe the encoding rather than the content
+_STREAM_ENCODING = re.compile(r"/(?:Length|Filter|DecodeParms)\b(?:\s*\[[^\]]*\]|\s*<<(?:[^<>]|<<[^<>]*>>)*>>|\s*/\w+|\s*\d+(?: \d+ R)?)")
+
+
+class PageFingerprinter:
+    """
+    Content hashes of the pages of one document
+
+    A page's hash covers its geometry, its content streams and everything
+    its resources reach (fonts with their widths, encodings and ToUnicode
+    maps, form XObjects and their own resources). References are replaced
+    by the hash of the object they point to, so the hash doesn't depend on
+    object numbers and a revision saved from scratch still matches. Image
+    data is not hashed: text extraction skips images.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._objects = {}  # xref -> digest, shared by all pages (fonts are usually shared)
+
+    def page_hash(self, page) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((tuple(page.rect), page.rotation, tuple(page.mediabox), tuple(page.cropbox))).encode())
+        for xref in page.get_contents():
+            digest.update(self._object_digest(xref))
+        kind, value = self._inherited_key(page.xref, "Resources")
+        if kind == "xref":
+            digest.update(self._object_digest(int(value.split()[0])))
+        else:
+            digest.update(self._substitute_references(value).encode())
+        return digest.hexdigest()
+
+    def _inherited_key(self, xref: int, key: str):
+        """Page attribute, looked up through the page tree like PDF readers do"""
+        doc = self.doc
+        for _ in range(64):  # Guard against malformed, cyclic page trees
+            kind, value = doc.xref_get_key(xref, key)
+            if kind != "null":
+                return kind, value
+            kind, parent = doc.xref_get_key(xref, "Parent")
+            if kind != "xref":
+                break
+            xref = int(parent.split()[0])
+        return "null", "null"
+
+    def _substitute_references(self, source: str) -> str:
+        return _REFERENCE.sub(lambda match: self._object_digest(int(match.group(1))).hex(), source)
+
+    def _object_digest(self, xref: int) -> bytes:
+        cached = self._objects.get(xref)
+        if cached is not None:
+            return cached
+        self._objects[xref] = b"cycle"  # Placeholder while this object's references are resolved
+        doc = self.doc
+        digest = hashlib.blake2b(digest_size=20)
+        source = doc.xref_object(xref, compressed=True)
+        if doc.xref_is_stream(xref):
+            # Hash decoded data without its encoding, so recompressing a file (e.g. garbage collection
+            # with deflate) doesn't change the hash
+            source = _STREAM_ENCODING.sub("", source)
+            if doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+                digest.update(doc.xref_stream(xref) or b"")
+        digest.update(self._substitute_references(source).encode())
+        self._objects[xref] = digest.digest()
+        return self._objects[xref]
+
+
+class PageLineCache:
+    """
+    Extracted lines of single pages, stored in a size-bounded ResultCache
+
+    fingerprint covers what turns a page into lines (extractor version,
+    get_text flags, PyMuPDF version); entries don't include the page number,
+    so a page that moved between revisions is still a hit.
+    """
+
+    def __init__(self, cache_dir: str, fingerprint: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache = ResultCache(cache_dir, max_bytes)
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._fingerprinter = None
+
+    def key(self, page) -> Optional[str]:
+        """Cache key of a page, or None if its objects can't be read"""
+        doc = page.parent
+        if self._fingerprinter is None or self._fingerprinter.doc is not doc:
+            self._fingerprinter = PageFingerprinter(doc)
+        try:
+            return self.cache.key(self._fingerprinter.page_hash(page), self.fingerprint)
+        except Exception as e:
+            logger.warning(f"Not caching page {page.number + 1}: {str(e)}")
+            return None
+
+    def get(self, key: str, page: int, lines: TextLineStore) -> bool:
+        """Append the cached lines of a page to lines, numbered as page; False on a miss"""
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return False
+        for text, font_size, font_name, flags, bbox in entry["lines"]:
+            lines.append(text, page, font_size, font_name, flags, tuple(bbox))
+        self.hits += 1
+        return True
+
+    def put(self, key: str, records: List[list]):
+        """Store the lines just extracted from one page as [text, size, font, flags, bbox] records"""
+        self.cache.put(key, {"lines": records})
+
+    def close(self):
+        self._fingerprinter = None
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed regression harness for the PDF outline extractor
+Scores outlines against expected JSON (precision, recall, level accuracy) and times every document
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import unicodedata
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from extract_outline import PDFOutlineExtractor, iter_pdf_filenames, output_path_for
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Comparison key for heading text: NFKC, no invisible format characters, collapsed whitespace, casefolded"""
+    text = unicodedata.normalize("NFKC", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Cf")
+    return " ".join(text.split()).casefold()
+
+
+def score_outline(predicted: Dict[str, Any], expected: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compare one extraction result with its expected outline
+
+    Headings match on normalized text and page; a heading listed twice must be
+    predicted twice. Level accuracy is the share of matched headings whose
+    level is also right.
+    """
+    expected_levels: Dict[tuple, List[str]] = {}
+    for heading in expected["outline"]:
+        expected_levels.setdefault((normalize_text(heading["text"]), heading["page"]), []).append(heading["level"])
+
+    matched = level_correct = 0
+    for heading in predicted["outline"]:
+        levels = expected_levels.get((normalize_text(heading["text"]), heading["page"]))
+        if not levels:
+            continue
+        matched += 1
+        if heading["level"] in levels:
+            levels.remove(heading["level"])
+            level_correct += 1
+        else:
+            levels.pop()
+
+    predicted_count, expected_count = len(predicted["outline"]), len(expected["outline"])
+    return {
+        "predicted": predicted_count,
+        "expected": expected_count,
+        "matched": matched,
+        "level_correct": level_correct,
+        "precision": matched / predicted_count if predicted_count else float(expected_count == 0),
+        "recall": matched / expected_count if expected_count else 1.0,
+        "level_accuracy": level_correct / matched if matched else float(expected_count == 0),
+        "title_match": normalize_text(predicted["title"]) == normalize_text(expected["title"]),
+        "exact": predicted == expected,
+    }
+
+
+def run_regression(input_dir: str, expected_dir: str, extractor_kwargs: Optional[Dict[str, Any]] = None,
+                   repeat: int = 1) -> Dict[str, Any]:
+    """
+    Extract every PDF in input_dir that has an expected JSON in expected_dir and score it
+
+    Each document's runtime is the best of repeat runs, which keeps one-off
+    scheduling noise out of the speed comparison.
+    """
+    extractor = PDFOutlineExtractor(**(extractor_kwargs or {}))
+    documents = {}
+    totals = Counter()
+    try:
+        for filename in sorted(iter_pdf_filenames(input_dir)):
+            expected_path = output_path_for(filename, expected_dir)
+            if not os.path.exists(expected_path):
+                logger.warning(f"No expected outline for {filename}; skipping")
+                continue
+            with open(expected_path, 'r', encoding='utf-8') as f:
+                expected = json.load(f)
+
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = extractor.extract_title_and_outline(os.path.join(input_dir, filename))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            score = score_outline(result, expected)
+            score["seconds"] = round(best, 4)
+            documents[filename] = score
+            totals.update({key: score[key] for key in ("predicted", "expected", "matched", "level_correct")})
+            totals["titles"] += score["title_match"]
+            totals["exact"] += score["exact"]
+    finally:
+        extractor.close()
+
+    return {
+        "extractor_fingerprint": extractor.fingerprint(),
+        "documents": documents,
+        "summary": {
+            "documents": len(documents),
+            "precision": round(totals["matched"] / totals["predicted"], 4) if totals["predicted"] else None,
+            "recall": round(totals["matched"] / totals["expected"], 4) if totals["expected"] else None,
+            "level_accuracy": round(totals["level_correct"] / totals["matched"], 4) if totals["matched"] else None,
+            "title_accuracy": round(totals["titles"] / len(documents), 4) if documents else None,
+            "exact_matches": totals["exact"],
+            "seconds": round(sum(doc["seconds"] for doc in documents.values()), 4),
+        },
+    }
+
+
+def check_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None,
+                 min_precision: float = 0.0, min_recall: float = 0.0, min_level_accuracy: float = 0.0,
+                 require_exact: bool = False, max_slowdown: Optional[float] = None) -> List[str]:
+    """Failures of a regression report against absolute floors and, optionally, a baseline report"""
+    failures = []
+    summary = report["summary"]
+    for key, floor in [("precision", min_precision), ("recall", min_recall), ("level_accuracy", min_level_accuracy)]:
+        if summary[key] is not None and summary[key] < floor:
+            failures.append(f"{key} {summary[key]} is below the required {floor}")
+
+    for filename, doc in report["documents"].items():
+        if require_exact and not doc["exact"]:
+            failures.append(f"{filename}: output differs from the expected JSON")
+        before = (baseline or {}).get("documents", {}).get(filename)
+        if before is None:
+            continue
+        for key in ("precision", "recall", "level_accuracy"):
+            if doc[key] < before[key]:
+                failures.append(f"{filename}: {key} dropped from {before[key]:.4f} to {doc[key]:.4f}")
+        if before["title_match"] and not doc["title_match"]:
+            failures.append(f"{filename}: title no longer matches")
+        if before["exact"] and not doc["exact"]:
+            failures.append(f"{filename}: output changed (was an exact match)")
+
+    if baseline is not None and max_slowdown is not None:
+        before_seconds = baseline["summary"]["seconds"]
+        if before_seconds and summary["seconds"] > before_seconds * max_slowdown:
+            failures.append(f"runtime {summary['seconds']}s exceeds {max_slowdown}x the baseline's {before_seconds}s")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns 1 when any check fails"""
+    parser = argparse.ArgumentParser(description="Score extractor accuracy and speed against expected outlines")
+    parser.add_argument("--input-dir", default="input", help="Labelled PDFs")
+    parser.add_argument("--expected-dir", default="output", help="Expected JSON, one per PDF")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per document; the fastest is reported")
+    parser.add_argument("--streaming", action="store_true", help="Score the streaming extractor")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--save", default=None, help="Write this run's report here")
+    parser.add_argument("--min-precision", type=float, default=0.0)
+    parser.add_argument("--min-recall", type=float, default=0.0)
+    parser.add_argument("--min-level-accuracy", type=float, default=0.0)
+    parser.add_argument("--require-exact", action="store_true",
+                        help="Fail unless every output equals its expected JSON")
+    parser.add_argument("--max-slowdown", type=float, default=1.25,
+                        help="Fail if total runtime exceeds the baseline's by this factor")
+    args = parser.parse_args(argv)
+
+    report = run_regression(args.input_dir, args.expected_dir, {"streaming": args.streaming}, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    for filename, doc in report["documents"].items():
+        print(f"{filename}: P={doc['precision']:.3f} R={doc['recall']:.3f} L={doc['level_accuracy']:.3f} "
+              f"title={'ok' if doc['title_match'] else 'MISS'} exact={doc['exact']} {doc['seconds']}s")
+    print(json.dumps(report["summary"]))
+
+    failures = check_report(report, baseline, args.min_precision, args.min_recall, args.min_level_accuracy,
+                            args.require_exact, args.max_slowdown if baseline else None)
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ No regressions")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Per-document resource budgets for the PDF outline extractor
+Page, wall-clock and memory limits: checked between pages by the extractor, enforced by the worker pool
+"""
+
+import os
+import sys
+import resource
+from time import monotonic
+from typing import Any, Dict, Optional
+
+# Truncation reasons that depend on machine load rather than on the document and settings
+LOAD_DEPENDENT_REASONS = ("time", "memory")
+
+
+def process_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """
+    Current resident set size of a process in MB, or None if it can't be read
+
+    Reads /proc on Linux. Elsewhere only this process can be measured, and
+    only by its peak RSS, which is a conservative stand-in.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'rb') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        if pid is not None and pid != os.getpid():
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class ResourceBudget:
+    """
+    Limits for one document
+
+    The extractor checks the limits after every page it reads and, once one
+    is hit, stops reading and builds the outline from the pages it has, marking
+    the result as truncated. A single page can still overrun (get_text on one
+    pathological page is not interruptible), so the worker pool also kills
+    any worker that passes kill_after times the time or memory budget.
+    """
+
+    def __init__(self, max_pages: Optional[int] = None, max_seconds: Optional[float] = None,
+                 max_rss_mb: Optional[float] = None, kill_after: float = 2.0):
+        for name, value in [("max_pages", max_pages), ("max_seconds", max_seconds), ("max_rss_mb", max_rss_mb)]:
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive, got {value}")
+        if kill_after < 1:
+            raise ValueError(f"kill_after must be at least 1, got {kill_after}")
+        self.max_pages = max_pages  # Pages read per document
+        self.max_seconds = max_seconds  # Wall-clock seconds per document
+        self.max_rss_mb = max_rss_mb  # Resident memory growth per document, in MB
+        self.kill_after = kill_after  # Hard limit, as a multiple of the time and memory budgets
+
+    @property
+    def supervised(self) -> bool:
+        """Whether the budget needs a supervising process (time and memory can't be bounded in-process)"""
+        return self.max_seconds is not None or self.max_rss_mb is not None
+
+    @property
+    def hard_seconds(self) -> Optional[float]:
+        return self.max_seconds * self.kill_after if self.max_seconds is not None else None
+
+    @property
+    def hard_rss_mb(self) -> Optional[float]:
+        return self.max_rss_mb * self.kill_after if self.max_rss_mb is not None else None
+
+    def start(self) -> "BudgetTracker":
+        """Start tracking a document"""
+        return BudgetTracker(self)
+
+    def __repr__(self):
+        return (f"ResourceBudget(max_pages={self.max_pages!r}, max_seconds={self.max_seconds!r}, "
+                f"max_rss_mb={self.max_rss_mb!r}, kill_after={self.kill_after!r})")
+
+
+class BudgetTracker:
+    """Usage of one document against a ResourceBudget"""
+
+    def __init__(self, budget: ResourceBudget):
+        self.budget = budget
+        self.started = monotonic()
+        self.rss_start = process_rss_mb() if budget.max_rss_mb is not None else None
+        self.pages_read = 0
+        self.reason = None  # Why reading stopped early: "pages", "time" or "memory"
+
+    def limit_pages(self, start: int, stop: int) -> int:
+        """Clamp the 0-based page stop to the page budget"""
+        max_pages = self.budget.max_pages
+        if max_pages is not None and stop - start > max_pages:
+            self.reason = "pages"
+            return start + max_pages
+        return stop
+
+    def page_done(self, remaining: int) -> bool:
+        """Record a page read with remaining pages still to go; True when reading has to stop"""
+        self.pages_read += 1
+        if not remaining:
+            return False
+        budget = self.budget
+        if budget.max_seconds is not None and monotonic() - self.started >= budget.max_seconds:
+            self.reason = "time"
+        elif budget.max_rss_mb is not None:
+            rss = process_rss_mb()
+            if rss is not None and rss - self.rss_start >= budget.max_rss_mb:
+                self.reason = "memory"
+        return self.reason in LOAD_DEPENDENT_REASONS
+
+    def marker(self, page_count: int) -> Optional[Dict[str, Any]]:
+        """The result's "truncated" entry, or None if the whole page range was read"""
+        if self.reason is None:
+            return None
+        return {"reason": self.reason, "pages_read": self.pages_read, "page_count": page_count}
+
+
+def is_load_dependent(result: Dict[str, Any]) -> bool:
+    """Whether a result was cut short by time or memory, so a rerun may give a fuller outline"""
+    truncated = result.get("truncated")
+    return truncated is not None and truncated["reason"] in LOAD_DEPENDENT_REASONS
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache of extraction results
+Keyed by a hash of the PDF bytes plus the extractor's version fingerprint
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import logging
+from typing import Any, Dict, Optional
+
+from extract_outline import ERROR_RESULT, PDFSource
+from resource_governor import is_load_dependent
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(pdf_path: PDFSource) -> str:
+    """Fast content hash of a PDF file, or of an in-memory PDF without copying it"""
+    digest = hashlib.blake2b(digest_size=20)
+    if not isinstance(pdf_path, (str, os.PathLike)):
+        digest.update(pdf_path)
+        return digest.hexdigest()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Directory of cached results with size-bounded LRU eviction
+
+    Entries are written to a temp file and renamed into place, so concurrent
+    writers (threads, processes or hosts on a shared filesystem) never expose
+    a partial entry; two writers of the same key write the same bytes and the
+    last rename wins. Hits refresh the entry's mtime, which eviction uses as
+    its recency order.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._approx_bytes = sum(size for _, size, _ in self._entries())
+
+    def key(self, content_digest: str, fingerprint: str) -> str:
+        return hashlib.blake2b(f"{content_digest}:{fingerprint}".encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for key, or None on a miss or an unreadable entry"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {str(e)}")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Atomically store a result"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False)
+                os.replace(temp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+                raise
+            self._approx_bytes += os.path.getsize(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
+            return
+
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every cache entry"""
+        try:
+            shards = list(os.scandir(self.cache_dir))
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self, target_ratio: float = 0.9):
+        """Remove least recently used entries until the cache is under target_ratio * max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_ratio
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+
+class CachedExtractor:
+    """Wraps a PDFOutlineExtractor so repeat documents cost one hash and one small file read"""
+
+    def __init__(self, extractor, cache: ResultCache):
+        self.extractor = extractor
+        self.cache = cache
+        self.fingerprint = extractor.fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+    def extract_title_and_outline(self, pdf_path: PDFSource) -> Dict[str, Any]:
+        try:
+            key = self.cache.key(content_hash(pdf_path), self.fingerprint)
+        except OSError:
+            return self.extractor.extract_title_and_outline(pdf_path)
+
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = self.extractor.extract_title_and_outline(pdf_path)
+        # Don't pin failures (a file caught mid-write should be retried next time) or outlines cut short by load
+        if result != ERROR_RESULT and not is_load_dependent(result):
+            self.cache.put(key, result)
+        return result
+
+    def close(self):
+        self.extractor.close()
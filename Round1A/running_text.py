@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Running header and footer detection
+Indexes text that repeats at the same height across pages so it can be dropped before heading classification
+"""
+
+import re
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+from font_stats import FontStatistics
+from line_store import TextLineStore
+
+# Page numbers and dates change from page to page ("Page 3 of 40"); they are compared as "#"
+_DIGITS = re.compile(r"\d+")
+
+
+def running_text_keys(text: str, y0: float, band_height: float) -> Tuple[Tuple[str, int], Tuple[str, int]]:
+    """
+    Exact and digit-folded keys of a line: whitespace- and case-normalized
+    text plus the vertical band the line starts in
+    """
+    band = int(y0 // band_height)
+    text = " ".join(text.lower().split())
+    return (text, band), (_DIGITS.sub("#", text), band)
+
+
+class RunningTextIndex:
+    """
+    Lines that repeat on many pages at the same height: running headers, footers and page numbers
+
+    Built in one linear pass, page by page, so the streaming extractor can
+    fill it during its first pass. A key counts once per page; a line is
+    running text when its key appears on at least min_pages pages and on
+    at least min_fraction of the pages indexed. Lines match on exact text,
+    or with digits folded ("Page 3 of 40") when they are not in a heading
+    size tier: a numbered heading at the top of every page ("2. Results",
+    "3. Discussion") is not a page counter.
+    """
+
+    def __init__(self, band_height: float = 12.0, min_pages: int = 3, min_fraction: float = 0.5):
+        self.band_height = band_height
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self._pages: Dict[Hashable, int] = {}  # key -> number of pages it appears on
+        self._last_page: Dict[Hashable, int] = {}  # key -> last page counted, so a page counts once
+        self._page_numbers = set()
+
+    def _keys(self, lines: TextLineStore, i: int) -> Tuple[Tuple[str, int], Tuple[str, int]]:
+        return running_text_keys(lines.text(i), lines.bbox(i)[1], self.band_height)
+
+    def _count(self, key: Hashable, page: int):
+        if self._last_page.get(key) != page:
+            self._last_page[key] = page
+            self._pages[key] = self._pages.get(key, 0) + 1
+
+    def add(self, lines: TextLineStore) -> "RunningTextIndex":
+        """Count the lines of one or more pages"""
+        for i in range(len(lines)):
+            page = lines.pages[i]
+            self._page_numbers.add(page)
+            exact, folded = self._keys(lines, i)
+            self._count(exact, page)
+            if folded != exact:
+                self._count(("#",) + folded, page)
+        return self
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_numbers)
+
+    def _repeats(self, key: Hashable) -> bool:
+        count = self._pages.get(key, 0)
+        return count >= self.min_pages and count >= self.min_fraction * self.page_count
+
+    def is_running(self, lines: TextLineStore, i: int, stats: FontStatistics) -> bool:
+        exact, folded = self._keys(lines, i)
+        if self._repeats(exact):
+            return True
+        return (folded != exact and stats.level_for_size(lines.font_sizes[i]) is None and
+                self._repeats(("#",) + folded))
+
+    def drop_running(self, lines: TextLineStore, candidates: Sequence[int], stats: FontStatistics) -> List[int]:
+        """The candidate indices that are not running text"""
+        return [i for i in candidates if not self.is_running(lines, i, stats)]
@@ -6,7 +6,27 @@ Test the main processing function without actual PDFs
 import os
 import json
 import tempfile
-from extract_outline import PDFOutlineExtractor
+import fitz  # PyMuPDF
+from extract_outline import PDFOutlineExtractor, iter_pdf_filenames, process_pdfs
+
+def _create_sample_pdf(pdf_path, pages=2):
+    """Create a small PDF with a title, numbered headings and body text"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 72
+        if page_num == 0:
+            page.insert_text((72, y), "Sample Document Title", fontsize=24, fontname="hebo")
+            y += 48
+        page.insert_text((72, y), f"{page_num + 1}. Section Number {page_num + 1}", fontsize=18, fontname="hebo")
+        y += 30
+        page.insert_text((72, y), f"{page_num + 1}.1 Background Details", fontsize=14, fontname="hebo")
+        y += 24
+        for line in range(20):
+            page.insert_text((72, y), f"Body text line {line} on page {page_num + 1} of the sample.", fontsize=11)
+            y += 16
+    doc.save(pdf_path)
+    doc.close()
 
 def test_extractor_initialization():
     """Test that the extractor can be initialized"""
@@ -106,6 +126,1259 @@ def test_directory_processing_structure():
             output_path = os.path.join(output_dir, output_filename)
             print(f"✅ Output path: {output_path}")
 
+def test_parallel_batch_matches_serial():
+    """Test that the worker pool writes byte-identical output to the serial path"""
+    print("\nTesting parallel batch mode...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for i in range(4):
+            _create_sample_pdf(os.path.join(input_dir, f"doc{i}.pdf"), pages=i + 1)
+        with open(os.path.join(input_dir, "broken.pdf"), "w") as f:
+            f.write("fake pdf content")
+        
+        serial_dir = os.path.join(temp_dir, "serial")
+        parallel_dir = os.path.join(temp_dir, "parallel")
+        process_pdfs(input_dir, serial_dir)
+        process_pdfs(input_dir, parallel_dir, workers=2, timeout=60, max_in_flight=2)
+        
+        passed = True
+        for filename in sorted(os.listdir(serial_dir)):
+            with open(os.path.join(serial_dir, filename), 'rb') as f:
+                serial_bytes = f.read()
+            with open(os.path.join(parallel_dir, filename), 'rb') as f:
+                parallel_bytes = f.read()
+            if serial_bytes == parallel_bytes:
+                print(f"✅ {filename} identical in serial and parallel mode")
+            else:
+                print(f"❌ {filename} differs between serial and parallel mode")
+                passed = False
+        return passed
+
+def test_worker_pool_timeout():
+    """Test that a document over the timeout fails without stalling the pool"""
+    from batch_processing import ExtractionWorkerPool, ExtractionTimeout
+    
+    print("\nTesting worker pool timeout...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        large_pdf = os.path.join(temp_dir, "large.pdf")
+        small_pdf = os.path.join(temp_dir, "small.pdf")
+        _create_sample_pdf(large_pdf, pages=300)
+        _create_sample_pdf(small_pdf, pages=1)
+        
+        with ExtractionWorkerPool(workers=1, timeout=0.01) as pool:
+            try:
+                pool.submit(large_pdf).result()
+                print("❌ Large document finished inside a 10ms timeout")
+                return False
+            except ExtractionTimeout:
+                print("✅ Large document timed out")
+            pool.timeout = 60
+            result = pool.submit(small_pdf).result()
+        
+        if result["outline"]:
+            print("✅ Replacement worker processed the next document")
+            return True
+        print("❌ Replacement worker returned an empty outline")
+        return False
+
+def test_worker_pool_dead_workers():
+    """Test that workers dying while idle, or failing to start, fail or rerun documents instead of hanging"""
+    import signal
+    import time
+    from concurrent.futures import TimeoutError as FutureTimeout
+    from batch_processing import ExtractionWorkerPool, WorkerCrashed
+    
+    print("\nTesting dead idle workers...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path, pages=1)
+        
+        passed = True
+        with ExtractionWorkerPool(workers=1) as pool:
+            pool.submit(pdf_path).result(timeout=60)
+            os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+            time.sleep(1)
+            try:
+                result = pool.submit(pdf_path).result(timeout=60)
+                print(f"✅ Killed idle worker replaced ({len(result['outline'])} headings)")
+            except (FutureTimeout, WorkerCrashed) as e:
+                print(f"❌ Document after an idle worker was killed failed: {type(e).__name__}")
+                passed = False
+        
+        with ExtractionWorkerPool(workers=1, extractor_kwargs={"bogus": 1}) as pool:
+            time.sleep(2)
+            for attempt in range(2):
+                try:
+                    pool.submit(pdf_path).result(timeout=30)
+                    print("❌ Worker with bad settings returned a result")
+                    passed = False
+                except WorkerCrashed:
+                    print(f"✅ Worker that failed to start reported as crashed (attempt {attempt + 1})")
+                except FutureTimeout:
+                    print(f"❌ Future hung; dispatcher alive: {pool._dispatcher.is_alive()}")
+                    passed = False
+                    break
+        return passed
+
+def test_page_parallel_matches_serial():
+    """Test that splitting one document's pages across workers keeps page order"""
+    print("\nTesting page-level parallelism...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "long.pdf")
+        _create_sample_pdf(pdf_path, pages=40)
+        
+        serial_blocks = PDFOutlineExtractor()._extract_text_blocks(fitz.open(pdf_path))
+        extractor = PDFOutlineExtractor(page_workers=2, min_pages_per_worker=5)
+        try:
+            parallel_blocks = extractor._extract_text_blocks(fitz.open(pdf_path), pdf_path)
+            serial_result = PDFOutlineExtractor().extract_title_and_outline(pdf_path)
+            parallel_result = extractor.extract_title_and_outline(pdf_path)
+        finally:
+            extractor.close()
+        
+        if serial_blocks == parallel_blocks and serial_result == parallel_result:
+            print(f"✅ {len(parallel_blocks)} blocks merged in page order")
+            return True
+        print("❌ Page-parallel blocks differ from the serial extraction")
+        return False
+
+def test_streaming_matches_in_memory():
+    """Test that the two-pass streaming extractor returns the same outline"""
+    print("\nTesting streaming extraction...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "long.pdf")
+        _create_sample_pdf(pdf_path, pages=12)
+        
+        in_memory = PDFOutlineExtractor().extract_title_and_outline(pdf_path)
+        streamed = PDFOutlineExtractor(streaming=True).extract_title_and_outline(pdf_path)
+        iterated = list(PDFOutlineExtractor().iter_outline(pdf_path))
+        
+        if streamed == in_memory and iterated == in_memory["outline"]:
+            print(f"✅ Streaming outline matches ({len(iterated)} headings)")
+            return True
+        print("❌ Streaming outline differs from the in-memory extraction")
+        return False
+
+def test_line_store():
+    """Test the columnar text-line store"""
+    import pickle
+    from line_store import TextLineStore
+    
+    print("\nTesting text-line store...")
+    
+    first = TextLineStore()
+    first.append("Title Line", 1, 24.0, "Helvetica-Bold", 16, (72.0, 60.0, 300.0, 84.0))
+    first.append("Body text", 1, 11.0, "Helvetica", 0, (72.0, 100.0, 200.0, 112.0))
+    second = TextLineStore()
+    second.append("More body", 2, 11.0, "Helvetica", 0, (72.0, 60.0, 200.0, 72.0))
+    first.extend(second)
+    
+    passed = True
+    expected_texts = ["Title Line", "Body text", "More body"]
+    if list(first.texts()) == expected_texts and first.font_names == ["Helvetica-Bold", "Helvetica"]:
+        print("✅ Texts and interned font table are correct after extend")
+    else:
+        print(f"❌ Unexpected store contents: {list(first.texts())}, {first.font_names}")
+        passed = False
+    
+    if first.block(2) == {"text": "More body", "page": 2, "font_size": 11.0, "font_name": "Helvetica",
+                          "flags": 0, "bbox": (72.0, 60.0, 200.0, 72.0)}:
+        print("✅ Line round-trips to the dict shape")
+    else:
+        print(f"❌ Unexpected line: {first.block(2)}")
+        passed = False
+    
+    if first.count_pages_upto(1) == 2 and pickle.loads(pickle.dumps(first)) == first:
+        print("✅ Page lookup and pickling work")
+    else:
+        print("❌ Page lookup or pickling failed")
+        passed = False
+    return passed
+
+def test_font_statistics_fallback():
+    """Test that vectorized font statistics match the pure-Python fallback"""
+    import font_stats
+    
+    print("\nTesting font statistics...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path, pages=6)
+        extractor = PDFOutlineExtractor()
+        lines = extractor._extract_text_blocks(fitz.open(pdf_path))
+        
+        vectorized = font_stats.compute_font_statistics(lines, extractor.font_size_threshold)
+        vectorized_outline = extractor._extract_headings(lines)
+        numpy_module, font_stats.np = font_stats.np, None
+        try:
+            fallback = font_stats.compute_font_statistics(lines, extractor.font_size_threshold)
+            fallback_outline = extractor._extract_headings(lines)
+        finally:
+            font_stats.np = numpy_module
+        
+        if (vectorized.body_font_size == fallback.body_font_size and
+                vectorized.font_to_level == fallback.font_to_level and
+                vectorized_outline == fallback_outline):
+            print(f"✅ Body size {vectorized.body_font_size}, tiers {vectorized.font_to_level}")
+            return True
+        print("❌ Vectorized statistics differ from the fallback")
+        return False
+
+def test_font_size_tolerance():
+    """Test that sizes with float noise share one tier and both statistics paths agree"""
+    import font_stats
+    from line_store import TextLineStore
+    
+    print("\nTesting font size tolerance clustering...")
+    
+    # 13.74/13.76 straddle a 0.5 rounding grid boundary; body text is 10 with noise
+    lines = TextLineStore()
+    for i, size in enumerate([10.0, 10.0001, 9.9999, 10.0, 13.74, 13.76, 18.0, 17.9998, 10.0, 13.75]):
+        lines.append(f"line {i}", 1, size, "Helvetica", 0, (0.0, 0.0, 10.0, 10.0))
+    vectorized = font_stats.compute_font_statistics(lines, 1.0, tolerance=0.1)
+    numpy_module, font_stats.np = font_stats.np, None
+    try:
+        fallback = font_stats.compute_font_statistics(lines, 1.0, tolerance=0.1)
+    finally:
+        font_stats.np = numpy_module
+    exact = font_stats.compute_font_statistics(lines, 1.0)
+    
+    ok = (vectorized.body_font_size == 10.0 and vectorized.heading_sizes == [18.0, 13.74] and
+          vectorized.size_to_level == fallback.size_to_level and
+          vectorized.level_for_size(17.9998) == "H1" and vectorized.level_for_size(13.76) == "H2" and
+          vectorized.level_for_size(10.0001) is None and
+          len(exact.heading_sizes) == 3 and exact.level_for_size(13.76) == "H3")
+    print(f"{'✅' if ok else '❌'} tiers {vectorized.heading_sizes}, lookup {vectorized.size_to_level}")
+    return ok
+
+def test_process_pdfs_font_size_tolerance():
+    """Test that process_pdfs hands font_size_tolerance to the extractor, serially and in workers"""
+    print("\nTesting font size tolerance through process_pdfs...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        # Subsection headings alternate between 14 and 14.3pt: one tier with tolerance, two without
+        doc = fitz.open()
+        for page_num in range(4):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"{page_num + 1}. Section Number {page_num + 1}", fontsize=18, fontname="hebo")
+            page.insert_text((72, 102), f"{page_num + 1}.1 Background Details",
+                             fontsize=14 + 0.3 * (page_num % 2), fontname="hebo")
+            for line in range(20):
+                page.insert_text((72, 126 + 16 * line), f"Body text line {line} on page {page_num + 1}.", fontsize=11)
+        doc.save(os.path.join(input_dir, "noisy.pdf"))
+        doc.close()
+        
+        passed = True
+        for workers in (1, 2):
+            levels = {}
+            for tolerance in (0.0, 0.5):
+                output_dir = os.path.join(temp_dir, f"output_{workers}_{tolerance}")
+                process_pdfs(input_dir, output_dir, workers=workers, font_size_tolerance=tolerance)
+                with open(os.path.join(output_dir, "noisy.json"), 'r', encoding='utf-8') as f:
+                    outline = json.load(f)["outline"]
+                levels[tolerance] = {h["level"] for h in outline if ".1 " in h["text"]}
+            if len(levels[0.5]) == 1 and len(levels[0.0]) == 2:
+                print(f"✅ workers={workers}: subsection levels {sorted(levels[0.0])} -> {sorted(levels[0.5])}")
+            else:
+                print(f"❌ workers={workers}: tolerance did not reach the extractor ({levels})")
+                passed = False
+        return passed
+
+def test_heading_rule_engine():
+    """Test that the combined rule sets report which rule rejected a line"""
+    from heading_rules import SKIP_RULES, CONTENT_LEVEL_RULES
+    
+    extractor = PDFOutlineExtractor()
+    
+    print("\nTesting heading rule engine...")
+    
+    expected_rejections = [
+        ("page 12 of 40", "page_number"),
+        ("figure 3: results", "figure_caption"),
+        ("https://example.com", "url"),
+        ("jan 2024", "month_year"),
+        ("Introduction", None),
+        ("1. A sample heading", "article_list_item"),
+        ("Total", "table_word"),
+    ]
+    
+    passed = True
+    for text, expected in expected_rejections:
+        actual = extractor._heading_rejection(text)
+        if actual == expected:
+            print(f"✅ '{text}' -> {actual}")
+        else:
+            print(f"❌ '{text}' -> {actual} (expected {expected})")
+            passed = False
+    
+    if SKIP_RULES.match("www.example.com") == "web_address" and CONTENT_LEVEL_RULES.match("2.1 Scope") == "numbered_subsection":
+        print("✅ Rule sets return the matching rule name")
+    else:
+        print("❌ Rule sets returned the wrong rule name")
+        passed = False
+    return passed
+
+def test_result_cache():
+    """Test cache hits, fingerprinting and size-bounded eviction"""
+    from result_cache import CachedExtractor, ResultCache
+    
+    print("\nTesting result cache...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path, pages=2)
+        cache_dir = os.path.join(temp_dir, "cache")
+        
+        passed = True
+        extractor = CachedExtractor(PDFOutlineExtractor(), ResultCache(cache_dir))
+        first = extractor.extract_title_and_outline(pdf_path)
+        second = extractor.extract_title_and_outline(pdf_path)
+        if first == second and (extractor.hits, extractor.misses) == (1, 1):
+            print("✅ Second extraction served from the cache")
+        else:
+            print(f"❌ Expected one hit and one miss, got {extractor.hits} hits and {extractor.misses} misses")
+            passed = False
+        
+        tuned = PDFOutlineExtractor()
+        tuned.font_size_threshold = 3.0
+        if tuned.fingerprint() != PDFOutlineExtractor().fingerprint():
+            print("✅ Changing a threshold changes the fingerprint")
+        else:
+            print("❌ Fingerprint ignores thresholds")
+            passed = False
+        
+        import extract_outline
+        fingerprint = PDFOutlineExtractor().fingerprint()
+        version = extract_outline.pymupdf_version()
+        try:
+            extract_outline._pymupdf_version = "0.0.0"
+            upgraded = PDFOutlineExtractor().fingerprint()
+        finally:
+            extract_outline._pymupdf_version = version
+        if upgraded != fingerprint:
+            print("✅ A different PyMuPDF version changes the fingerprint")
+        else:
+            print("❌ Fingerprint ignores the PyMuPDF version")
+            passed = False
+        
+        small_cache = ResultCache(os.path.join(temp_dir, "small"), max_bytes=600)
+        for i in range(10):
+            outline = [{"level": "H1", "text": "x" * 50, "page": 1}]
+            small_cache.put(f"{i:02d}" + "0" * 38, {"title": f"Document {i}", "outline": outline})
+        if small_cache._approx_bytes <= 600 and small_cache.get("09" + "0" * 38) is not None:
+            print("✅ Eviction keeps the cache under its size bound")
+        else:
+            print(f"❌ Cache holds {small_cache._approx_bytes} bytes after eviction")
+            passed = False
+        return passed
+
+def test_incremental_processing():
+    """Test that incremental runs skip unchanged inputs and clean up removed ones"""
+    from manifest import IncrementalManifest
+    
+    print("\nTesting incremental processing...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        for name in ["keep", "change", "remove"]:
+            _create_sample_pdf(os.path.join(input_dir, f"{name}.pdf"), pages=1)
+        process_pdfs(input_dir, output_dir, incremental=True)
+        
+        _create_sample_pdf(os.path.join(input_dir, "change.pdf"), pages=3)
+        os.remove(os.path.join(input_dir, "remove.pdf"))
+        
+        fingerprint = PDFOutlineExtractor().fingerprint()
+        plan = IncrementalManifest(output_dir, fingerprint).plan(input_dir)
+        process_pdfs(input_dir, output_dir, incremental=True)
+        final_plan = IncrementalManifest(output_dir, fingerprint).plan(input_dir)
+        
+        passed = True
+        if plan.to_process == ["change.pdf"] and plan.unchanged == ["keep.pdf"] and plan.removed == ["remove.pdf"]:
+            print("✅ Changed, unchanged and removed inputs detected")
+        else:
+            print(f"❌ Unexpected plan: {plan}")
+            passed = False
+        
+        if not os.path.exists(os.path.join(output_dir, "remove.json")) and not final_plan.to_process:
+            print("✅ Removed input's output deleted; re-run has nothing to do")
+        else:
+            print("❌ Incremental re-run left stale work or outputs")
+            passed = False
+        return passed
+
+def test_watch_daemon():
+    """Test that watch mode picks up a PDF dropped into the input directory"""
+    import threading
+    import time
+    from watch_daemon import WatchDaemon
+    
+    print("\nTesting watch mode...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        
+        passed = True
+        for use_inotify in (True, False):
+            daemon = WatchDaemon(input_dir, output_dir, workers=1, settle_seconds=0.2,
+                                 poll_interval=0.2, use_inotify=use_inotify)
+            thread = threading.Thread(target=daemon.run)
+            thread.start()
+            name = f"dropped_{int(use_inotify)}"
+            _create_sample_pdf(os.path.join(input_dir, f"{name}.pdf"), pages=1)
+            
+            output_path = os.path.join(output_dir, f"{name}.json")
+            deadline = time.monotonic() + 30
+            while not os.path.exists(output_path) and time.monotonic() < deadline:
+                time.sleep(0.1)
+            stats = daemon.stats()
+            daemon.stop()
+            thread.join()
+            
+            watcher = "inotify" if use_inotify else "polling"
+            if os.path.exists(output_path) and stats["latency_p50"] is not None:
+                print(f"✅ {watcher}: processed dropped PDF (latency {stats['latency_p50']}s)")
+            else:
+                print(f"❌ {watcher}: dropped PDF was not processed ({stats})")
+                passed = False
+        
+        # A time-truncated result is load-dependent: counted as failed, retried, and left stale for a restart
+        from resource_governor import ResourceBudget
+        daemon = WatchDaemon(input_dir, output_dir, workers=1, settle_seconds=0, use_inotify=False,
+                             poll_interval=0.2, output_format="compact", max_retries=1,
+                             extractor_kwargs={"budget": ResourceBudget(max_seconds=1e-6)})
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        input_path = os.path.join(input_dir, "slow.pdf")
+        _create_sample_pdf(input_path, pages=3)
+        output_path = os.path.join(output_dir, "slow.json")
+        deadline = time.monotonic() + 30
+        while daemon.stats()["failed"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        time.sleep(0.5)
+        stats = daemon.stats()
+        daemon.stop()
+        thread.join()
+        
+        with open(output_path, 'rb') as f:
+            output = f.read()
+        stale = os.stat(output_path).st_mtime_ns < os.stat(input_path).st_mtime_ns
+        if stats["failed"] == 2 and stats["processed"] == 0 and stale and b"\n" not in output:
+            print("✅ Load-dependent truncation retried once, left stale, written compact")
+        else:
+            print(f"❌ Load-dependent truncation handled wrongly ({stats}, stale={stale}, output={output[:60]!r})")
+            passed = False
+        
+        try:
+            WatchDaemon(input_dir, output_dir, output_format="jsonl")
+            print("❌ Watch mode accepted the jsonl output format")
+            passed = False
+        except ValueError:
+            print("✅ Watch mode rejects the jsonl output format")
+        return passed
+
+def test_http_service():
+    """Test the HTTP service: bytes and path requests, health, 429 backpressure and error statuses"""
+    import http.client
+    import threading
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import Future
+    from batch_processing import BudgetExceeded
+    from extract_outline import PDFOutlineExtractor
+    from http_service import DEFAULT_TIMEOUT, ExtractionService
+    
+    print("\nTesting HTTP service...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path)
+        expected = PDFOutlineExtractor().extract_title_and_outline(pdf_path)
+        
+        service = ExtractionService(port=0, workers=1, max_pending=1, path_root=temp_dir)
+        thread = threading.Thread(target=service.serve_forever)
+        thread.start()
+        base = "http://%s:%d" % service.server_address[:2]
+        
+        def post(body, content_type):
+            request = urllib.request.Request(base + "/extract", data=body,
+                                             headers={"Content-Type": content_type})
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    return response.status, json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read())
+        
+        try:
+            with open(pdf_path, 'rb') as f:
+                by_bytes = post(f.read(), "application/pdf")
+            by_path = post(json.dumps({"path": "sample.pdf"}).encode(), "application/json")
+            escaped = post(json.dumps({"path": "../etc/passwd"}).encode(), "application/json")
+            with urllib.request.urlopen(base + "/health", timeout=10) as response:
+                health = json.loads(response.read())
+            
+            # Hold the only slot so the next request is refused
+            service.slots.acquire()
+            try:
+                saturated = post(b"%PDF", "application/pdf")
+            finally:
+                service.slots.release()
+            
+            connection = http.client.HTTPConnection(*service.server_address[:2], timeout=10)
+            connection.putrequest("POST", "/extract")
+            connection.putheader("Content-Length", "lots")
+            connection.endheaders()
+            bad_length = connection.getresponse().status
+            connection.close()
+            
+            # A worker killed for its memory budget is not a timeout
+            submit = service.pool.submit
+            killed = Future()
+            killed.set_exception(BudgetExceeded("memory", "worker memory grew past the hard limit"))
+            service.pool.submit = lambda source: killed
+            try:
+                over_memory = post(b"%PDF", "application/pdf")
+            finally:
+                service.pool.submit = submit
+        finally:
+            service.shutdown()
+            thread.join()
+        
+        passed = True
+        for name, ok in [("bytes request", by_bytes == (200, expected)),
+                         ("path request", by_path == (200, expected)),
+                         ("path outside root rejected", escaped[0] == 400),
+                         ("health endpoint", health["status"] == "ok" and health["workers"] == 1),
+                         ("429 when saturated", saturated[0] == 429),
+                         ("400 for a malformed Content-Length", bad_length == 400),
+                         ("422 for a document over the memory budget",
+                          over_memory[0] == 422 and over_memory[1]["truncated"]["reason"] == "memory"),
+                         ("default request timeout", service.pool.timeout == DEFAULT_TIMEOUT)]:
+            print(f"{'✅' if ok else '❌'} {name}")
+            passed = passed and ok
+        return passed
+
+def test_in_memory_sources():
+    """Test that bytes, memoryview and mmap sources match extraction from a path"""
+    import mmap
+    from extract_outline import PDFOutlineExtractor
+    from result_cache import content_hash
+    
+    print("\nTesting in-memory and memory-mapped input...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path)
+        expected = PDFOutlineExtractor().extract_title_and_outline(pdf_path)
+        
+        with open(pdf_path, 'rb') as f:
+            data = f.read()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        extractor = PDFOutlineExtractor()
+        results = {
+            "bytes": extractor.extract_title_and_outline(data),
+            "bytearray": extractor.extract_title_and_outline(bytearray(data)),
+            "memoryview": extractor.extract_title_and_outline(memoryview(data)),
+            "mmap": extractor.extract_title_and_outline(mapped),
+            "mmap path": PDFOutlineExtractor(mmap_min_bytes=0).extract_title_and_outline(pdf_path),
+        }
+        same_hash = content_hash(mapped) == content_hash(data) == content_hash(pdf_path)
+        # The extractor must not hold on to views of the mapping
+        mapped.close()
+        
+        passed = True
+        for name, result in results.items():
+            ok = result == expected
+            print(f"{'✅' if ok else '❌'} {name} source")
+            passed = passed and ok
+        print(f"{'✅' if same_hash else '❌'} content hash is the same for every source")
+        
+        # PyMuPDF before 1.24 (the Docker image pins 1.23.8) only takes bytes streams
+        import extract_outline
+        pymupdf = extract_outline.load_pymupdf()
+        open_any, taken = pymupdf.open, extract_outline._STREAM_TAKES_BUFFERS
+        
+        def open_bytes_only(*args, stream=None, **kwargs):
+            if stream is not None and type(stream) is not bytes:
+                raise TypeError("bad type: 'stream'")
+            return open_any(*args, stream=stream, **kwargs)
+        
+        pymupdf.open, extract_outline._STREAM_TAKES_BUFFERS = open_bytes_only, None
+        try:
+            old_version = [extractor.extract_title_and_outline(memoryview(data)),
+                           PDFOutlineExtractor(mmap_min_bytes=0).extract_title_and_outline(pdf_path)]
+        finally:
+            pymupdf.open, extract_outline._STREAM_TAKES_BUFFERS = open_any, taken
+        fallback = old_version == [expected, expected]
+        print(f"{'✅' if fallback else '❌'} views are copied to bytes for PyMuPDF versions without buffer streams")
+        return passed and same_hash and fallback
+
+def test_early_exit_modes():
+    """Test title-only, page-range and max-headings modes against the full extraction"""
+    from extract_outline import PDFOutlineExtractor
+    
+    print("\nTesting early-exit extraction modes...")
+    
+    class CountingExtractor(PDFOutlineExtractor):
+        pages_read = 0
+        
+        def _extract_page_lines(self, page, page_num, lines):
+            self.pages_read += 1
+            return super()._extract_page_lines(page, page_num, lines)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "long.pdf")
+        _create_sample_pdf(pdf_path, pages=20)
+        full = PDFOutlineExtractor().extract_title_and_outline(pdf_path)
+        
+        passed = True
+        for streaming in (False, True):
+            passes = 2 if streaming else 1
+            # Levels in a page window come from that window's fonts, so compare text and page only
+            cases = [
+                ("title only", {"title_only": True}, [], 2),
+                ("page range 3-4", {"page_range": (3, 4)},
+                 [(h["text"], h["page"]) for h in full["outline"] if 3 <= h["page"] <= 4], 2 + 2 * passes),
+                ("max headings 3", {"max_headings": 3},
+                 [(h["text"], h["page"]) for h in full["outline"][:3]], None),
+            ]
+            for name, kwargs, expected, max_pages in cases:
+                extractor = CountingExtractor(streaming=streaming, **kwargs)
+                result = extractor.extract_title_and_outline(pdf_path)
+                ok = (result["title"] == full["title"] and
+                      [(h["text"], h["page"]) for h in result["outline"]] == expected and
+                      (max_pages is None or extractor.pages_read <= max_pages))
+                if name.startswith("max headings"):
+                    ok = ok and result["outline"] == full["outline"][:3]
+                mode = "streaming" if streaming else "in-memory"
+                print(f"{'✅' if ok else '❌'} {name} ({mode}): {extractor.pages_read} page reads")
+                passed = passed and ok
+        return passed
+
+def test_bookmark_fast_path():
+    """Test that verified bookmarks are used and missing or bogus ones fall back to font analysis"""
+    from extract_outline import PDFOutlineExtractor
+    
+    print("\nTesting embedded bookmark fast path...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plain_path = os.path.join(temp_dir, "plain.pdf")
+        _create_sample_pdf(plain_path, pages=3)
+        
+        toc = [[1, "1. Section Number 1", 1], [2, "1.1 Background Details", 1], [3, "Background", 1],
+               [4, "Too deep for H1-H3", 1], [1, "2. Section Number 2", 2], [1, "3. Section Number 3", 3]]
+        bogus_toc = [[1, "Nothing like this is printed", 1], [1, "Or this", 2]]
+        paths = {}
+        for name, entries in [("bookmarked", toc), ("bogus", bogus_toc)]:
+            doc = fitz.open(plain_path)
+            doc.set_toc(entries)
+            paths[name] = os.path.join(temp_dir, f"{name}.pdf")
+            doc.save(paths[name])
+            doc.close()
+        
+        extractor = PDFOutlineExtractor(use_toc=True)
+        font_result = PDFOutlineExtractor().extract_title_and_outline(plain_path)
+        bookmarked = extractor.extract_title_and_outline(paths["bookmarked"])
+        expected_outline = [{"level": f"H{level}", "text": text, "page": page}
+                            for level, text, page in toc if level <= 3]
+        
+        passed = True
+        for name, ok in [
+            ("verified bookmarks used", bookmarked["outline_source"] == "bookmarks" and
+             bookmarked["outline"] == expected_outline and bookmarked["title"] == font_result["title"]),
+            ("no bookmarks falls back", extractor.extract_title_and_outline(plain_path) ==
+             dict(font_result, outline_source="font_analysis")),
+            ("bogus bookmarks fall back",
+             extractor.extract_title_and_outline(paths["bogus"])["outline_source"] == "font_analysis"),
+        ]:
+            print(f"{'✅' if ok else '❌'} {name}")
+            passed = passed and ok
+        return passed
+
+def test_text_extraction_flags():
+    """Test that skipping image blocks leaves the extracted spans unchanged"""
+    from extract_outline import TEXT_EXTRACTION_FLAGS
+    
+    print("\nTesting pruned text extraction flags...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "images.pdf")
+        _create_sample_pdf(pdf_path, pages=2)
+        doc = fitz.open(pdf_path)
+        image = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+        image.clear_with(200)
+        for page in doc:
+            page.insert_image(fitz.Rect(300, 400, 500, 600), pixmap=image)
+        
+        def spans(flags):
+            blocks = [block for page in doc for block in page.get_text("dict", flags=flags)["blocks"]]
+            return ([(span["text"], span["size"], span["font"], span["flags"], span["bbox"])
+                     for block in blocks if "lines" in block
+                     for line in block["lines"] for span in line["spans"]],
+                    sum(1 for block in blocks if block["type"] == 1))
+        
+        default_spans, default_images = spans(fitz.TEXTFLAGS_DICT)
+        pruned_spans, pruned_images = spans(TEXT_EXTRACTION_FLAGS)
+        doc.close()
+        
+        if default_images and not pruned_images and pruned_spans == default_spans:
+            print(f"✅ {len(pruned_spans)} identical spans, {default_images} image blocks skipped")
+            return True
+        print("❌ Pruned flags changed the extracted spans or kept image blocks")
+        return False
+
+def test_benchmark_harness():
+    """Test that the synthetic corpus extracts cleanly and the report has every metric"""
+    from benchmark import CorpusProfile, generate_corpus, run_benchmark
+    
+    print("\nTesting benchmark harness...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profiles = [CorpusProfile(pages=3, columns=2, font_mix="mixed"), CorpusProfile(pages=3, scanned_ratio=0.5)]
+        generate_corpus(temp_dir, 2, profiles)
+        report = run_benchmark(temp_dir)
+        
+        ok = (report["docs"] == 2 and report["pages"] == 6 and report["errors"] == 0 and
+              report["pages_per_sec"] > 0 and report["peak_rss_mb"] > 0 and
+              all(report["latency_s"][p] is not None for p in ("p50", "p95", "p99")))
+        print(f"{'✅' if ok else '❌'} benchmark report: {report['pages_per_sec']} pages/s, "
+              f"p95 {report['latency_s']['p95']}s")
+        return ok
+
+def test_instrumentation():
+    """Test per-stage metrics in serial and parallel runs, and that outputs are unaffected"""
+    from instrumentation import Instrumentation, JsonLinesSink, PrometheusSink
+    
+    print("\nTesting stage instrumentation...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for i in range(3):
+            _create_sample_pdf(os.path.join(input_dir, f"doc_{i}.pdf"), pages=3)
+        
+        passed = True
+        process_pdfs(input_dir, os.path.join(temp_dir, "plain"))
+        for workers in (1, 2):
+            output_dir = os.path.join(temp_dir, f"out_{workers}")
+            jsonl_path = os.path.join(temp_dir, f"metrics_{workers}.jsonl")
+            prom_path = os.path.join(temp_dir, f"metrics_{workers}.prom")
+            instrumentation = Instrumentation([JsonLinesSink(jsonl_path), PrometheusSink(prom_path)])
+            process_pdfs(input_dir, output_dir, workers=workers, instrumentation=instrumentation)
+            instrumentation.close()
+            
+            with open(jsonl_path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+            with open(prom_path, encoding='utf-8') as f:
+                prometheus = f.read()
+            same_output = all(
+                open(os.path.join(output_dir, name), 'rb').read() ==
+                open(os.path.join(temp_dir, "plain", name), 'rb').read()
+                for name in os.listdir(output_dir))
+            ok = (len(records) == 3 and same_output and
+                  all({"open", "get_text", "font_statistics", "classify", "hierarchy", "write", "total"}
+                      <= set(r["stages"]) for r in records) and
+                  all(r["counters"]["pages"] == 3 and r["counters"]["candidates"] > 0 for r in records) and
+                  'pdf_outline_documents_total 3' in prometheus and
+                  'pdf_outline_stage_seconds_total{stage="get_text"}' in prometheus)
+            print(f"{'✅' if ok else '❌'} workers={workers}: {len(records)} records, "
+                  f"counters {records[0]['counters'] if records else {}}")
+            passed = passed and ok
+        
+        # Dotted counters ("truncated.pages") must still give valid Prometheus metric names
+        import re
+        from resource_governor import ResourceBudget
+        prom_path = os.path.join(temp_dir, "budget.prom")
+        instrumentation = Instrumentation([PrometheusSink(prom_path)])
+        process_pdfs(input_dir, os.path.join(temp_dir, "budget"), budget=ResourceBudget(max_pages=1),
+                     instrumentation=instrumentation)
+        instrumentation.close()
+        with open(prom_path, encoding='utf-8') as f:
+            samples = [line for line in f.read().splitlines() if not line.startswith("#")]
+        ok = ('pdf_outline_truncated_total{reason="pages"} 3' in samples and
+              all(re.fullmatch(r'[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-z_]+="[^"]*"\})? [0-9.]+', line) for line in samples))
+        print(f"{'✅' if ok else '❌'} Prometheus output has valid metric names")
+        return passed and ok
+
+def test_regression_harness():
+    """Test outline scoring and that a quality drop against a baseline is reported"""
+    from regression import check_report, run_regression, score_outline
+    
+    print("\nTesting accuracy regression harness...")
+    
+    expected = {"title": "Doc", "outline": [
+        {"level": "H1", "text": "1. Intro", "page": 1},
+        {"level": "H2", "text": "1.1 Scope", "page": 1},
+        {"level": "H1", "text": "2. Method", "page": 2},
+    ]}
+    predicted = {"title": "doc", "outline": [
+        {"level": "H1", "text": "1.  Intro\u200b", "page": 1},  # whitespace and zero-width space differ
+        {"level": "H1", "text": "1.1 Scope", "page": 1},  # wrong level
+        {"level": "H2", "text": "Stray line", "page": 2},  # false positive
+    ]}
+    score = score_outline(predicted, expected)
+    scoring_ok = (score["matched"] == 2 and abs(score["precision"] - 2 / 3) < 1e-9 and
+                  abs(score["recall"] - 2 / 3) < 1e-9 and score["level_accuracy"] == 0.5 and
+                  score["title_match"] and not score["exact"])
+    print(f"{'✅' if scoring_ok else '❌'} precision/recall/level accuracy scoring")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        expected_dir = os.path.join(temp_dir, "expected")
+        os.makedirs(input_dir)
+        _create_sample_pdf(os.path.join(input_dir, "sample.pdf"), pages=3)
+        process_pdfs(input_dir, expected_dir)
+        
+        baseline = run_regression(input_dir, expected_dir)
+        clean = check_report(baseline, baseline, require_exact=True)
+        # Drop a heading from the labels: recall stays, precision falls below the baseline's
+        with open(os.path.join(expected_dir, "sample.json"), encoding='utf-8') as f:
+            labels = json.load(f)
+        labels["outline"].pop()
+        with open(os.path.join(expected_dir, "sample.json"), 'w', encoding='utf-8') as f:
+            json.dump(labels, f)
+        regressed = check_report(run_regression(input_dir, expected_dir), baseline)
+    
+    harness_ok = (baseline["summary"]["exact_matches"] == 1 and not clean and
+                  any("precision dropped" in failure for failure in regressed))
+    print(f"{'✅' if harness_ok else '❌'} baseline comparison flags regressions: {regressed}")
+    return scoring_ok and harness_ok
+
+def test_output_writers():
+    """Test compact and JSON Lines outputs, backend equivalence and atomic writes"""
+    import output_writer
+    from output_writer import atomic_write, dumps
+    
+    print("\nTesting output writers...")
+    
+    sample = {"title": "Caf\u00e9 \u201cR\u00e9sum\u00e9\u201d \U0001F600", "outline": [
+        {"level": "H1", "text": "1. Intro \\ \"quoted\"\t", "page": 1}]}
+    passed = dumps(sample) == json.dumps(sample, indent=2, ensure_ascii=False).encode('utf-8')
+    if output_writer.resolve_backend("auto") == "orjson":
+        passed = passed and all(dumps(sample, pretty, "orjson") == dumps(sample, pretty, "json")
+                                for pretty in (True, False))
+    print(f"{'✅' if passed else '❌'} serializers agree byte for byte")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for i in range(3):
+            _create_sample_pdf(os.path.join(input_dir, f"doc_{i}.pdf"))
+        process_pdfs(input_dir, os.path.join(temp_dir, "pretty"))
+        expected = {}
+        for name in os.listdir(os.path.join(temp_dir, "pretty")):
+            with open(os.path.join(temp_dir, "pretty", name), encoding='utf-8') as f:
+                expected[name.replace('.json', '.pdf')] = json.load(f)
+        
+        for workers in (1, 2):
+            compact_dir = os.path.join(temp_dir, f"compact_{workers}")
+            process_pdfs(input_dir, compact_dir, workers=workers, output_format="compact")
+            compact = {}
+            for name in os.listdir(compact_dir):
+                with open(os.path.join(compact_dir, name), encoding='utf-8') as f:
+                    text = f.read()
+                compact[name.replace('.json', '.pdf')] = json.loads(text)
+                passed = passed and "\n" not in text
+            
+            jsonl_dir = os.path.join(temp_dir, f"jsonl_{workers}")
+            process_pdfs(input_dir, jsonl_dir, workers=workers, output_format="jsonl")
+            with open(os.path.join(jsonl_dir, "results.jsonl"), encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+            lines = {record.pop("file"): record for record in records}
+            ok = (compact == expected and lines == expected and len(records) == 3 and
+                  os.listdir(jsonl_dir) == ["results.jsonl"])
+            print(f"{'✅' if ok else '❌'} workers={workers}: compact and JSON Lines outputs match the pretty results")
+            passed = passed and ok
+        
+        target = os.path.join(temp_dir, "atomic.json")
+        atomic_write(target, b"old")
+        try:
+            atomic_write(target, "not bytes")  # fails inside the write
+        except TypeError:
+            pass
+        with open(target, 'rb') as f:
+            ok = f.read() == b"old" and os.listdir(temp_dir).count("atomic.json") == 1 and not any(
+                name.endswith(".tmp") for name in os.listdir(temp_dir))
+        print(f"{'✅' if ok else '❌'} failed write leaves the previous file and no temp files")
+        
+        try:
+            process_pdfs(input_dir, os.path.join(temp_dir, "x"), output_format="jsonl", incremental=True)
+            ok = False
+        except ValueError:
+            ok = True
+        print(f"{'✅' if ok else '❌'} JSON Lines output is rejected for incremental runs")
+        return passed and ok
+
+def test_resource_budgets():
+    """Test page and time budgets return marked partial outlines and that the pool kills hard overruns"""
+    from batch_processing import BudgetExceeded, ExtractionWorkerPool
+    from resource_governor import ResourceBudget
+    
+    print("\nTesting resource budgets...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "sample.pdf")
+        _create_sample_pdf(pdf_path, pages=5)
+        
+        passed = True
+        for streaming in (False, True):
+            window = PDFOutlineExtractor(streaming=streaming, page_range=(1, 2)).extract_title_and_outline(pdf_path)
+            result = PDFOutlineExtractor(streaming=streaming, budget=ResourceBudget(max_pages=2)
+                                         ).extract_title_and_outline(pdf_path)
+            ok = (result.get("truncated") == {"reason": "pages", "pages_read": 2, "page_count": 5} and
+                  result["outline"] == window["outline"] and result["outline"])
+            print(f"{'✅' if ok else '❌'} streaming={streaming}: page budget keeps the first two pages")
+            passed = passed and ok
+        
+        # Bookmarks are cut at the page budget too, and say so
+        toc_pdf = os.path.join(temp_dir, "bookmarks.pdf")
+        doc = fitz.open(pdf_path)
+        doc.set_toc([[1, f"{n}. Section Number {n}", n] for n in range(1, 6)])
+        doc.save(toc_pdf)
+        doc.close()
+        result = PDFOutlineExtractor(use_toc=True, budget=ResourceBudget(max_pages=2)).extract_title_and_outline(toc_pdf)
+        ok = (result.get("outline_source") == "bookmarks" and [h["page"] for h in result["outline"]] == [1, 2] and
+              result.get("truncated") == {"reason": "pages", "pages_read": 2, "page_count": 5})
+        print(f"{'✅' if ok else '❌'} bookmark outline cut by the page budget is marked truncated")
+        passed = passed and ok
+        
+        # Any time budget is spent by the first page: reading stops there
+        result = PDFOutlineExtractor(budget=ResourceBudget(max_seconds=1e-9)).extract_title_and_outline(pdf_path)
+        ok = (result["truncated"]["reason"] == "time" and result["truncated"]["pages_read"] == 1 and
+              {h["page"] for h in result["outline"]} == {1})
+        unbudgeted = PDFOutlineExtractor(budget=ResourceBudget(max_seconds=60)).extract_title_and_outline(pdf_path)
+        ok = ok and "truncated" not in unbudgeted
+        print(f"{'✅' if ok else '❌'} time budget returns the outline of the pages read")
+        passed = passed and ok
+        
+        # A single page too slow for the hard limit: the supervisor kills the worker
+        dense_pdf = os.path.join(temp_dir, "dense.pdf")
+        doc = fitz.open()
+        page = doc.new_page(width=2000, height=6000)
+        for i in range(300):
+            page.insert_text((10, 15 + i * 16), "word " * 300, fontsize=4)
+        doc.save(dense_pdf)
+        doc.close()
+        with ExtractionWorkerPool(workers=1, extractor_kwargs={"budget": ResourceBudget(max_seconds=0.02)}) as pool:
+            try:
+                pool.submit(dense_pdf).result()
+                ok = False
+            except BudgetExceeded as e:
+                ok = e.reason == "time" and e.result()["truncated"]["reason"] == "time"
+            # The replacement's start-up doesn't count against the next document's limit
+            small_pdf = os.path.join(temp_dir, "small.pdf")
+            _create_sample_pdf(small_pdf, pages=1)
+            ok = ok and pool.submit(small_pdf).result()["title"] == "Sample Document Title"
+        print(f"{'✅' if ok else '❌'} worker over the hard time limit is killed and replaced")
+        return passed and ok
+
+def test_cold_start():
+    """Test that importing the extractor defers PyMuPDF and NumPy, and the start-up report"""
+    import subprocess
+    import sys
+    
+    print("\nTesting cold start...")
+    
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = ("import sys, extract_outline; "
+            "print(','.join(m for m in ('fitz', 'pymupdf', 'numpy', 'orjson') if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True,
+                            check=True).stdout.strip()
+    passed = loaded == ""
+    print(f"{'✅' if passed else '❌'} import extract_outline loads no heavy modules ({loaded or 'none'})")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        _create_sample_pdf(os.path.join(input_dir, "sample.pdf"))
+        # A document opened by the caller, before the extractor has opened any PDF itself
+        code = ("import fitz, sys; from extract_outline import PDFOutlineExtractor; "
+                "print(len(PDFOutlineExtractor()._extract_text_blocks(fitz.open(sys.argv[1]))))")
+        own_document = subprocess.run([sys.executable, "-c", code, os.path.join(input_dir, "sample.pdf")],
+                                      cwd=here, capture_output=True, text=True)
+        passed = passed and own_document.returncode == 0 and own_document.stdout.split()[-1].isdigit()
+        print(f"{'✅' if own_document.returncode == 0 else '❌'} extraction from a caller-opened document "
+              f"in a fresh process")
+        completed = subprocess.run([sys.executable, "extract_outline.py", "--input-dir", input_dir,
+                                    "--output-dir", os.path.join(temp_dir, "output"), "--startup-report"],
+                                   cwd=here, capture_output=True, text=True, check=True)
+        
+        # An unchanged incremental re-run only compares fingerprints and stats, so it never opens a PDF
+        incremental_dir = os.path.join(temp_dir, "incremental")
+        process_pdfs(input_dir, incremental_dir, incremental=True)
+        code = ("import sys; from extract_outline import process_pdfs; "
+                "process_pdfs(sys.argv[1], sys.argv[2], incremental=True); print('fitz' in sys.modules)")
+        rerun = subprocess.run([sys.executable, "-c", code, input_dir, incremental_dir],
+                               cwd=here, capture_output=True, text=True, check=True)
+        unloaded = rerun.stdout.split()[-1] == "False"
+        passed = passed and unloaded
+        print(f"{'✅' if unloaded else '❌'} unchanged incremental re-run leaves PyMuPDF unloaded")
+    lines = [line for line in completed.stderr.splitlines() if "startup {" in line]
+    report = json.loads(lines[-1].split("startup ", 1)[1]) if lines else {}
+    ok = (report.get("documents") == 1 and report.get("pymupdf_import") is not None and
+          report["main_to_first_document"] <= report["total"])
+    print(f"{'✅' if ok else '❌'} start-up report: {report}")
+    return passed and ok
+
+def test_async_api():
+    """Test awaitable extraction, ordered and as-completed iteration, cancellation and the event loop staying free"""
+    import asyncio
+    from async_extraction import AsyncExtractor
+    
+    print("\nTesting asyncio API...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for i in range(4):
+            _create_sample_pdf(os.path.join(input_dir, f"doc_{i}.pdf"), pages=1 + i)
+        large_pdf = os.path.join(temp_dir, "large.pdf")
+        _create_sample_pdf(large_pdf, pages=150)
+        extractor = PDFOutlineExtractor()
+        expected = {name: extractor.extract_title_and_outline(os.path.join(input_dir, name))
+                    for name in os.listdir(input_dir)}
+        
+        async def scenario(executor):
+            workers = 2 if executor == "process" else 1
+            async with AsyncExtractor(workers=workers, executor=executor, max_concurrency=3) as pool:
+                first = await pool.extract(os.path.join(input_dir, "doc_0.pdf"))
+                ordered = [pair async for pair in pool.iter_directory(input_dir)]
+                as_completed = [pair async for pair in pool.iter_directory(input_dir, ordered=False)]
+                
+                # The loop keeps running while a long extraction is in progress
+                ticks = 0
+                task = asyncio.ensure_future(pool.extract(large_pdf))
+                while not task.done():
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+                await task
+                
+                # Two long documents hold every worker; the third is withdrawn from the pool's queue
+                busy = [asyncio.ensure_future(pool.extract(large_pdf)) for _ in range(2)]
+                await asyncio.sleep(0.05)
+                submitted = []
+                submit = pool._submit
+                pool._submit = lambda source: submitted.append(submit(source)) or submitted[-1]
+                queued = asyncio.ensure_future(pool.extract(os.path.join(input_dir, "doc_1.pdf")))
+                await asyncio.sleep(0.05)
+                queued.cancel()
+                await asyncio.gather(*busy)
+                cancelled = queued.cancelled() and len(submitted) == 1 and submitted[0].cancelled()
+            return first, ordered, as_completed, ticks, cancelled
+        
+        passed = True
+        for executor in ("process", "thread"):
+            first, ordered, as_completed, ticks, cancelled = asyncio.run(scenario(executor))
+            listing = list(iter_pdf_filenames(input_dir))
+            ok = (first == expected["doc_0.pdf"] and
+                  [name for name, _ in ordered] == listing and
+                  all(result == expected[name] for name, result in ordered) and
+                  sorted(as_completed, key=lambda pair: pair[0]) == sorted(ordered, key=lambda pair: pair[0]) and
+                  ticks > 1 and cancelled)
+            print(f"{'✅' if ok else '❌'} {executor} executor: {len(ordered)} ordered results, "
+                  f"{ticks} loop ticks during one extraction, queued document cancelled={cancelled}")
+            passed = passed and ok
+        
+        # One extractor shared by successive event loops, with calls waiting on the concurrency limit
+        paths = [os.path.join(input_dir, name) for name in sorted(expected)] * 2
+        shared = AsyncExtractor(workers=1, executor="thread", max_concurrency=1)
+        try:
+            runs = [asyncio.run(_gather_extractions(shared, paths)) for _ in range(2)]
+        finally:
+            shared.close()
+        ok = all(results == [expected[os.path.basename(path)] for path in paths] for results in runs)
+        print(f"{'✅' if ok else '❌'} extractor shared across event loops")
+        
+        try:
+            AsyncExtractor(workers=2, executor="thread")
+            print("❌ Thread executor accepted two extraction threads")
+            passed = False
+        except ValueError:
+            print("✅ Thread executor limited to one extraction thread")
+        return passed and ok
+
+async def _gather_extractions(extractor, paths):
+    import asyncio
+    return await asyncio.gather(*[extractor.extract(path) for path in paths])
+
+def test_work_queue():
+    """Test sharding, lease re-issue after a crashed worker, idempotent commits and multi-process draining"""
+    from work_queue import LeaseQueue, run_queue_worker, run_queue_workers
+    
+    print("\nTesting distributed work queue...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for i in range(5):
+            _create_sample_pdf(os.path.join(input_dir, f"doc_{i}.pdf"), pages=1 + i % 2)
+        process_pdfs(input_dir, os.path.join(temp_dir, "expected"))
+        
+        def outputs_match(output_dir):
+            expected_dir = os.path.join(temp_dir, "expected")
+            return sorted(os.listdir(output_dir)) == sorted(os.listdir(expected_dir)) and all(
+                open(os.path.join(output_dir, name), 'rb').read() ==
+                open(os.path.join(expected_dir, name), 'rb').read() for name in os.listdir(expected_dir))
+        
+        queue_path = os.path.join(temp_dir, "queue.db")
+        output_dir = os.path.join(temp_dir, "output")
+        queue = LeaseQueue(queue_path)
+        queue.configure(input_dir, output_dir)
+        added = queue.enqueue(sorted(iter_pdf_filenames(input_dir)), shard_size=2)
+        re_added = queue.enqueue(iter_pdf_filenames(input_dir), shard_size=2)
+        
+        # A worker leases the first shard, commits one file and dies without finishing
+        lease = queue.claim("crashed-worker", lease_seconds=0.2)
+        queue.commit(lease.filenames[0], True)
+        queue.commit(lease.filenames[0], True)
+        processed = run_queue_worker(queue_path, lease_seconds=30, poll_interval=0.05)
+        status = queue.status()
+        lost = queue.renew(lease)
+        queue.close()
+        ok = (added == 5 and re_added == 0 and len(lease.filenames) == 2 and processed == 4 and not lost and
+              status == {"shards": {"done": 3}, "files": {"done": 5}})
+        print(f"{'✅' if ok else '❌'} expired lease re-issued: {processed} files processed after the crash, {status}")
+        passed = ok
+        
+        queue_path = os.path.join(temp_dir, "queue2.db")
+        output_dir = os.path.join(temp_dir, "output2")
+        queue = LeaseQueue(queue_path)
+        queue.configure(input_dir, output_dir)
+        queue.enqueue(iter_pdf_filenames(input_dir), shard_size=1)
+        run_queue_workers(queue_path, workers=3, poll_interval=0.05)
+        status = queue.status()
+        queue.close()
+        ok = status == {"shards": {"done": 5}, "files": {"done": 5}} and outputs_match(output_dir)
+        print(f"{'✅' if ok else '❌'} three worker processes drained the queue: {status}")
+        passed = passed and ok
+        
+        # A document slower than the timeout is committed as failed; the rest of its shard still gets done
+        slow_dir = os.path.join(temp_dir, "slow_input")
+        os.makedirs(slow_dir)
+        doc = fitz.open()
+        page = doc.new_page(width=2000, height=6000)
+        for i in range(300):
+            page.insert_text((10, 15 + i * 16), "word " * 300, fontsize=4)
+        doc.save(os.path.join(slow_dir, "a_slow.pdf"))
+        doc.close()
+        _create_sample_pdf(os.path.join(slow_dir, "b_fine.pdf"), pages=1)
+        queue_path = os.path.join(temp_dir, "queue3.db")
+        queue = LeaseQueue(queue_path)
+        queue.configure(slow_dir, os.path.join(temp_dir, "output3"))
+        queue.enqueue(sorted(iter_pdf_filenames(slow_dir)), shard_size=2)
+        run_queue_worker(queue_path, lease_seconds=30, poll_interval=0.05, timeout=0.05)
+        status = queue.status()
+        queue.close()
+        ok = status == {"shards": {"done": 1}, "files": {"done": 1, "failed": 1}}
+        print(f"{'✅' if ok else '❌'} document over the timeout committed as failed: {status}")
+        passed = passed and ok
+        
+        # Worker processes that crash (here: an output format workers reject) fail the run
+        queue_path = os.path.join(temp_dir, "queue2.db")
+        try:
+            run_queue_workers(queue_path, workers=2, poll_interval=0.05, output_format="jsonl")
+            ok = False
+        except RuntimeError as e:
+            ok = "queue workers failed" in str(e)
+        print(f"{'✅' if ok else '❌'} crashed worker processes are reported")
+        passed = passed and ok
+        
+        # A mistyped queue path is not created, and an unconfigured queue says so
+        missing_path = os.path.join(temp_dir, "mistyped.db")
+        unconfigured_path = os.path.join(temp_dir, "unconfigured.db")
+        LeaseQueue(unconfigured_path).close()
+        for workers in (1, 2):
+            try:
+                run_queue_workers(missing_path, workers=workers, poll_interval=0.05)
+                ok = False
+            except FileNotFoundError:
+                ok = not os.path.exists(missing_path)
+            try:
+                run_queue_workers(unconfigured_path, workers=workers, poll_interval=0.05)
+                ok = False
+            except RuntimeError as e:
+                ok = ok and "not configured" in str(e)
+            print(f"{'✅' if ok else '❌'} {workers} worker(s): missing and unconfigured queues rejected")
+            passed = passed and ok
+        return passed
+
+def test_page_cache():
+    """Test that a revision reuses the lines of unchanged pages and re-extracts edited ones"""
+    print("\nTesting per-page line cache...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original_path = os.path.join(temp_dir, "original.pdf")
+        revision_path = os.path.join(temp_dir, "revision.pdf")
+        _create_sample_pdf(original_path, pages=4)
+        # Edit page 3 and rewrite the file from scratch, which renumbers its objects
+        doc = fitz.open(original_path)
+        doc[2].insert_text((72, 560), "3.2 Added In Revision", fontsize=14, fontname="hebo")
+        doc.save(revision_path, garbage=4, deflate=True)
+        doc.close()
+        
+        cache_dir = os.path.join(temp_dir, "pages")
+        extractor = PDFOutlineExtractor(page_cache_dir=cache_dir)
+        extractor.extract_title_and_outline(original_path)
+        misses = extractor._page_cache.misses
+        result = extractor.extract_title_and_outline(revision_path)
+        cache = extractor._page_cache
+        extractor.close()
+        
+        expected = PDFOutlineExtractor().extract_title_and_outline(revision_path)
+        ok = misses == 4 and cache.hits == 3 and cache.misses == 5 and result == expected
+        print(f"{'✅' if ok else '❌'} revision: {cache.hits} pages from cache, {cache.misses - misses} re-extracted, "
+              f"result {'matches' if result == expected else 'differs from'} uncached extraction")
+        
+        # Page workers keep one page cache, and the chunks of one PDF share its fingerprinter
+        import extract_outline
+        chunks = [extract_outline._extract_page_range(revision_path, start, start + 2, cache_dir) for start in (0, 2)]
+        page_cache = extract_outline._range_extractors[cache_dir]._page_cache
+        fingerprinter = page_cache._fingerprinter
+        chunks.append(extract_outline._extract_page_range(revision_path, 2, 4, cache_dir))
+        reused = (page_cache is extract_outline._range_extractors[cache_dir]._page_cache and
+                  fingerprinter is page_cache._fingerprinter and page_cache.hits == 6 and
+                  [chunks[1].text(i) for i in range(len(chunks[1]))] ==
+                  [chunks[2].text(i) for i in range(len(chunks[2]))])
+        print(f"{'✅' if reused else '❌'} page chunks reuse the worker's page cache and fingerprinter "
+              f"({page_cache.hits} hits)")
+        return ok and reused
+
+def test_running_text_suppression():
+    """Test that running headers and footers are dropped before classification, and only when asked"""
+    print("\nTesting running header and footer suppression...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "report.pdf")
+        _create_sample_pdf(pdf_path, pages=5)
+        doc = fitz.open(pdf_path)
+        for page in doc:
+            page.insert_text((72, 40), "Quarterly Operations Review", fontsize=12, fontname="hebo")
+            page.insert_text((72, 800), f"Confidential Report Page {page.number + 1} of 5", fontsize=9, fontname="hebo")
+        doc.saveIncr()
+        doc.close()
+        
+        kept = PDFOutlineExtractor().extract_title_and_outline(pdf_path)["outline"]
+        dropped = PDFOutlineExtractor(drop_running_text=True).extract_title_and_outline(pdf_path)["outline"]
+        streamed = PDFOutlineExtractor(drop_running_text=True, streaming=True).extract_title_and_outline(pdf_path)["outline"]
+        running = [heading for heading in kept if heading["text"] == "Quarterly Operations Review" or
+                   heading["text"].startswith("Confidential Report Page")]
+        ok = (len(running) == 6 and dropped == [heading for heading in kept if heading not in running] and
+              streamed == dropped)
+        print(f"{'✅' if ok else '❌'} {len(kept)} headings by default, {len(dropped)} with running text dropped")
+        return ok
+
 def run_all_tests():
     """Run all tests"""
     print("Running PDF Outline Extractor Tests")
@@ -116,6 +1389,34 @@ def run_all_tests():
         test_validation_functions,
         test_pattern_matching,
         test_directory_processing_structure,
+        test_parallel_batch_matches_serial,
+        test_worker_pool_timeout,
+        test_worker_pool_dead_workers,
+        test_page_parallel_matches_serial,
+        test_streaming_matches_in_memory,
+        test_line_store,
+        test_font_statistics_fallback,
+        test_font_size_tolerance,
+        test_process_pdfs_font_size_tolerance,
+        test_heading_rule_engine,
+        test_result_cache,
+        test_incremental_processing,
+        test_watch_daemon,
+        test_http_service,
+        test_in_memory_sources,
+        test_early_exit_modes,
+        test_bookmark_fast_path,
+        test_text_extraction_flags,
+        test_benchmark_harness,
+        test_instrumentation,
+        test_regression_harness,
+        test_output_writers,
+        test_resource_budgets,
+        test_cold_start,
+        test_async_api,
+        test_work_queue,
+        test_page_cache,
+        test_running_text_suppression,
     ]
     
     passed = 0
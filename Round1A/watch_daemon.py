@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Long-running watch mode for the PDF outline extractor
+Watches the input directory (inotify, with polling as a fallback) and feeds new PDFs to warm workers
+"""
+
+import os
+import time
+import queue
+import select
+import signal
+import struct
+import ctypes
+import ctypes.util
+import threading
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from extract_outline import ERROR_RESULT
+from batch_processing import BudgetExceeded, ExtractionWorkerPool
+from output_writer import create_writer, output_path_for
+from resource_governor import is_load_dependent
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Shortest wait for filesystem events, so settle_seconds=0 does not turn the watch loop into a busy spin
+MIN_POLL_TIMEOUT = 0.05
+
+
+def _is_pdf(filename: str) -> bool:
+    return filename.lower().endswith('.pdf')
+
+
+class InotifyWatcher:
+    """Directory watcher backed by Linux inotify"""
+
+    def __init__(self, directory: str):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.directory = directory
+
+    def read(self, timeout: float) -> Optional[List[str]]:
+        """
+        PDF names with activity since the last call
+
+        Returns None when the kernel queue overflowed and events were lost,
+        in which case the caller should rescan the directory.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if _is_pdf(name):
+                names.append(name)
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Directory watcher that rescans the directory every poll interval"""
+
+    def __init__(self, directory: str, poll_interval: float = 2.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._last_scan = time.monotonic()
+        # Files present at start are the daemon's initial scan's job, not change events
+        self._seen = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        current = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not _is_pdf(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                current[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return current
+
+    def read(self, timeout: float) -> Optional[List[str]]:
+        wait = self._last_scan + self.poll_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if self._last_scan + self.poll_interval > time.monotonic():
+                return []
+        self._last_scan = time.monotonic()
+
+        current = self._scan()
+        names = [name for name, signature in current.items() if self._seen.get(name) != signature]
+        self._seen = current
+        return names
+
+    def close(self):
+        pass
+
+
+def create_watcher(directory: str, poll_interval: float = 2.0, use_inotify: bool = True):
+    """inotify watcher when the platform supports it, polling otherwise"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({str(e)}); falling back to polling every {poll_interval}s")
+    return PollingWatcher(directory, poll_interval)
+
+
+class Debouncer:
+    """
+    Holds back files that are still being written
+
+    A file is released once its size and mtime have not changed for
+    settle_seconds, so a PDF that is copied in slowly is only picked up
+    after the last write.
+    """
+
+    def __init__(self, directory: str, settle_seconds: float = 1.0):
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        self._pending: Dict[str, Tuple[Tuple[int, int], float, float]] = {}
+
+    def touch(self, filename: str, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if filename in self._pending:
+            signature, _, first_seen = self._pending[filename]
+            self._pending[filename] = (signature, now, first_seen)
+        else:
+            self._pending[filename] = ((-1, -1), now, now)
+
+    def pop_ready(self, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Files that have settled, with the time they were first seen"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        for filename, (signature, changed_at, first_seen) in list(self._pending.items()):
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                del self._pending[filename]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self._pending[filename] = (current, now, first_seen)
+            elif now - changed_at >= self.settle_seconds:
+                del self._pending[filename]
+                ready.append((filename, first_seen))
+        return ready
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class WatchDaemon:
+    """
+    Watch an input directory and extract outlines as PDFs arrive
+
+    A watcher thread turns filesystem events into settled files and puts them
+    on a bounded work queue (blocking when it is full). The main loop drains
+    the queue into a pool of warm extractor processes, at most one document
+    per worker at a time, and logs queue depth and per-file latency.
+
+    A result truncated by the time or memory budget depends on load, so it
+    counts as failed and the file goes back through the debouncer, up to
+    max_retries times. Its output is dated before the input, so the initial
+    scan of the next run retries it as well.
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, workers: Optional[int] = None,
+                 timeout: Optional[float] = None, settle_seconds: float = 1.0,
+                 poll_interval: float = 2.0, queue_size: int = 1000,
+                 report_interval: float = 60.0, use_inotify: bool = True,
+                 extractor_kwargs: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                 output_format: str = "pretty", json_backend: str = "auto", max_retries: int = 2):
+        if output_format == "jsonl":
+            raise ValueError("watch mode needs one output file per PDF; use the pretty or compact output format")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.settle_seconds = settle_seconds
+        self.report_interval = report_interval
+        self.max_retries = max_retries
+        self.work_queue: "queue.Queue[Tuple[str, float]]" = queue.Queue(maxsize=queue_size)
+        self._watcher = create_watcher(input_dir, poll_interval, use_inotify)
+        self._debouncer = Debouncer(input_dir, settle_seconds)
+        self._writer = create_writer(output_dir, output_format, json_backend)
+        self._pool = ExtractionWorkerPool(workers=workers, timeout=timeout, extractor_kwargs=extractor_kwargs,
+                                          cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = threading.Semaphore(self._pool.num_workers)
+        self._latencies = deque(maxlen=1000)
+        self._retries: Dict[str, int] = {}
+        # Files to retry, handed from the pool's callbacks to the watcher thread that owns the debouncer
+        self._retry_queue = deque()
+        self.processed = 0
+        self.failed = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def stop(self, *_):
+        """Ask the daemon to finish in-flight work and exit"""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput counters and latency percentiles (seconds)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            processed, failed = self.processed, self.failed
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "queue_depth": self.work_queue.qsize(),
+            "settling": len(self._debouncer),
+            "in_flight": self._pool.busy_count,
+            "processed": processed,
+            "failed": failed,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+        }
+
+    def _initial_scan(self):
+        """Queue PDFs that have no output yet or changed since their output was written"""
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                if not _is_pdf(entry.name):
+                    continue
+                output_path = output_path_for(entry.name, self.output_dir)
+                try:
+                    if os.stat(output_path).st_mtime_ns >= entry.stat().st_mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    pass
+                self._debouncer.touch(entry.name)
+
+    def _watch_loop(self):
+        while not self._stop.is_set():
+            names = self._watcher.read(timeout=max(MIN_POLL_TIMEOUT, min(0.5, self.settle_seconds)))
+            if names is None:
+                logger.warning("Filesystem event queue overflowed; rescanning input directory")
+                self._initial_scan()
+                names = []
+            while self._retry_queue:
+                names.append(self._retry_queue.popleft())
+            for name in names:
+                self._debouncer.touch(name)
+            for item in self._debouncer.pop_ready():
+                while not self._stop.is_set():
+                    try:
+                        self.work_queue.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+
+    def _on_done(self, filename: str, first_seen: float, future):
+        if future.cancelled():
+            self._in_flight.release()
+            return
+        retry = False
+        try:
+            result = future.result()
+            retry = is_load_dependent(result)
+            ok = result != ERROR_RESULT and not retry
+        except BudgetExceeded as e:
+            logger.error(f"Failed to process {filename}: {str(e)}")
+            result, ok = e.result(), False
+            retry = is_load_dependent(result)
+        except Exception as e:
+            logger.error(f"Failed to process {filename}: {str(e)}")
+            result, ok = ERROR_RESULT, False
+        try:
+            output_path = self._writer.write(filename, result)
+            if retry:
+                self._mark_stale(filename, output_path)
+        except OSError as e:
+            logger.error(f"Could not write {output_path_for(filename, self.output_dir)}: {str(e)}")
+            ok = False
+        latency = time.monotonic() - first_seen
+        with self._lock:
+            self._latencies.append(latency)
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            attempts = self._retries.pop(filename, 0) + 1
+            if retry and attempts <= self.max_retries:
+                self._retries[filename] = attempts
+                self._retry_queue.append(filename)
+        self._in_flight.release()
+        logger.info(f"Processed {filename} in {latency:.3f}s (queue depth {self.work_queue.qsize()})")
+
+    def _mark_stale(self, filename: str, output_path: str):
+        """Date an output before its input so the next initial scan extracts the file again"""
+        try:
+            input_mtime = os.stat(os.path.join(self.input_dir, filename)).st_mtime_ns
+            os.utime(output_path, ns=(input_mtime - 1, input_mtime - 1))
+        except FileNotFoundError:
+            pass
+
+    def run(self):
+        """Run until stop() is called or SIGINT/SIGTERM arrives"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        self._initial_scan()
+        watcher_thread = threading.Thread(target=self._watch_loop, name="input-watcher", daemon=True)
+        watcher_thread.start()
+        logger.info(f"Watching {self.input_dir} with {self._pool.num_workers} workers "
+                    f"({type(self._watcher).__name__})")
+
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() >= next_report:
+                    logger.info(f"Watch stats: {self.stats()}")
+                    next_report = time.monotonic() + self.report_interval
+                try:
+                    filename, first_seen = self.work_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                # Bounded in-flight work: wait for a free worker before taking the document
+                while not self._in_flight.acquire(timeout=0.5):
+                    if self._stop.is_set():
+                        return
+                future = self._pool.submit(os.path.join(self.input_dir, filename))
+                future.add_done_callback(lambda f, name=filename, seen=first_seen: self._on_done(name, seen, f))
+        finally:
+            self._stop.set()
+            watcher_thread.join()
+            self._pool.shutdown()
+            self._watcher.close()
+            logger.info(f"Watch mode stopped: {self.stats()}")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Sharded work queue for distributed batch runs
+A coordinator splits the input listing into shards in a SQLite database; workers lease shards, extract and commit
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done, failed
+    owner TEXT,
+    token INTEGER NOT NULL DEFAULT 0,  -- bumped on every lease, so a stale holder can't renew or finish
+    expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    filename TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL REFERENCES shards(id),
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, done, failed
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_shard ON tasks(shard, state);
+CREATE INDEX IF NOT EXISTS shards_by_state ON shards(state, expires);
+"""
+
+
+class Lease(NamedTuple):
+    """A shard held by one worker until expires; token identifies this particular lease"""
+    shard: int
+    owner: str
+    token: int
+    filenames: List[str]
+
+
+class LeaseQueue:
+    """
+    Shards of input files in a SQLite database, leased to workers
+
+    Every state change is one short IMMEDIATE transaction, so any number of
+    worker processes can share the database; workers on other nodes can too
+    if the filesystem supports POSIX locks (the rollback journal is used, not
+    WAL, which needs shared memory). Lease expiry uses wall-clock time, so
+    nodes' clocks must roughly agree.
+
+    A lease that isn't renewed before it expires goes back to the queue and is
+    re-issued to the next worker, which only gets the files that were not
+    committed yet. A shard whose lease has expired max_attempts times is
+    marked failed rather than crashing workers forever.
+
+    Workers open the queue with create=False, so a mistyped path fails
+    instead of silently creating an empty database.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0, create: bool = True):
+        self.path = path
+        if create:
+            self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        else:
+            try:
+                self.conn = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=rw", timeout=busy_timeout,
+                                            isolation_level=None, uri=True)
+            except sqlite3.OperationalError as e:
+                raise FileNotFoundError(f"can't open queue database {path} ({e}); run --enqueue first") from e
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def configure(self, input_dir: str, output_dir: str):
+        """Record where workers read inputs and write outputs (shared paths)"""
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [("input_dir", input_dir), ("output_dir", output_dir)])
+
+    def settings(self) -> Dict[str, str]:
+        """The input and output directories recorded by configure()"""
+        settings = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if "input_dir" not in settings or "output_dir" not in settings:
+            raise RuntimeError(f"queue {self.path} is not configured; run --enqueue first")
+        return settings
+
+    def enqueue(self, filenames: Iterable[str], shard_size: int = 100) -> int:
+        """
+        Add files in shards of shard_size and return how many were new
+
+        Files already in the queue are skipped, so the coordinator can be
+        re-run on a growing input directory.
+        """
+        added = 0
+        chunk = []
+        for filename in filenames:
+            chunk.append(filename)
+            if len(chunk) >= shard_size:
+                added += self._enqueue_shard(chunk)
+                chunk = []
+        if chunk:
+            added += self._enqueue_shard(chunk)
+        return added
+
+    def _enqueue_shard(self, filenames: List[str]) -> int:
+        with self._transaction() as conn:
+            shard = conn.execute("INSERT INTO shards DEFAULT VALUES").lastrowid
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO tasks (filename, shard) VALUES (?, ?)",
+                             [(filename, shard) for filename in filenames])
+            added = conn.total_changes - before
+            if not added:
+                conn.execute("DELETE FROM shards WHERE id = ?", (shard,))
+        return added
+
+    def claim(self, owner: str, lease_seconds: float = 300.0, max_attempts: int = 3) -> Optional[Lease]:
+        """Lease the next pending or expired shard, or return None if there is none right now"""
+        while True:
+            with self._transaction() as conn:
+                now = time.time()
+                row = conn.execute(
+                    "SELECT id, attempts FROM shards WHERE state = 'pending' OR (state = 'leased' AND expires < ?) "
+                    "ORDER BY id LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                shard, attempts = row
+                if attempts >= max_attempts:
+                    logger.error(f"Shard {shard} lease expired {attempts} times; marking its files failed")
+                    conn.execute("UPDATE shards SET state = 'failed', owner = NULL, expires = NULL WHERE id = ?",
+                                 (shard,))
+                    conn.execute("UPDATE tasks SET state = 'failed', finished = ? WHERE shard = ? AND state = 'pending'",
+                                 (now, shard))
+                    continue
+                conn.execute("UPDATE shards SET state = 'leased', owner = ?, token = token + 1, expires = ?, "
+                             "attempts = attempts + 1 WHERE id = ?", (owner, now + lease_seconds, shard))
+                token = conn.execute("SELECT token FROM shards WHERE id = ?", (shard,)).fetchone()[0]
+                filenames = [filename for filename, in conn.execute(
+                    "SELECT filename FROM tasks WHERE shard = ? AND state = 'pending' ORDER BY rowid", (shard,))]
+                return Lease(shard, owner, token, filenames)
+
+    def renew(self, lease: Lease, lease_seconds: float = 300.0) -> bool:
+        """Extend a lease; False if it expired and was re-issued to another worker"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE shards SET expires = ? WHERE id = ? AND token = ? AND state = 'leased'",
+                                  (time.time() + lease_seconds, lease.shard, lease.token))
+            return cursor.rowcount == 1
+
+    def commit(self, filename: str, ok: bool):
+        """Record a file's outcome; committing a file twice (after a re-issued lease) is a no-op"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET state = ?, finished = ? WHERE filename = ? AND state = 'pending'",
+                         ("done" if ok else "failed", time.time(), filename))
+
+    def finish(self, lease: Lease) -> bool:
+        """Close a lease whose files are all committed; False if the lease was lost meanwhile"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE shards SET state = 'done', owner = NULL, expires = NULL "
+                                  "WHERE id = ? AND token = ? AND state = 'leased'", (lease.shard, lease.token))
+            return cursor.rowcount == 1
+
+    def release(self, lease: Lease):
+        """Hand an unfinished lease back right away (on shutdown) instead of waiting for it to expire"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE shards SET state = 'pending', owner = NULL, expires = NULL, attempts = attempts - 1 "
+                         "WHERE id = ? AND token = ? AND state = 'leased'", (lease.shard, lease.token))
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        """Shard and file counts by state"""
+        return {
+            "shards": dict(self.conn.execute("SELECT state, COUNT(*) FROM shards GROUP BY state")),
+            "files": dict(self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state")),
+        }
+
+    def has_unfinished(self) -> bool:
+        """Whether any shard is pending or leased (possibly to a worker that will crash)"""
+        return self.conn.execute(
+            "SELECT 1 FROM shards WHERE state IN ('pending', 'leased') LIMIT 1").fetchone() is not None
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_queue_worker(queue_path: str, lease_seconds: float = 300.0, max_attempts: int = 3,
+                     poll_interval: float = 2.0, extractor_kwargs: Optional[Dict[str, Any]] = None,
+                     cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                     output_format: str = "pretty", timeout: Optional[float] = None) -> int:
+    """
+    Lease shards and process them until every shard is done or failed; returns the files processed
+
+    Each file is extracted in a supervised worker process, so timeout and the
+    time and memory limits of extractor_kwargs["budget"] apply: a document
+    that passes them gets its worker killed and is committed as failed. The
+    lease is renewed before each file, so lease_seconds must exceed the
+    slowest single document, i.e. the timeout or hard time limit. Outputs
+    are written atomically and deterministically, so a file processed twice
+    after a lease was re-issued ends up with the same output.
+    """
+    from batch_processing import ExtractionWorkerPool, process_pdfs_parallel
+    from output_writer import create_writer
+
+    if output_format == "jsonl":
+        raise ValueError("queue workers need one output file per PDF; use the pretty or compact output format")
+    queue = LeaseQueue(queue_path, create=False)
+    try:
+        settings = queue.settings()
+    except RuntimeError:
+        queue.close()
+        raise
+    input_dir, output_dir = settings["input_dir"], settings["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    owner = worker_id()
+
+    pool = ExtractionWorkerPool(workers=1, timeout=timeout, extractor_kwargs=extractor_kwargs,
+                                cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)
+    writer = create_writer(output_dir, output_format)
+    processed = 0
+
+    def leased_filenames(lease: Lease) -> Iterator[str]:
+        for filename in lease.filenames:
+            if not queue.renew(lease, lease_seconds):
+                logger.warning(f"Lost the lease on shard {lease.shard}; another worker has taken it over")
+                return
+            yield filename
+
+    def on_result(filename: str, ok: bool):
+        nonlocal processed
+        queue.commit(filename, ok)
+        processed += 1
+
+    try:
+        while True:
+            lease = queue.claim(owner, lease_seconds, max_attempts)
+            if lease is None:
+                if not queue.has_unfinished():
+                    break
+                # Other workers hold the remaining shards; wait in case one of them dies
+                time.sleep(poll_interval)
+                continue
+            logger.info(f"Leased shard {lease.shard} ({len(lease.filenames)} files)")
+            try:
+                process_pdfs_parallel(input_dir, output_dir, max_in_flight=1, filenames=leased_filenames(lease),
+                                      on_result=on_result, writer=writer, pool=pool)
+            except BaseException:
+                queue.release(lease)
+                raise
+            queue.finish(lease)
+    finally:
+        pool.shutdown()
+        queue.close()
+    logger.info(f"Queue worker {owner} processed {processed} files")
+    return processed
+
+
+def run_queue_workers(queue_path: str, workers: int = 1, **kwargs) -> None:
+    """Run workers queue-worker processes on this node (in-process for one); raises if any of them failed"""
+    if workers <= 1:
+        run_queue_worker(queue_path, **kwargs)
+        return
+    # Check the queue once here, so a bad path fails with its own error rather than as crashed workers
+    queue = LeaseQueue(queue_path, create=False)
+    try:
+        queue.settings()
+    finally:
+        queue.close()
+    from batch_processing import get_mp_context
+    ctx = get_mp_context()
+    processes = [ctx.Process(target=run_queue_worker, args=(queue_path,), kwargs=kwargs) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    exit_codes = [process.exitcode for process in processes if process.exitcode != 0]
+    if exit_codes:
+        raise RuntimeError(f"{len(exit_codes)} of {workers} queue workers failed (exit codes "
+                           f"{', '.join(map(str, exit_codes))})")